@@ -36,6 +36,12 @@ sub getjson {
 
 my $data = getjson;
 
+# The build directory is only complete after the build, ask for it
+print JSON::encode_json({
+    supported_api => 3,
+    command => 'get_build_dir'}), "\n";
+my $build_dir = getjson->{path};
+
 # See if this could be a Perl package
 my $perlpkg = 0;
 File::Find::find(
@@ -44,7 +50,7 @@ File::Find::find(
             $perlpkg = 1;
             return
         }
-    }, $data->{build_dir});
+    }, $build_dir);
 exit unless $perlpkg;
 
 my @results = ();
@@ -87,7 +93,7 @@ $test = Fedora::Review::Test->new(
     output_extra => '',
     %common);
 print JSON::encode_json({
-    supported_api => 1,
+    supported_api => 3,
     command => 'get_section',
     section => 'files'}), "\n";
 $data = getjson;
@@ -96,6 +102,6 @@ $test->result('pass')
 push @results, {%$test};
 
 print JSON::encode_json({
-    supported_api => 1,
+    supported_api => 3,
     command => 'results',
     checks => [@results]});
@@ -24,6 +24,7 @@ from abstract_bug import SettingsError,BugException
 from bugzilla_bug import BugzillaBug
 from check_base   import CheckBase, LangCheckBase, Attachment
 from checks_class import Checks, ChecksLister
+from download_manager import DownloadManager
 from mock         import Mock
 from name_bug     import NameBug
 from review_error import FedoraReviewError, CleanExitError
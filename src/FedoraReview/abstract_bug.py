@@ -28,6 +28,7 @@ from urlparse import urlparse
 
 from BeautifulSoup import BeautifulSoup
 
+from download_manager import DownloadManager
 from helpers import Helpers
 from review_error import FedoraReviewError
 from settings import Settings
@@ -77,18 +78,18 @@ class AbstractBug(Helpers):
         """ Return visible label for source of srpm/spec """
         self.log.error( "Calling abstract method" + __method__)
 
-    def do_download_spec(self):
-        """ Download the spec file and srpm extracted from the page.
-        """
+    def _submit_spec(self):
+        """ Start downloading the spec file, return the Download. """
         if not hasattr( self, 'dir'):
             self.dir = ReviewDirs.srpm
 
         spec_name = os.path.basename(self.spec_url)
         self.spec_file = os.path.join(self.dir, spec_name)
-        self.urlretrieve(self.spec_url, self.spec_file)
+        return DownloadManager.submit(self.spec_url, self.spec_file, 'spec')
 
-    def do_download_srpm(self):
-        """ Download the spec file and srpm extracted from the page.
+    def _submit_srpm(self):
+        """ Start downloading the srpm, return the Download or None
+        if a cached srpm is used.
         """
 
         def has_srpm():
@@ -100,18 +101,35 @@ class AbstractBug(Helpers):
 
         if has_srpm() and Settings.cache:
             self.log.debug( "Using cached source: " + self.srpm_file)
-            return
+            return None
         srpm_name = os.path.basename(self.srpm_url)
         self.srpm_file = os.path.join(self.dir, srpm_name)
-        self.urlretrieve(self.srpm_url, self.srpm_file)
+        return DownloadManager.submit(self.srpm_url, self.srpm_file, 'srpm')
+
+    def do_download_spec(self):
+        """ Download the spec file extracted from the page.
+        """
+        self._submit_spec().wait()
+
+    def do_download_srpm(self):
+        """ Download the srpm extracted from the page.
+        """
+        download = self._submit_srpm()
+        if download:
+            download.wait()
 
     def do_download_files(self):
-        """ Download the spec file and srpm extracted from the page.
+        """ Download the spec file and srpm extracted from the page,
+        in parallel.
         """
+        downloads = []
         if not self.srpm_file:
-            self.do_download_srpm()
+            downloads.append(self._submit_srpm())
         if not self.spec_file:
-            self.do_download_spec()
+            downloads.append(self._submit_spec())
+        for download in downloads:
+            if download:
+                download.wait()
         return True
 
     def is_downloaded(self):
@@ -0,0 +1,214 @@
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+
+'''
+In-process listing and extraction of tar, zip and compressed files.
+'''
+
+import bz2
+import gzip
+import os
+import os.path
+import shutil
+import tarfile
+import zipfile
+import zlib
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+from review_error import FedoraReviewError
+from settings import Settings
+
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tbz',
+                '.tar.xz', '.txz', '.tar.lzma')
+ZIP_SUFFIXES = ('.zip',)
+GZ_SUFFIXES = ('.gz', '.tgz')
+BZ2_SUFFIXES = ('.bz2', '.tbz2', '.tbz')
+LZMA_SUFFIXES = ('.xz', '.txz', '.lzma')
+
+_ERRORS = (EnvironmentError, EOFError, tarfile.TarError,
+           zipfile.BadZipfile, zlib.error)
+if lzma:
+    _ERRORS += (lzma.LZMAError,)
+
+
+class ArchiveError(FedoraReviewError):
+    ''' Archive cannot be listed or extracted. '''
+    pass
+
+
+def _safe_name(name):
+    ''' Return normalized member name, or None if it's absolute
+    or outside the extract dir.
+    '''
+    name = os.path.normpath(name)
+    if name.startswith('/') or name == '..' or name.startswith('../'):
+        return None
+    return name
+
+
+def _is_below(path, root):
+    ''' Return True if path is root or a path inside it. '''
+    return path == root or path.startswith(root.rstrip('/') + '/')
+
+
+class Archive(object):
+    ''' An archive: a tar file, a zip file or a single compressed
+    file. Compression using gzip, bzip2 and (if the lzma module is
+    available) xz or lzma is supported. Attributes:
+      - path: the archive file.
+      - kind: 'tar', 'zip', 'compressed' or None if not supported.
+    '''
+
+    def __init__(self, path):
+        self.log = Settings.get_logger()
+        self.path = path
+        name = os.path.basename(path)
+        if name.endswith(TAR_SUFFIXES):
+            self.kind = 'tar'
+        elif name.endswith(ZIP_SUFFIXES):
+            self.kind = 'zip'
+        elif name.endswith(GZ_SUFFIXES + BZ2_SUFFIXES + LZMA_SUFFIXES):
+            self.kind = 'compressed'
+        else:
+            self.kind = None
+        if name.endswith(LZMA_SUFFIXES) and not lzma:
+            self.kind = None
+
+    @staticmethod
+    def is_supported(path):
+        ''' Return True if path can be handled by an Archive. '''
+        return Archive(path).kind is not None
+
+    def _open(self):
+        ''' Return file object reading the uncompressed data. '''
+        if self.path.endswith(GZ_SUFFIXES):
+            return gzip.open(self.path, 'rb')
+        elif self.path.endswith(BZ2_SUFFIXES):
+            return bz2.BZ2File(self.path, 'rb')
+        elif self.path.endswith(LZMA_SUFFIXES):
+            return lzma.LZMAFile(self.path, 'rb')
+        return open(self.path, 'rb')
+
+    def _uncompressed_name(self):
+        ''' Name of the file in a compressed, non-tar archive. '''
+        name = os.path.basename(self.path)
+        name, ext = os.path.splitext(name)
+        if ext in ['.tgz', '.tbz2', '.tbz', '.txz']:
+            name += '.tar'
+        return name
+
+    def _list_tar(self):
+        with self._open() as f:
+            tar = tarfile.open(fileobj=f, mode='r|')
+            return [m.name for m in tar if not m.isdir()]
+
+    def _extract_tar(self, extract_dir):
+        root = os.path.realpath(extract_dir)
+        with self._open() as f:
+            tar = tarfile.open(fileobj=f, mode='r|')
+            for member in tar:
+                name = _safe_name(member.name)
+                if name and member.issym():
+                    target = os.path.join(os.path.dirname(name),
+                                          member.linkname)
+                    if member.linkname.startswith('/') or \
+                    not _safe_name(target):
+                        name = None
+                if name:
+                    # Don't write through symlinks already extracted.
+                    parent = os.path.join(root, os.path.dirname(name))
+                    if not _is_below(os.path.realpath(parent), root):
+                        name = None
+                if not name:
+                    self.log.warning('%s: skipping unsafe path %s' %
+                                     (self.path, member.name))
+                    continue
+                member.name = name
+                if member.islnk():
+                    member.linkname = _safe_name(member.linkname)
+                    if not member.linkname:
+                        continue
+                tar.extract(member, extract_dir)
+
+    def _list_zip(self):
+        with zipfile.ZipFile(self.path) as zip:
+            return [n for n in zip.namelist() if not n.endswith('/')]
+
+    def _extract_zip(self, extract_dir):
+        with zipfile.ZipFile(self.path) as zip:
+            for info in zip.infolist():
+                name = _safe_name(info.filename)
+                if not name:
+                    self.log.warning('%s: skipping unsafe path %s' %
+                                     (self.path, info.filename))
+                    continue
+                path = os.path.join(extract_dir, name)
+                if info.filename.endswith('/'):
+                    if not os.path.exists(path):
+                        os.makedirs(path)
+                    continue
+                if not os.path.exists(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                with zip.open(info) as src, open(path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                mode = (info.external_attr >> 16) & 0777
+                if mode:
+                    os.chmod(path, mode)
+
+    def list(self):
+        ''' Return list of files (not directories) in archive, as
+        relative paths. Nothing is written to disk.
+        '''
+        try:
+            if self.kind == 'tar':
+                names = self._list_tar()
+            elif self.kind == 'zip':
+                names = self._list_zip()
+            elif self.kind == 'compressed':
+                names = [self._uncompressed_name()]
+            else:
+                raise ArchiveError('Unsupported archive: ' + self.path)
+        except _ERRORS as err:
+            raise ArchiveError('Cannot list %s: %s' % (self.path, err))
+        return filter(None, map(_safe_name, names))
+
+    def extract(self, extract_dir):
+        ''' Extract all files into (existing) extract_dir. '''
+        try:
+            if self.kind == 'tar':
+                self._extract_tar(extract_dir)
+            elif self.kind == 'zip':
+                self._extract_zip(extract_dir)
+            elif self.kind == 'compressed':
+                path = os.path.join(extract_dir, self._uncompressed_name())
+                with self._open() as src, open(path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+            else:
+                raise ArchiveError('Unsupported archive: ' + self.path)
+        except _ERRORS as err:
+            raise ArchiveError('Cannot extract %s: %s' % (self.path, err))
+
+
+# vim: set expandtab: ts=4:sw=4:
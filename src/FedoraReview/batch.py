@@ -0,0 +1,192 @@
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+
+'''
+Review many bugs, urls or local packages in one run.
+'''
+
+import json
+import multiprocessing
+import os
+import os.path
+import sys
+import tempfile
+import time
+
+from download_manager import DownloadManager
+from mock import Mock
+from remote import WorkerPool
+from review_dirs import ReviewDirs
+from review_helper import ReviewHelper
+from settings import Settings
+
+SUMMARY = 'batch-summary.json'
+
+_MODES = ['bug', 'url', 'name']
+
+# Set in each worker process by _init_worker().
+_worker = {}
+
+
+def parse_item(line):
+    ''' Return dict with 'mode' (one of bug, url or name) and 'value'
+    for a line in a batch file, None for blank lines and comments.
+    A line is a bug number, an url, a name or any of these prefixed
+    with e. g., 'name:'.
+    '''
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    mode, sep, value = line.partition(':')
+    if sep and mode in _MODES:
+        return {'mode': mode, 'value': value.strip()}
+    if line.isdigit():
+        return {'mode': 'bug', 'value': line}
+    if '://' in line:
+        return {'mode': 'url', 'value': line}
+    return {'mode': 'name', 'value': line}
+
+
+def _init_worker(counter, jobs, hosts=None):
+    ''' Setup a worker process. Each worker uses its own mock root,
+    kept over all its reviews, unless building on the WorkerPool hosts.
+    '''
+    with counter.get_lock():
+        counter.value += 1
+        _worker['index'] = counter.value
+    _worker['hosts'] = hosts
+    if hosts:
+        return
+    if jobs > 1 and Settings.chroot_pool <= 0:
+        Mock.uniqueext = 'batch%d' % _worker['index']
+
+
+def _review(item):
+    ''' Review one item in a new review directory, return dict with
+    the item, exit code, report path and time used.
+    '''
+    os.chdir(ReviewDirs.startdir)
+    ReviewDirs.reset()
+    Mock.reset()
+    DownloadManager.reset()
+    for mode in _MODES:
+        setattr(Settings, mode, None)
+    setattr(Settings, item['mode'], item['value'])
+    start = time.time()
+    helper = ReviewHelper()
+    hosts = _worker.get('hosts')
+    if hosts:
+        helper.worker = hosts.acquire()
+    try:
+        rc = helper.review()
+    finally:
+        if hosts:
+            hosts.release(helper.worker)
+    result = dict(item)
+    result.update({'rc': rc,
+                   'report': helper.outfile if rc == 0 else None,
+                   'elapsed': time.time() - start,
+                   'worker': _worker.get('index', 0),
+                   'host': helper.worker.name if helper.worker else None})
+    os.chdir(ReviewDirs.startdir)
+    return result
+
+
+class BatchReview(object):
+    ''' Reviews items as returned by parse_item(), at most jobs in
+    parallel. Each review runs in a worker process with its own
+    current directory and review state, in a new review directory
+    as for a single review. Workers are reused, keeping loaded
+    plugins, Bugzilla sessions and mock roots between reviews. Given
+    a WorkerPool, the build and checks run on its hosts, one review
+    for each of their slots.
+    '''
+
+    def __init__(self, items, jobs, hosts=None):
+        self.log = Settings.get_logger()
+        self.items = items
+        self.hosts = hosts
+        if hosts:
+            jobs = hosts.slots
+        self.jobs = max(1, min(jobs, len(items)))
+        self.results = []
+
+    @staticmethod
+    def from_file(path):
+        ''' Return BatchReview for items in file, '-' for stdin. '''
+        f = sys.stdin if path == '-' else open(path)
+        try:
+            items = filter(None, map(parse_item, f))
+        finally:
+            if f != sys.stdin:
+                f.close()
+        hosts = None
+        if Settings.workers:
+            hosts = WorkerPool.from_spec(Settings.workers)
+        return BatchReview(items, Settings.batch_jobs, hosts)
+
+    def write_summary(self, path):
+        ''' Write results as a json list to path. '''
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.results, f, indent=2)
+        os.rename(tmp, path)
+
+    def run(self):
+        ''' Review all items, write the summary index. Return 0 if all
+        reviews were made, else 1.
+        '''
+        if not self.items:
+            self.log.warning('No items to review')
+            return 0
+        start = time.time()
+        self.log.info('Reviewing %d items, %d in parallel'
+                      % (len(self.items), self.jobs))
+        counter = multiprocessing.Value('i', 0)
+        if self.jobs == 1:
+            _init_worker(counter, 1, self.hosts)
+            self.results = map(_review, self.items)
+        else:
+            pool = multiprocessing.Pool(self.jobs, _init_worker,
+                                        (counter, self.jobs, self.hosts))
+            try:
+                self.results = pool.map(_review, self.items, 1)
+            finally:
+                pool.close()
+                pool.join()
+        path = os.path.join(ReviewDirs.startdir, SUMMARY)
+        self.write_summary(path)
+        for result in self.results:
+            self.log.info('%-5s %-40s rc: %d  %5.0f s  %s' %
+                          (result['mode'], result['value'], result['rc'],
+                           result['elapsed'],
+                           result['report'] if result['report'] else ''))
+        if self.hosts:
+            for host in self.hosts.transports:
+                done = [r for r in self.results if r['host'] == host.name]
+                self.log.info('%s: %d reviews in %.0f s' %
+                              (host.name, len(done),
+                               sum([r['elapsed'] for r in done])))
+        failed = len([r for r in self.results if r['rc'] != 0])
+        self.log.info('Reviewed %d items in %.0f s, %d failed. Summary in %s'
+                      % (len(self.results), time.time() - start, failed,
+                         path))
+        return 1 if failed else 0
+
+
+# vim: set expandtab: ts=4:sw=4:
@@ -22,6 +22,7 @@ import os.path
 import re
 import xmlrpclib
 
+from threading import Lock
 from urlparse import urlparse
 
 from bugzilla import Bugzilla
@@ -29,6 +30,17 @@ from bugzilla import Bugzilla
 from settings import Settings
 from abstract_bug import AbstractBug, SettingsError, BugException
 
+_sessions = {}
+_sessions_lock = Lock()
+
+
+def get_bugzilla(url):
+    ''' Return a Bugzilla session for url, reused by later bugs. '''
+    with _sessions_lock:
+        if not url in _sessions:
+            _sessions[url] = Bugzilla(url=url)
+        return _sessions[url]
+
 
 class BugzillaBug(AbstractBug):
     """ This class handles interaction with bugzilla using
@@ -45,7 +57,7 @@ class BugzillaBug(AbstractBug):
         self.check_options()
         self.bug_num = bug
         bz_url = os.path.join(Settings.current_bz_url, 'xmlrpc.cgi')
-        self.bugzilla = Bugzilla(url=bz_url)
+        self.bugzilla = get_bugzilla(bz_url)
 
         self.log.info("Trying bugzilla cookies for authentication")
         self.user = user
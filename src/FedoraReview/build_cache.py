@@ -0,0 +1,207 @@
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+
+'''
+Persistent cache for mock build results, shared by all reviews.
+'''
+
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import os.path
+import shlex
+import shutil
+import tempfile
+import time
+
+from contextlib import contextmanager
+from glob import glob
+from threading import Lock
+
+from settings import Settings
+
+CACHE_DIR = os.path.join(os.environ['XDG_CACHE_HOME']
+                             if 'XDG_CACHE_HOME' in os.environ
+                             else os.path.expanduser('~/.cache'),
+                         'fedora-review', 'builds')
+
+# Mock options not affecting the built packages. The ones in
+# _VALUE_OPTIONS could also be followed by a separate value.
+_IGNORED_OPTIONS = ['--resultdir', '--uniqueext', '--no-clean',
+                    '--no-cleanup-after', '--cleanup-after', '-q',
+                    '--quiet', '-v', '--verbose', '--trace']
+_VALUE_OPTIONS = ['--resultdir', '--uniqueext']
+
+# Files in resultdir stored in the cache.
+_PATTERNS = ['*.rpm', '*.log']
+
+CHUNK_SIZE = 65536
+
+_cache = None
+_cache_lock = Lock()
+
+
+def get_build_cache():
+    ''' Return the shared BuildCache, None if disabled. '''
+    global _cache
+    with _cache_lock:
+        if not _cache and Settings.build_cache_size > 0:
+            _cache = BuildCache(CACHE_DIR,
+                                Settings.build_cache_size * 1024 * 1024)
+        return _cache
+
+
+def relevant_options(options):
+    ''' Return list of options in mock options string which could
+    change the build result, in order.
+    '''
+    relevant = []
+    words = iter(shlex.split(options if options else ''))
+    for word in words:
+        name = word.split('=', 1)[0]
+        if not name in _IGNORED_OPTIONS:
+            relevant.append(word)
+        elif name in _VALUE_OPTIONS and not '=' in word:
+            next(words, None)
+    return relevant
+
+
+def get_build_key(srpm, config, options):
+    ''' Return key for building srpm with mock config (name, None
+    for default) and mock options string: a digest of the srpm
+    contents, the config name and file and the relevant options.
+    '''
+    config = config if config else 'default'
+    h = hashlib.sha256()
+    with open(srpm, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), ''):
+            h.update(chunk)
+    h.update('\0' + config + '\0')
+    try:
+        with open(os.path.join('/etc/mock', config + '.cfg')) as f:
+            h.update(f.read())
+    except IOError:
+        pass
+    for option in relevant_options(options):
+        h.update('\0' + option)
+    return h.hexdigest()
+
+
+class BuildCache(object):
+    ''' Built rpms and logs stored in cache_dir/entries/<key>, where
+    key is computed by get_build_key(). When the total size exceeds
+    max_size, least recently used entries are removed. The index is
+    locked, so several processes can share the cache.
+    '''
+
+    def __init__(self, cache_dir, max_size):
+        self.log = Settings.get_logger()
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.entries_dir = os.path.join(cache_dir, 'entries')
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self._lock = Lock()
+        try:
+            os.makedirs(self.entries_dir)
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise
+
+    @contextmanager
+    def _index(self):
+        ''' Lock and read the index, write it back when done. '''
+        lockfile = os.path.join(self.cache_dir, 'index.lock')
+        with self._lock, open(lockfile, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(self.index_path) as f:
+                    index = json.load(f)
+            except (IOError, ValueError):
+                index = {}
+            yield index
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(index, f)
+            os.rename(tmp, self.index_path)
+
+    def _entry_path(self, key):
+        ''' Return directory holding files for key. '''
+        return os.path.join(self.entries_dir, key)
+
+    def _evict(self, index):
+        ''' Remove least recently used entries until total size is
+        within max_size.
+        '''
+        total = sum([e['size'] for e in index.itervalues()])
+        by_age = sorted(index.keys(), key=lambda k: index[k]['used'])
+        while total > self.max_size and by_age:
+            key = by_age.pop(0)
+            total -= index[key]['size']
+            del index[key]
+            shutil.rmtree(self._entry_path(key), True)
+            self.log.debug('Build cache: evicted ' + key)
+
+    def restore(self, key, resultdir):
+        ''' Copy rpms and logs stored for key to resultdir, replacing
+        any rpms already there. Return list of restored files, None
+        if key is not cached.
+        '''
+        with self._index() as index:
+            if not key in index:
+                return None
+            entry = index[key]
+            entry['used'] = time.time()
+            for path in glob(os.path.join(resultdir, '*.rpm')):
+                os.unlink(path)
+            restored = []
+            for name in entry['files']:
+                dest = os.path.join(resultdir, name)
+                shutil.copyfile(os.path.join(self._entry_path(key), name),
+                                dest)
+                restored.append(dest)
+        self.log.debug('Build cache: restored ' + entry['label'])
+        return restored
+
+    def store(self, key, resultdir, label):
+        ''' Save rpms and logs in resultdir for key. label is just
+        a name used in logs.
+        '''
+        paths = []
+        for pattern in _PATTERNS:
+            paths.extend(glob(os.path.join(resultdir, pattern)))
+        if not paths:
+            return
+        tmpdir = tempfile.mkdtemp(dir=self.cache_dir)
+        for path in paths:
+            shutil.copyfile(path,
+                            os.path.join(tmpdir, os.path.basename(path)))
+        size = sum([os.path.getsize(p) for p in paths])
+        with self._index() as index:
+            shutil.rmtree(self._entry_path(key), True)
+            os.rename(tmpdir, self._entry_path(key))
+            index[key] = {'label': label,
+                          'files': sorted(map(os.path.basename, paths)),
+                          'size': size,
+                          'used': time.time()}
+            self._evict(index)
+        self.log.debug('Build cache: stored ' + label)
+
+
+# vim: set expandtab: ts=4:sw=4:
@@ -0,0 +1,192 @@
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+
+'''
+Streaming analysis of build logs into an index of events.
+'''
+
+import re
+import sys
+import time
+
+from subprocess import Popen, PIPE, STDOUT
+
+# Event kinds.
+ERROR = 'error'
+RPM_ERROR = 'rpm_error'
+DUPLICATE_FILE = 'duplicate_file'
+COMPILER_FLAGS = 'compiler_flags'
+TIMING = 'timing'
+
+_ERROR_RE = re.compile(r'\bERROR\b')
+_RPM_ERROR_RE = re.compile(r'^(?:RPM build )?[eE]rrors?:')
+_DUPLICATE_RE = re.compile(r'File listed twice: (.*)$')
+_COMPILER_RE = re.compile(
+    r'^\+?\s*(?:\S*/)?(?:gcc|g\+\+|cc|c\+\+|clang|clang\+\+)(?:-[\d.]+)?\s')
+_SECTION_RE = re.compile(r'^Executing\((%\w+)\)')
+_MOCK_STATE_RE = re.compile(r'(Start|Finish): (.*?)\s*$')
+
+
+class BuildLogEvent(object):
+    ''' Something found in a build log: kind, line number, the line
+    (None for compiler flags) and kind-specific data: the path for
+    duplicate files, a tuple of flags for compiler command lines and
+    (name, seconds) for timings.
+    '''
+
+    __slots__ = ['kind', 'lineno', 'text', 'data']
+
+    def __init__(self, kind, lineno, text, data=None):
+        self.kind = kind
+        self.lineno = lineno
+        self.text = text
+        self.data = data
+
+    def __repr__(self):
+        return 'BuildLogEvent(%r, %d, %r, %r)' % \
+            (self.kind, self.lineno, self.text, self.data)
+
+
+class BuildLogIndex(object):
+    ''' Events found in a build log, by kind. Only events are kept,
+    not the log itself.
+    '''
+
+    def __init__(self):
+        self.events = {}
+        self.lines = 0
+
+    def add(self, event):
+        ''' Add a BuildLogEvent. '''
+        self.events.setdefault(event.kind, []).append(event)
+
+    def get(self, kind):
+        ''' Return list of events of given kind, in log order. '''
+        return self.events.get(kind, [])
+
+    def has(self, kind):
+        ''' Return True if there is any event of given kind. '''
+        return kind in self.events
+
+    def get_duplicate_files(self):
+        ''' Return list of files listed twice in %files. '''
+        return [e.data for e in self.get(DUPLICATE_FILE)]
+
+    def get_compiler_flags(self):
+        ''' Return set of all options used in compiler command lines. '''
+        flags = set()
+        for event in self.get(COMPILER_FLAGS):
+            flags.update(event.data)
+        return flags
+
+    def get_timings(self):
+        ''' Return list of (name, seconds) for mock states and rpmbuild
+        sections, available when the log was analyzed live.
+        '''
+        return [e.data for e in self.get(TIMING)]
+
+
+class BuildLogParser(object):
+    ''' Feeds lines to a BuildLogIndex. If clock is given (e. g.,
+    time.time) it's used to time mock states and rpmbuild sections
+    as lines arrive.
+    '''
+
+    def __init__(self, index=None, clock=None):
+        self.index = index if index else BuildLogIndex()
+        self.clock = clock
+        self._started = {}
+        self._section = None
+
+    def _time(self, lineno, line):
+        ''' Add timing events for mock states and rpmbuild sections. '''
+        now = self.clock()
+        m = _MOCK_STATE_RE.search(line)
+        if m and m.group(1) == 'Start':
+            self._started[m.group(2)] = now
+        elif m and m.group(2) in self._started:
+            name = m.group(2)
+            self.index.add(BuildLogEvent(
+                TIMING, lineno, line, (name, now - self._started.pop(name))))
+        m = _SECTION_RE.match(line)
+        if m:
+            self._end_section(lineno, line, now)
+            self._section = (m.group(1), now)
+
+    def _end_section(self, lineno, line, now):
+        if self._section:
+            name, start = self._section
+            self.index.add(BuildLogEvent(TIMING, lineno, line,
+                                         (name, now - start)))
+            self._section = None
+
+    def feed(self, line):
+        ''' Analyze next line of log. '''
+        self.index.lines += 1
+        lineno = self.index.lines
+        line = line.rstrip('\n')
+        if _ERROR_RE.search(line):
+            self.index.add(BuildLogEvent(ERROR, lineno, line))
+        if _RPM_ERROR_RE.match(line):
+            self.index.add(BuildLogEvent(RPM_ERROR, lineno, line))
+        m = _DUPLICATE_RE.search(line)
+        if m:
+            self.index.add(BuildLogEvent(DUPLICATE_FILE, lineno, line,
+                                         m.group(1).strip()))
+        if _COMPILER_RE.match(line):
+            flags = tuple([w for w in line.split() if w.startswith('-')])
+            self.index.add(BuildLogEvent(COMPILER_FLAGS, lineno, None,
+                                         flags))
+        if self.clock:
+            self._time(lineno, line)
+
+    def close(self):
+        ''' End of log, return the index. '''
+        if self.clock and self._section:
+            self._end_section(self.index.lines, '', self.clock())
+        return self.index
+
+
+def parse_file(path):
+    ''' Return BuildLogIndex for existing log file, read line by line.
+    '''
+    parser = BuildLogParser()
+    with open(path) as f:
+        for line in f:
+            parser.feed(line)
+    return parser.close()
+
+
+def run_logged(cmd, logfile, echo=None):
+    ''' Run command, writing stdout and stderr to logfile and analyzing
+    them as they arrive. Lines for which echo(line) is True are also
+    written to stdout. Returns (exit code, BuildLogIndex).
+    '''
+    parser = BuildLogParser(clock=time.time)
+    p = Popen(cmd, stdout=PIPE, stderr=STDOUT)
+    with open(logfile, 'w') as log:
+        for line in iter(p.stdout.readline, ''):
+            log.write(line)
+            parser.feed(line)
+            if echo and echo(line):
+                sys.stdout.write(line)
+                sys.stdout.flush()
+    return p.wait(), parser.close()
+
+
+# vim: set expandtab: ts=4:sw=4:
@@ -21,7 +21,6 @@ This module contains automatic test for Fedora Packaging guidelines
 '''
 
 import re
-import fnmatch
 import StringIO
 
 from textwrap import TextWrapper
@@ -35,8 +34,21 @@ TEST_STATES = {'pending': '[ ]', 'pass': '[x]', 'fail': '[!]', 'na': '[-]'}
 
 class CheckBase(Helpers):
 
+    # Resources a check could depend on, used in the needs attribute.
+    NEEDS_SPEC    = 'spec'       # Only the spec file.
+    NEEDS_SOURCES = 'sources'    # Downloaded and extracted upstream sources.
+    NEEDS_RPMS    = 'rpms'       # Built or prebuilt binary rpms.
+    NEEDS_CHROOT  = 'chroot'     # Packages installed in the mock chroot.
+
     deprecates = []
     header = 'Generic'
+    # List of NEEDS_* this check depends on. None means unknown. Checks
+    # with unknown needs or using the chroot are run serialized, others
+    # might run in parallel.
+    needs = None
+    # False if the result also depends on something else than needs,
+    # like the network. The result cache never reuses such results.
+    cacheable = True
 
     def __init__(self, base):
         Helpers.__init__(self)
@@ -102,41 +114,18 @@ class CheckBase(Helpers):
 
     def sources_have_files(self, pattern):
         ''' Check if rpms has file matching a pattern'''
-        sources_files = self.sources.get_files_sources()
-        for source in sources_files:
-            if fnmatch.fnmatch(source, pattern):
-                return True
-        return False
+        return self.sources.get_file_index().has_files(pattern)
 
     def has_files(self, pattern):
         ''' Check if rpms has file matching a pattern'''
-        rpm_files = self.srpm.get_files_rpms()
-        for rpm in rpm_files:
-            for fn in rpm_files[rpm]:
-                if fnmatch.fnmatch(fn, pattern):
-                    return True
-        return False
+        return self.srpm.get_file_index().has_files(pattern)
 
     def has_files_re(self, pattern_re):
         ''' Check if rpms has file matching a pattern'''
-        fn_pat = re.compile(pattern_re)
-        rpm_files = self.srpm.get_files_rpms()
-        #print rpm_files, pattern_re
-        for rpm in rpm_files:
-            for fn in rpm_files[rpm]:
-                if fn_pat.search(fn):
-                    return True
-        return False
+        return self.srpm.get_file_index().has_files_re(pattern_re)
 
     def get_files_by_pattern(self, pattern):
-        result = {}
-        rpm_files = self.srpm.get_files_rpms()
-        for rpm in rpm_files:
-            result[rpm] = []
-            for fn in rpm_files[rpm]:
-                if fnmatch.fnmatch(fn, pattern):
-                    result[rpm].append(fn)
-        return result
+        return self.srpm.get_file_index().get_files_by_pattern(pattern)
 
 
 class LangCheckBase(CheckBase):
@@ -0,0 +1,164 @@
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+
+'''
+Run a set of checks, in parallel when possible.
+'''
+
+import time
+
+from multiprocessing.pool import ThreadPool
+
+from check_base import CheckBase
+from settings import Settings
+
+
+class CheckScheduler(object):
+    """ Runs checks according to their declared needs. Checks changing
+    state (mock build, installs...) or not declaring their needs are run
+    serialized in given order. When they are done the resources needed
+    by the remaining checks are prepared, and these are run in a pool of
+    threads. Unless --no-pipeline is used, checks only needing the spec
+    and sources run first, while the background build started by the
+    caller is going on. is_applicable() is evaluated per phase, so it
+    doesn't wait for the build before the early checks. Attributes
+    after run():
+      - elapsed: wall-clock time for all checks.
+      - serial_time: sum of the time used by each check.
+    """
+
+    def __init__(self, base, jobs=1, cache=None):
+        """ base is the Checks instance, jobs max number of threads,
+        cache a ResultCache for the checks, if any.
+        """
+        self.log = Settings.get_logger()
+        self.base = base
+        self.jobs = max(1, jobs)
+        self.cache = cache
+        self.cached = 0
+        self.elapsed = 0.0
+        self.serial_time = 0.0
+
+    saved = property(lambda self: max(0.0,
+                                      self.serial_time - self.elapsed))
+
+    @staticmethod
+    def is_serialized(check):
+        """ Return True if check must be run in the main thread. """
+        return check.needs is None or CheckBase.NEEDS_CHROOT in check.needs
+
+    @staticmethod
+    def is_early(check):
+        """ Return True if check can run while the package builds. """
+        return check.needs is not None and \
+            set(check.needs) <= set([CheckBase.NEEDS_SPEC,
+                                     CheckBase.NEEDS_SOURCES])
+
+    def _prepare(self, checks):
+        """ Compute the lazily evaluated data used by the checks before
+        several threads starts to use it.
+        """
+        needs = set()
+        for check in checks:
+            needs.update(check.needs)
+        if CheckBase.NEEDS_RPMS in needs and self.base.srpm:
+            self.base.srpm.get_file_index()
+        if CheckBase.NEEDS_SOURCES in needs and self.base.sources:
+            self.base.sources.get_file_index()
+
+    def _run_check(self, check):
+        """ Run a single check, or restore its cached result. Return
+        time used.
+        """
+        start = time.time()
+        key = None
+        if self.cache and self.cache.is_cacheable(check):
+            key = self.cache.get_key(check)
+            if self.cache.restore(key, check):
+                self.cached += 1
+                return time.time() - start
+        check.run()
+        if key:
+            self.cache.store(key, check)
+        return time.time() - start
+
+    def _run_parallel(self, checks):
+        """ Run checks in the pool, return list of times used. """
+        if not checks:
+            return []
+        self._prepare(checks)
+        if self.jobs > 1 and len(checks) > 1:
+            pool = ThreadPool(min(self.jobs, len(checks)))
+            try:
+                return pool.map(self._run_check, checks)
+            finally:
+                pool.close()
+                pool.join()
+        return map(self._run_check, checks)
+
+    def run(self, checks, deprecated=None):
+        """ Run the applicable checks not deprecated by other applicable
+        checks or by names in deprecated, return when all are done.
+        Returns list of checks run, in given order.
+        """
+        start = time.time()
+        deprecated = set(deprecated if deprecated else [])
+        applicable = {}
+
+        def select(candidates):
+            """ Call is_applicable() once for each check. """
+            for check in candidates:
+                if not check in applicable:
+                    applicable[check] = check.is_applicable()
+                    if applicable[check]:
+                        deprecated.update(check.deprecates)
+
+        early = []
+        if self.base.srpm and Settings.pipeline:
+            # Checks which might be deprecated by a check evaluated
+            # later are not run early.
+            later = set()
+            for check in checks:
+                if not self.is_early(check):
+                    later.update(check.deprecates)
+            early = [c for c in checks
+                        if self.is_early(c) and not c.name in later]
+            select(early)
+            early = [c for c in early
+                        if applicable[c] and not c.name in deprecated]
+        times = self._run_parallel(early)
+        select(checks)
+        todo = [c for c in checks if applicable[c] and
+                    not c.name in deprecated and not c in early]
+        serial = filter(self.is_serialized, todo)
+        parallel = filter(lambda c: not self.is_serialized(c), todo)
+        times.extend(map(self._run_check, serial))
+        times.extend(self._run_parallel(parallel))
+        self.elapsed = time.time() - start
+        self.serial_time = sum(times)
+        self.log.info('Ran %d checks (%d in parallel, %d threads) in'
+                      ' %.1f s, serial time %.1f s, saved %.1f s' %
+                      (len(early) + len(todo),
+                       len(early) + len(parallel), self.jobs,
+                       self.elapsed, self.serial_time, self.saved))
+        if self.cache:
+            self.log.info('Reused %d cached check results' % self.cached)
+        return [c for c in checks if c in early or c in todo]
+
+
+# vim: set expandtab: ts=4:sw=4:
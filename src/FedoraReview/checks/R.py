@@ -11,6 +11,7 @@ from FedoraReview import LangCheckBase
 class RCheckBase(LangCheckBase):
     """ Base class for all R specific checks. """
     header="R"
+    needs = [LangCheckBase.NEEDS_SPEC, LangCheckBase.NEEDS_RPMS]
     DIR = ['%{packname}']
     DOCS = ['doc', 'DESCRIPTION', 'NEWS', 'CITATION']
     URLS = [
@@ -133,6 +134,7 @@ class RCheckLatestVersionIsPackaged(RCheckBase):
     """ Check if the last version of the R package is the one proposed """
 
     deprecates = ['CheckLatestVersionIsPackaged']
+    cacheable = False
 
     def __init__(self, base):
         """ Instanciate check variable """
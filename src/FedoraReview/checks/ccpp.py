@@ -4,6 +4,7 @@ from FedoraReview import LangCheckBase
 
 class CCppCheckBase(LangCheckBase):
     header='C/C++'
+    needs = [LangCheckBase.NEEDS_RPMS, LangCheckBase.NEEDS_SOURCES]
 
     def is_applicable(self):
         """Need more comprehensive check and return True in valid cases"""
@@ -28,6 +28,8 @@ import re
 from subprocess import Popen, PIPE
 
 from FedoraReview import CheckBase, Attachment, ReviewDirs, Mock, Settings
+from FedoraReview.build_log import DUPLICATE_FILE
+from FedoraReview.tree_diff import TreeDiff
 
 class CheckGuidelines(CheckBase):
     '''
@@ -62,6 +64,8 @@ class CheckNameCharset(CheckBase):
     MUST:all Fedora packages must be named using only the following
          ASCII characters...
     '''
+    needs = [CheckBase.NEEDS_SPEC]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/Packaging/NamingGuidelines'
@@ -90,6 +94,8 @@ class CheckBuildroot(CheckBase):
     '''
     http://fedoraproject.org/wiki/Packaging/Guidelines#BuildRoot_tag
     '''
+    needs = [CheckBase.NEEDS_SPEC]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -132,6 +138,8 @@ class CheckSpecName(CheckBase):
     in the format %{name}.spec unless your package has an exemption.
     http://fedoraproject.org/wiki/Packaging/NamingGuidelines#Spec_file_name
     '''
+    needs = [CheckBase.NEEDS_SPEC]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -153,6 +161,8 @@ class CheckIllegalSpecTags(CheckBase):
     '''
     http://fedoraproject.org/wiki/Packaging/Guidelines#Tags
     '''
+    needs = [CheckBase.NEEDS_SPEC]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.text = 'Spec file lacks Packager, Vendor, PreReq tags.'
@@ -176,6 +186,8 @@ class CheckClean(CheckBase):
     '''
     http://fedoraproject.org/wiki/Packaging/Guidelines#.25clean
     '''
+    needs = [CheckBase.NEEDS_SPEC]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -206,6 +218,8 @@ class CheckInstall(CheckBase):
     '''
     http://fedoraproject.org/wiki/EPEL/GuidelinesAndPolicies#Prepping_BuildRoot_For_.25install
     '''
+    needs = [CheckBase.NEEDS_SPEC]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.text = 'Package does not run rm -rf %{buildroot}' \
@@ -237,6 +251,8 @@ class CheckDefattr(CheckBase):
     http://fedoraproject.org/wiki/Packaging/Guidelines#FilePermissions
     Update: 29-04-2011 This is only for pre rpm 4.4 that this is needed
     '''
+    needs = [CheckBase.NEEDS_SPEC]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -281,10 +297,12 @@ class CheckSourceMD5(CheckBase):
 
     def make_diff(self, sources):
         """
-        For all sources, run a diff -r between upstream and what's in the
-        srpm. Return (passed, text) where passed is True/False
-        and text is either the possibly large diff output or None
+        For all sources, compare upstream and what's in the srpm using
+        checksums for all files. Return (passed, path) where passed is
+        True/False and path is None or a file with the differences,
+        including diffs for the files which differ.
         """
+        diffs = []
         for s in sources:
             s.extract()
             upstream = s.extract_dir
@@ -293,18 +311,20 @@ class CheckSourceMD5(CheckBase):
                  self.log.warn(
                      "Cannot extract local source: " + s.filename)
                  return(False, None)
-            cmd = '/usr/bin/diff -U2 -r %s %s'  % (upstream, local)
-            self.log.debug(' Diff cmd: ' + cmd)
-            try:
-                from subprocess import Popen, PIPE
-                p = Popen(cmd.split(), stdout=PIPE, stderr=PIPE)
-                output, error = p.communicate()
-            except OSError as e:
-                self.log.error("Cannot run diff", exc_info=True)
-                return (False, None)
-            if output and len(output) > 0:
-                return (False, output)
-        return (True,  None)
+            tree_diff = TreeDiff(upstream, local, Settings.jobs)
+            if not tree_diff.compare():
+                diffs.append(tree_diff)
+        if not diffs:
+            return (True, None)
+        path = os.path.join(ReviewDirs.root, 'diff.txt')
+        try:
+            with open(path, 'w') as f:
+                for tree_diff in diffs:
+                    tree_diff.write(f)
+        except (IOError, OSError):
+            self.log.error("Cannot write diff", exc_info=True)
+            return (False, None)
+        return (False, path)
 
     def run(self):
         sources = self.base.sources.get_all()
@@ -323,7 +343,7 @@ class CheckSourceMD5(CheckBase):
                     self.log.debug('Skipping md5-tst for '
                                     + source.filename)
                     continue
-                if hasattr(source, 'local_src'):
+                if source.local_src:
                     text += "Using local file " +  source.local_src + \
                             " as upstream\n"
                 local = self.srpm.check_source_checksum(source.filename)
@@ -337,16 +357,15 @@ class CheckSourceMD5(CheckBase):
                     all_sources_passed = False
             passed = all_sources_passed
             if not passed:
-                passed, diff = self.make_diff(sources)
+                passed, p = self.make_diff(sources)
                 if passed:
                    text += 'However, diff -r shows no differences\n'
                    msg = 'checksum differs but diff -r is OK'
-                else:
-                   p = os.path.join(ReviewDirs.root, 'diff.txt')
-                   with open(p, 'w') as f:
-                       f.write(diff)
+                elif p:
                    text += 'diff -r also reports differences\n'
                    msg = 'Upstream MD5sum check error, diff is in ' + p
+                else:
+                   msg = 'Upstream MD5sum check error, cannot run diff'
         except AttributeError as e:
             self.log.debug( "CheckSourceMD5(): Attribute error " + str(e))
             msg = 'Internal Error!'
@@ -415,6 +434,8 @@ class CheckRpmLintInstalled(CheckBase):
     package occasionally reveals things otherwise not found.
     http://fedoraproject.org/wiki/Packaging/Guidelines#rpmlint
     '''
+    needs = [CheckBase.NEEDS_RPMS, CheckBase.NEEDS_CHROOT]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -509,6 +530,8 @@ class CheckMacros(CheckBase):
     http://fedoraproject.org/wiki/Packaging/Guidelines#macros
     http://fedoraproject.org/wiki/Packaging:RPMMacros
     '''
+    needs = [CheckBase.NEEDS_SPEC]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/' \
@@ -565,6 +588,8 @@ class CheckBuildRequires(CheckBase):
     optional. Apply common sense.
     http://fedoraproject.org/wiki/Packaging/Guidelines#Exceptions_2
     '''
+    needs = [CheckBase.NEEDS_SPEC, CheckBase.NEEDS_RPMS]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -604,6 +629,8 @@ class CheckMakeinstall(CheckBase):
     '''
     http://fedoraproject.org/wiki/Packaging/Guidelines#Why_the_.25makeinstall_macro_should_not_be_used
     '''
+    needs = [CheckBase.NEEDS_SPEC]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/Packaging/Guidelines' \
@@ -633,6 +660,8 @@ class CheckLocale(CheckBase):
     forbidden.
     http://fedoraproject.org/wiki/Packaging/Guidelines#Handling_Locale_Files
     '''
+    needs = [CheckBase.NEEDS_RPMS]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -667,6 +696,8 @@ class CheckLicenseField(CheckBase):
     actual license.
     http://fedoraproject.org/wiki/Packaging/LicensingGuidelines#ValidLicenseShortNames
     '''
+    needs = [CheckBase.NEEDS_SOURCES, CheckBase.NEEDS_RPMS]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/Packaging/' \
@@ -684,7 +715,7 @@ class CheckLicenseField(CheckBase):
 
         source = self.sources.get('Source0')
         try:
-            if self.srpm.build() != 0:
+            if self.srpm.build() != 0 or self.srpm.from_cache:
                 source.extract()
                 source_dir = source.extract_dir
                 msg = 'Checking original sources for licenses'
@@ -731,6 +762,8 @@ class CheckMultipleLicenses(CheckBase):
     '''
     http://fedoraproject.org/wiki/Packaging:LicensingGuidelines#Multiple_Licensing_Scenarios
     '''
+    needs = [CheckBase.NEEDS_SPEC]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -752,6 +785,8 @@ class CheckLicensInDoc(CheckBase):
     http://fedoraproject.org/wiki/Packaging/LicensingGuidelines#License_Text
     '''
 
+    needs = [CheckBase.NEEDS_SPEC, CheckBase.NEEDS_RPMS]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -796,6 +831,8 @@ class CheckLicenseInSubpackages(CheckBase):
     '''
     http://fedoraproject.org/wiki/Packaging/LicensingGuidelines#Subpackage_Licensing
     '''
+    needs = [CheckBase.NEEDS_SPEC]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -919,6 +956,8 @@ class CheckFilesDuplicates(CheckBase):
     specific situations)
     http://fedoraproject.org/wiki/Packaging/Guidelines#DuplicateFiles
     '''
+    needs = [CheckBase.NEEDS_RPMS]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -928,19 +967,15 @@ class CheckFilesDuplicates(CheckBase):
         self.type = 'MUST'
 
     def run(self):
-        from subprocess import Popen, PIPE
-        filename = os.path.join(Mock.resultdir, 'build.log')
-        try:
-            stream = open(filename)
-            content = stream.read()
-            stream.close()
-            for line in content.split('\n'):
-                if 'File listed twice' in line:
-                    self.set_passed(False, line)
-                    return
-            self.set_passed(True)
-        except Exception, er:
+        index = self.srpm.get_build_log_index()
+        if not index:
             self.set_passed('inconclusive')
+            return
+        events = index.get(DUPLICATE_FILE)
+        if events:
+            self.set_passed(False, '\n'.join([e.text for e in events]))
+        else:
+            self.set_passed(True)
 
 
 class CheckFilePermissions(CheckBase):
@@ -950,6 +985,8 @@ class CheckFilePermissions(CheckBase):
     %files section must include a %defattr(...) line
     http://fedoraproject.org/wiki/Packaging/Guidelines#FilePermissions
     '''
+    needs = [CheckBase.NEEDS_RPMS]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -970,6 +1007,8 @@ class CheckNoConfigInUsr(CheckBase):
     '''
     http://fedoraproject.org/wiki/Packaging/Guidelines#Configuration_files
     '''
+    needs = [CheckBase.NEEDS_SPEC]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -1005,6 +1044,8 @@ class CheckConfigNoReplace(CheckBase):
     '''
     http://fedoraproject.org/wiki/Packaging/Guidelines#Configuration_files
     '''
+    needs = [CheckBase.NEEDS_SPEC]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -1042,6 +1083,8 @@ class CheckDesktopFile(CheckBase):
     comment in the spec file with your explanation.
     http://fedoraproject.org/wiki/Packaging/Guidelines#desktop
     '''
+    needs = [CheckBase.NEEDS_RPMS]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -1063,6 +1106,8 @@ class CheckDesktopFileInstall(CheckBase):
     with desktop-file-install in the %install section.
     http://fedoraproject.org/wiki/Packaging/Guidelines#desktop
     '''
+    needs = [CheckBase.NEEDS_SPEC, CheckBase.NEEDS_RPMS]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -1104,6 +1149,8 @@ class CheckUTF8Filenames(CheckBase):
     MUST: All filenames in rpm packages must be valid UTF-8.
     http://fedoraproject.org/wiki/Packaging/Guidelines#FilenameEncoding
     '''
+    needs = [CheckBase.NEEDS_RPMS]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -1193,6 +1240,8 @@ class CheckReqPkgConfig(CheckBase):
     must Requires: pkgconfig (for directory ownership and usability).
     http://fedoraproject.org/wiki/EPEL/GuidelinesAndPolicies#EL5
     '''
+    needs = [CheckBase.NEEDS_SPEC, CheckBase.NEEDS_RPMS]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -1242,6 +1291,8 @@ class CheckFullVerReqSub(CheckBase):
     Requires: %{name}%{?_isa} = %{version}-%{release}
     http://fedoraproject.org/wiki/Packaging/Guidelines#RequiringBasePackage
     '''
+    needs = [CheckBase.NEEDS_SPEC]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -1290,6 +1341,8 @@ class CheckUsefulDebuginfo(CheckBase):
     http://fedoraproject.org/wiki/Packaging/Guidelines#Debuginfo_packages
     http://fedoraproject.org/wiki/Packaging:Debuginfo
     '''
+    needs = [CheckBase.NEEDS_RPMS]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -1314,6 +1367,8 @@ class CheckNoConflicts(CheckBase):
     http://fedoraproject.org/wiki/Packaging/Guidelines#Conflicts
     http://fedoraproject.org/wiki/Packaging:Conflicts
     '''
+    needs = [CheckBase.NEEDS_SPEC]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/' \
@@ -1353,6 +1408,8 @@ class CheckExcludeArch(CheckBase):
 
 
 class CheckPackageInstalls(CheckBase):
+    needs = [CheckBase.NEEDS_RPMS, CheckBase.NEEDS_CHROOT]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'https://fedoraproject.org/wiki/Packaging:Guidelines'
@@ -1466,6 +1523,9 @@ class CheckSourceUrl(CheckBase):
     '''
     http://fedoraproject.org/wiki/Packaging/SourceURL
     '''
+    needs = [CheckBase.NEEDS_SPEC]
+    cacheable = False
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/Packaging/SourceURL'
@@ -1492,6 +1552,8 @@ class CheckSourceComment(CheckBase):
     https://fedoraproject.org/wiki/Packaging:SourceURL#Troublesome_URLs
     and https://fedoraproject.org/wiki/Packaging:SourceURL#Using_Revision_Control
     '''
+    needs = [CheckBase.NEEDS_SPEC]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/Packaging:SourceURL'
@@ -1516,6 +1578,8 @@ class CheckSourcePatchPrefix(CheckBase):
     '''
     http://fedoraproject.org/wiki/Packaging/SourceURL
     '''
+    needs = [CheckBase.NEEDS_SPEC]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/Packaging/SourceURL'
@@ -1567,6 +1631,8 @@ class CheckBuildInMock(CheckBase):
     SHOULD: The reviewer should test that the package builds in mock.
     http://fedoraproject.org/wiki/PackageMaintainers/MockTricks
     '''
+    needs = [CheckBase.NEEDS_RPMS]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -1595,14 +1661,25 @@ class CheckSupportAllArchs(CheckBase):
                    'Packaging/Guidelines#ArchitectureSupport'
         self.text = 'Package should compile and build into binary' \
                     ' rpms on all supported architectures.'
-        self.automatic = False
+        self.automatic = bool(Settings.extra_mock_configs)
         self.type = 'SHOULD'
 
+    def run(self):
+        builds = self.srpm.get_extra_builds() if self.srpm else []
+        if not builds:
+            self.set_passed('inconclusive')
+            return
+        text = 'Builds using --extra-mock-configs:\n'
+        text += '\n'.join([b.summary() for b in builds])
+        self.set_passed(all([b.ok for b in builds]), text)
+
 
 class CheckDistTag(CheckBase):
     '''
     http://fedoraproject.org/wiki/DistTag
     '''
+    needs = [CheckBase.NEEDS_SPEC]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'https://fedoraproject.org/wiki/Packaging:Guidelines'
@@ -1623,6 +1700,8 @@ class CheckUseGlobal(CheckBase):
     '''
     http://fedoraproject.org/wiki/Packaging/Guidelines#.25global_preferred_over_.25define
     '''
+    needs = [CheckBase.NEEDS_SPEC]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/Packaging/' \
@@ -1650,6 +1729,8 @@ class CheckScriptletSanity(CheckBase):
     sanity.
     http://fedoraproject.org/wiki/Packaging/Guidelines#Scriptlets
     '''
+    needs = [CheckBase.NEEDS_SPEC]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -1672,6 +1753,8 @@ class CheckPkgConfigFiles(CheckBase):
     e.g. gcc or gdb.
     http://fedoraproject.org/wiki/Packaging/Guidelines#PkgconfigFiles
     '''
+    needs = [CheckBase.NEEDS_RPMS]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -1705,6 +1788,8 @@ class CheckFileRequires(CheckBase):
     which provides the file instead of the file itself.
     http://fedoraproject.org/wiki/Packaging/Guidelines#FileDeps
     '''
+    needs = [CheckBase.NEEDS_RPMS]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -1736,18 +1821,16 @@ class CheckFileRequires(CheckBase):
             return '\n    '.join(provides) + '\n'
 
         wrong_req = []
-        rpm_files = self.srpm.get_used_rpms('src.rpm')
+        headers = self.srpm.get_rpm_headers()
         req_txt = ''
         prov_txt = ''
-        for rpm in rpm_files:
-            cmd = 'rpm -qp --requires ' + rpm
-            requires = self._run_cmd(cmd).split('\n')
+        for rpm in sorted(headers):
+            requires = headers[rpm].requires
             for req in requires:
                 if not is_acceptable(req):
                     wrong_req.append(req)
             req_txt += get_requires(rpm, requires) + '\n'
-            cmd = 'rpm -qp --provides ' + rpm
-            provides = self._run_cmd(cmd).split('\n')
+            provides = headers[rpm].provides
             prov_txt += get_provides(rpm, provides) + '\n'
         self.attachments = [ Attachment( 'Requires', req_txt, 10),
                              Attachment( 'Provides', prov_txt, 10)]
@@ -1778,6 +1861,8 @@ class CheckManPages(CheckBase):
     make sense.
     http://fedoraproject.org/wiki/Packaging/Guidelines#Man_pages
     '''
+    needs = [CheckBase.NEEDS_RPMS]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'http://fedoraproject.org/wiki/' \
@@ -1791,6 +1876,8 @@ class CheckManPages(CheckBase):
 
 
 class CheckParallelMake(CheckBase):
+    needs = [CheckBase.NEEDS_SPEC]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'https://fedoraproject.org/wiki/Packaging:Guidelines'
@@ -1824,6 +1911,8 @@ class CheckParallelMake(CheckBase):
 
 
 class CheckPatchComments(CheckBase):
+    needs = [CheckBase.NEEDS_SPEC]
+
     def __init__(self, base):
         CheckBase.__init__(self, base)
         self.url = 'https://fedoraproject.org/wiki/' \
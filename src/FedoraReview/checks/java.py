@@ -8,6 +8,7 @@ from FedoraReview import LangCheckBase
 class JavaCheckBase(LangCheckBase):
     """Base check for Java checks"""
     header = "Java"
+    needs = [LangCheckBase.NEEDS_SPEC, LangCheckBase.NEEDS_RPMS]
 
     def is_applicable(self):
         if self.has_files("*.jar") or self.has_files("*.pom"):
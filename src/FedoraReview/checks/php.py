@@ -12,6 +12,7 @@ from FedoraReview import LangCheckBase, Settings
 class PhpCheckBase(LangCheckBase):
     """ Base class for all PHP specific checks. """
     header="PHP"
+    needs = [LangCheckBase.NEEDS_SPEC]
     DIR = ['%{packname}']
     DOCS = []
     URLS = []
@@ -8,6 +8,7 @@ from FedoraReview import LangCheckBase
 
 class RubyCheckBase(LangCheckBase):
     """ Base class for all Ruby specific checks. """
+    needs = [LangCheckBase.NEEDS_SPEC, LangCheckBase.NEEDS_RPMS]
     _guidelines_uri = 'http://fedoraproject.org/wiki/Packaging:Ruby'
     _guidelines_section_uri = '%(uri)s#%%(section)s' % {'uri': _guidelines_uri}
 
@@ -22,6 +22,7 @@ from FedoraReview import LangCheckBase
 
 class SugarActivityCheckBase(LangCheckBase):
     header = 'SugarActivity'
+    needs = [LangCheckBase.NEEDS_SPEC, LangCheckBase.NEEDS_RPMS]
 
     def is_applicable(self):
         return self.has_files_re('^/usr/(share|lib|lib64)/sugar/activities/')
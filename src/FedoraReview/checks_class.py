@@ -25,12 +25,14 @@ import os
 from operator import attrgetter
 from straight.plugin import load
 
+from check_scheduler import CheckScheduler
 from settings import  Settings
 from srpm_file import  SRPMFile
 from spec_file import  SpecFile
 from sources import  Sources
 from version import  __version__, build_id, build_date
-from jsonapi import JSONPlugin
+from jsonapi import JSONPlugin, PluginData, run_plugins
+from result_cache import get_result_cache
 
 
 HEADER = """
@@ -44,6 +46,57 @@ x = Pass
 ? = Not evaluated
 
 """
+_plugins = None
+
+
+def write_report(output, results, plugins):
+    ''' Write the report for the list of TestResult to output.
+    plugins is a list of (path, version) for the external plugins.
+    '''
+    issues = [r for r in results
+                  if r.type == 'MUST' and r.result == "fail"]
+    attachments = []
+    for result in results:
+        attachments.extend(result.attachments)
+    results = sorted(results, key=attrgetter('group', 'type', 'name'))
+
+    output.write(HEADER)
+    current_section = None
+    for res in results:
+        if res.group != current_section:
+            output.write("\n\n==== %s ====\n" % res.group)
+            current_section = res.group
+
+        output.write(res.get_text())
+        output.write('\n')
+
+    if issues:
+        output.write("\nIssues:\n")
+        for fail in issues:
+            output.write(fail.get_text() + "\n")
+            output.write("See: %s\n" % fail.url)
+
+    if len(attachments) > 0:
+        output.write('\n')
+    for a in sorted(attachments):
+        output.write(a.__str__())
+
+    output.write('\n\nGenerated by fedora-review'
+                 ' %s (%s) last change: %s\n' %
+                 (__version__, build_id, build_date))
+    output.write('Command line :' + ' '.join(sys.argv) +'\n')
+    output.write("External plugins:\n")
+    for path, version in plugins:
+        output.write("%s version: %s\n" % (path, version))
+
+
+def _load_plugins():
+    ''' Return the check modules, loaded once. '''
+    global _plugins
+    if _plugins is None:
+        _plugins = load('FedoraReview.checks')
+    return _plugins
+
 
 class Checks(object):
     ''' Interface class to load, select and run checks. '''
@@ -54,6 +107,7 @@ class Checks(object):
         self.checks = []
         self.ext_checks = []
         self._results = {'PASSED': [], 'FAILED': [], 'NA': [], 'USER': []}
+        self.results = []
         self.log = Settings.get_logger()
         if hasattr(self, 'sources'):
             # This is  a listing instance
@@ -63,7 +117,7 @@ class Checks(object):
             self.spec = SpecFile(spec_file)
             self.sources = Sources(self.spec)
             self.srpm = SRPMFile(srpm_file, self.spec)
-        self.plugins = load('FedoraReview.checks')
+        self.plugins = _load_plugins()
         self.add_check_classes()
         if Settings.single:
             self.set_single_check(Settings.single)
@@ -92,6 +146,7 @@ class Checks(object):
         if "REVIEW_EXT_DIRS" in os.environ:
             ext_dirs = os.environ["REVIEW_EXT_DIRS"].split(":")
         ext_dirs.extend(Settings.ext_dirs.split(":"))
+        plugin_data = PluginData(self.spec, self.srpm)
         for ext_dir in ext_dirs:
             if not os.path.isdir(ext_dir):
                 continue
@@ -99,7 +154,7 @@ class Checks(object):
                 full_path = "%s/%s" % (ext_dir, plugin)
                 if os.path.isfile(full_path) and os.access(full_path, os.X_OK):
                     self.log.debug('Add external module: %s' % full_path)
-                    pl = JSONPlugin(self, full_path)
+                    pl = JSONPlugin(self, full_path, plugin_data)
                     self.ext_checks.append(pl)
 
     def add(self, class_name):
@@ -151,82 +206,38 @@ class Checks(object):
                      self.checks.remove(check)
                      self.checks.insert(0,check)
 
-        issues = []
         results = []
         deprecated = []
-        attachments = []
 
         # First, run state-changing build and install:
         mv_check_to_front('CheckPackageInstalls')
         mv_check_to_front('CheckBuild')
 
+        if self.srpm and Settings.pipeline:
+            self.srpm.start_build()
+
         # run external checks first so we can get what they deprecate
+        run_plugins(self.ext_checks, Settings.plugin_jobs,
+                    Settings.plugin_timeout)
         for ext in self.ext_checks:
-            self.log.debug('Running external module : %s' % ext.plugin_path)
-            ext.run()
             for result in ext.get_results():
                 results.append(result)
-                if result.type == 'MUST' and result.result == "fail":
-                    issues.append(result)
                 deprecated.extend(result.deprecates)
-                attachments.extend(result.attachments)
-
-        # we only add to deprecates is deprecating test will be run
-        for test in self.checks:
-            if test.is_applicable():
-                deprecated.extend(test.deprecates)
-
-        for test in self.checks:
-            if test.is_applicable() and test.name not in deprecated:
-                test.run()
-                result = test.get_result()
-                results.append(result)
-                attachments.extend(result.attachments)
-                self.log.debug('Running check : %s %s [%s] ' % (
-                    test.name,
-                    " " * (30 - len(test.name)),
-                    test.state))
-                if result:
-                    if result.type == 'MUST' and result.result == "fail":
-                        issues.append(result)
 
+        scheduler = CheckScheduler(self, Settings.jobs, get_result_cache())
+        tests = scheduler.run(self.checks, deprecated)
+        for test in tests:
+            result = test.get_result()
+            results.append(result)
+            self.log.debug('Running check : %s %s [%s] ' % (
+                test.name,
+                " " * (30 - len(test.name)),
+                test.state))
+
+        self.results = results
         if writedown:
-            key_getter = attrgetter('group', 'type', 'name')
-            self.__show_output(output,
-                               sorted(results, key=key_getter),
-                               issues,
-                               attachments)
-
-    def __show_output(self, output, results, issues, attachments):
-        output.write(HEADER)
-        current_section = None
-        for res in results:
-            if res.group != current_section:
-                output.write("\n\n==== %s ====\n" % res.group)
-                current_section = res.group
-
-            output.write(res.get_text())
-            output.write('\n')
-
-        if issues:
-            output.write("\nIssues:\n")
-            for fail in issues:
-                output.write(fail.get_text() + "\n")
-                output.write("See: %s\n" % fail.url)
-
-        if len(attachments) > 0:
-            output.write('\n')
-        for a in sorted(attachments):
-            output.write(a.__str__())
-
-        output.write('\n\nGenerated by fedora-review'
-                     ' %s (%s) last change: %s\n' % 
-                     (__version__, build_id, build_date))
-        output.write('Command line :' + ' '.join(sys.argv) +'\n')
-        output.write("External plugins:\n")
-        for plugin in self.ext_checks:
-            output.write("%s version: %s\n" % (plugin.plugin_path,
-                                               plugin.version))
+            write_report(output, results,
+                         [(p.plugin_path, p.version) for p in self.ext_checks])
 
 
 class ChecksLister(Checks):
@@ -0,0 +1,179 @@
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+
+'''
+A pool of initialized mock roots, reused between reviews.
+'''
+
+import errno
+import fcntl
+import json
+import os
+import os.path
+import tempfile
+import time
+
+from contextlib import contextmanager
+from subprocess import Popen, PIPE, STDOUT
+
+from settings import Settings
+
+STATE_FILE = os.path.join(os.environ['XDG_CACHE_HOME']
+                              if 'XDG_CACHE_HOME' in os.environ
+                              else os.path.expanduser('~/.cache'),
+                          'fedora-review', 'chroot-pool.json')
+
+
+def _is_alive(pid):
+    ''' Return True if process pid exists. '''
+    try:
+        os.kill(pid, 0)
+    except OSError as err:
+        return err.errno == errno.EPERM
+    return True
+
+
+class ChrootPool(object):
+    ''' Up to size mock roots for a mock config, separated using mock's
+    --uniqueext. A new root is initialized once and saved with
+    mock --snapshot. Later reviews restore it with mock --rollback-to
+    instead of building a new chroot, which requires a mock config
+    with snapshot support (lvm_root or overlayfs plugin). The state
+    is shared by all fedora-review processes through a locked file.
+    '''
+
+    SNAPSHOT = 'fedora-review-clean'
+
+    def __init__(self, config, size, state_file=STATE_FILE, mock='mock'):
+        self.log = Settings.get_logger()
+        self.config = config if config else 'default'
+        self.size = size
+        self.state_file = state_file
+        self.mock = mock
+        try:
+            os.makedirs(os.path.dirname(state_file))
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise
+
+    @contextmanager
+    def _state(self):
+        ''' Lock and read the roots for this config, write back
+        when done.
+        '''
+        with open(self.state_file + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(self.state_file) as f:
+                    state = json.load(f)
+            except (IOError, ValueError):
+                state = {}
+            yield state.setdefault(self.config, {})
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.state_file))
+            with os.fdopen(fd, 'w') as f:
+                json.dump(state, f, indent=2)
+            os.rename(tmp, self.state_file)
+
+    def _run_mock(self, ext, args):
+        ''' Run mock on root ext with args, return True if OK. '''
+        cmd = [self.mock, '-r', self.config, '--uniqueext=' + ext] + args
+        self.log.debug('Chroot pool command: ' + ' '.join(cmd))
+        try:
+            p = Popen(cmd, stdout=PIPE, stderr=STDOUT)
+            output = p.communicate()[0]
+        except OSError:
+            self.log.warning('Cannot run ' + self.mock, exc_info=True)
+            return False
+        if p.returncode != 0:
+            self.log.debug('Chroot pool command failed: ' + output)
+        return p.returncode == 0
+
+    def _create(self, ext):
+        ''' Initialize and snapshot a new root, return seconds used
+        or None on errors.
+        '''
+        start = time.time()
+        if not self._run_mock(ext, ['--init']):
+            self.log.warning('Cannot init mock root ' + ext)
+            return None
+        if not self._run_mock(ext, ['--snapshot', self.SNAPSHOT]):
+            self.log.warning('Cannot snapshot mock root %s, snapshot'
+                             ' support is required for --chroot-pool'
+                             % ext)
+            return None
+        return time.time() - start
+
+    def acquire(self):
+        ''' Return the uniqueext for a clean root reserved for this
+        process, or None if there is no root available.
+        '''
+        with self._state() as roots:
+            for ext, root in sorted(roots.iteritems()):
+                if root.get('pid') and _is_alive(root['pid']):
+                    continue
+                root['pid'] = os.getpid()
+                break
+            else:
+                if len(roots) >= self.size:
+                    self.log.info('All %d warm mock roots are busy'
+                                  % self.size)
+                    return None
+                ix = 0
+                while 'review%d' % ix in roots:
+                    ix += 1
+                ext = 'review%d' % ix
+                root = {'pid': os.getpid()}
+                roots[ext] = root
+            is_new = not 'init_time' in root
+
+        if is_new:
+            self.log.info('Creating warm mock root %s for %s'
+                          % (ext, self.config))
+            init_time = self._create(ext)
+            with self._state() as roots:
+                if init_time is None:
+                    del roots[ext]
+                    return None
+                roots[ext]['init_time'] = init_time
+                roots[ext]['saved'] = 0.0
+            return ext
+
+        start = time.time()
+        if not self._run_mock(ext, ['--rollback-to', self.SNAPSHOT]):
+            self.log.warning('Cannot restore warm mock root ' + ext)
+            with self._state() as roots:
+                del roots[ext]
+            return None
+        used = time.time() - start
+        with self._state() as roots:
+            saved = max(0.0, roots[ext]['init_time'] - used)
+            roots[ext]['saved'] += saved
+            total = sum([r.get('saved', 0.0) for r in roots.itervalues()])
+        self.log.info('Using warm mock root %s: restored in %.1f s, saved'
+                      ' %.1f s (%.1f s in total for %s)'
+                      % (ext, used, saved, total, self.config))
+        return ext
+
+    def release(self, ext):
+        ''' Make root ext available for other reviews. '''
+        with self._state() as roots:
+            if ext in roots and roots[ext].get('pid') == os.getpid():
+                roots[ext]['pid'] = None
+
+
+# vim: set expandtab: ts=4:sw=4:
@@ -0,0 +1,86 @@
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+
+'''
+Packages installed in a mock chroot.
+'''
+
+from subprocess import Popen, PIPE
+from threading import Lock
+
+from settings import Settings
+
+_QUERYFORMAT = '%{NAME}\t%|EPOCH?{%{EPOCH}}:{0}|:%{VERSION}-%{RELEASE}\n'
+
+
+class ChrootRpmDb(object):
+    ''' The rpm database in a chroot, read once using a single
+    rpm -qa and cached until invalidate() is called e. g., after
+    installing packages.
+    '''
+
+    def __init__(self, dbpath, rpm='rpm'):
+        self.log = Settings.get_logger()
+        self.dbpath = dbpath
+        self.rpm = rpm
+        self._packages = None
+        self._lock = Lock()
+
+    def _load(self):
+        ''' Return dict of evr by name for all installed packages. '''
+        cmd = [self.rpm, '--dbpath', self.dbpath, '-qa',
+               '--queryformat', _QUERYFORMAT]
+        self.log.debug('Chroot rpmdb query: ' + ' '.join(cmd))
+        packages = {}
+        try:
+            p = Popen(cmd, stdout=PIPE, stderr=PIPE)
+            output, error = p.communicate()
+        except OSError:
+            self.log.warning('Cannot query chroot rpmdb', exc_info=True)
+            return packages
+        if p.returncode != 0:
+            self.log.debug('Chroot rpmdb query error: ' + error)
+        for line in output.split('\n'):
+            if '\t' in line:
+                name, evr = line.split('\t', 1)
+                packages[name] = evr
+        return packages
+
+    def get_all(self):
+        ''' Return dict of epoch:version-release by name for all
+        installed packages.
+        '''
+        with self._lock:
+            if self._packages is None:
+                self._packages = self._load()
+            return self._packages
+
+    def query(self, names):
+        ''' Return dict of epoch:version-release by name for the
+        installed packages in names.
+        '''
+        packages = self.get_all()
+        return dict([(n, packages[n]) for n in names if n in packages])
+
+    def invalidate(self):
+        ''' Drop cached data, re-read on next query. '''
+        with self._lock:
+            self._packages = None
+
+
+# vim: set expandtab: ts=4:sw=4:
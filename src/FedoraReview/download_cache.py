@@ -0,0 +1,212 @@
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+
+'''
+Persistent cache for downloaded files, shared by all reviews.
+'''
+
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import os.path
+import shutil
+import tempfile
+import time
+import urllib2
+
+from contextlib import contextmanager
+from threading import Lock
+from urlparse import urlparse
+
+import downloader
+
+from settings import Settings
+
+CACHE_DIR = os.path.join(os.environ['XDG_CACHE_HOME']
+                             if 'XDG_CACHE_HOME' in os.environ
+                             else os.path.expanduser('~/.cache'),
+                         'fedora-review', 'downloads')
+
+# Objects are stored using this digest.
+KEY_DIGEST = 'sha256'
+
+_cache = None
+_cache_lock = Lock()
+
+
+def get_download_cache():
+    ''' Return the shared DownloadCache, None if disabled. '''
+    global _cache
+    with _cache_lock:
+        if not _cache and Settings.cache_size > 0:
+            _cache = DownloadCache(CACHE_DIR,
+                                   Settings.cache_size * 1024 * 1024)
+        return _cache
+
+
+class DownloadCache(object):
+    ''' Downloaded files stored by content in cache_dir/objects, named
+    by their sha256 digest. The index maps urls to objects and to the
+    ETag and Last-Modified headers used to revalidate them. When the
+    total size exceeds max_size, least recently used objects are
+    removed. The index is locked, so several processes can share
+    the cache.
+    '''
+
+    def __init__(self, cache_dir, max_size):
+        self.log = Settings.get_logger()
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.partial_dir = os.path.join(cache_dir, 'partial')
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self._lock = Lock()
+        for path in [self.objects_dir, self.partial_dir]:
+            try:
+                os.makedirs(path)
+            except OSError as err:
+                if err.errno != errno.EEXIST:
+                    raise
+
+    @staticmethod
+    def is_cacheable(url):
+        ''' Return True for urls which can be cached. '''
+        return urlparse(url).scheme in ['http', 'https', 'ftp']
+
+    @contextmanager
+    def _index(self):
+        ''' Lock and read the index, write it back when done. '''
+        lockfile = os.path.join(self.cache_dir, 'index.lock')
+        with self._lock, open(lockfile, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(self.index_path) as f:
+                    index = json.load(f)
+            except (IOError, ValueError):
+                index = {'urls': {}, 'objects': {}}
+            yield index
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(index, f)
+            os.rename(tmp, self.index_path)
+
+    def _object_path(self, digest):
+        ''' Return path to object with given digest. '''
+        return os.path.join(self.objects_dir, digest)
+
+    def _evict(self, index):
+        ''' Remove least recently used objects until total size is
+        within max_size.
+        '''
+        objects = index['objects']
+        total = sum([o['size'] for o in objects.itervalues()])
+        by_age = sorted(objects.keys(), key=lambda d: objects[d]['used'])
+        while total > self.max_size and by_age:
+            digest = by_age.pop(0)
+            total -= objects[digest]['size']
+            del objects[digest]
+            try:
+                os.unlink(self._object_path(digest))
+            except OSError:
+                pass
+            self.log.debug('Download cache: evicted ' + digest)
+        for url, entry in index['urls'].items():
+            if not entry['digest'] in objects:
+                del index['urls'][url]
+
+    def _fetch(self, url, entry):
+        ''' Download url, revalidating entry if not None. Return
+        (digests, response headers) or (None, headers) if entry
+        is not modified.
+        '''
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('modified'):
+            headers['If-Modified-Since'] = entry['modified']
+        # Partial downloads are kept here, to be resumed.
+        path = os.path.join(self.partial_dir,
+                            hashlib.sha1(url).hexdigest())
+        # Others fetching the same url wait, they use the same files.
+        with open(path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                info, digests = downloader.retrieve(
+                    url, path, [KEY_DIGEST, Settings.checksum], headers)
+            except urllib2.HTTPError as err:
+                if err.code == 304 and entry:
+                    return None, err.info()
+                raise
+            os.rename(path, self._object_path(digests[KEY_DIGEST]))
+        return digests, info
+
+    def retrieve(self, url, path, checksum=None, revalidate=True):
+        ''' Copy url to path, downloading only if not cached. A cached
+        url is revalidated with the server unless revalidate is False.
+        If the sha256 checksum is given, any object with this content
+        is used without touching the network. Returns dict of digests
+        by algorithm computed when the file was downloaded.
+        '''
+        with self._index() as index:
+            entry = index['urls'].get(url)
+            if entry and not entry['digest'] in index['objects']:
+                entry = None
+            digest, digests, headers = None, None, None
+            if checksum and checksum in index['objects']:
+                digest = checksum
+            elif entry and not revalidate:
+                digest = entry['digest']
+        if not digest:
+            try:
+                digests, headers = self._fetch(url, entry)
+            except urllib2.HTTPError:
+                raise
+            except IOError:
+                # Network problems, but not e. g., a removed file.
+                if not entry:
+                    raise
+                self.log.warning('Cannot revalidate %s, using cached copy'
+                                 % url)
+                digests, headers = None, None
+            if digests:
+                self.log.debug('Download cache: stored ' + url)
+                digest = digests[KEY_DIGEST]
+            else:
+                self.log.debug('Download cache: not modified: ' + url)
+                digest = entry['digest']
+        with self._index() as index:
+            obj = index['objects'].setdefault(digest, {'checksums': {}})
+            if digests:
+                obj['checksums'].update(digests)
+                obj['size'] = os.path.getsize(self._object_path(digest))
+            if headers:
+                old = entry if not digests else {}
+                index['urls'][url] = {
+                    'digest': digest,
+                    'etag': headers.get('ETag', old.get('etag')),
+                    'modified': headers.get('Last-Modified',
+                                            old.get('modified'))}
+            obj['used'] = time.time()
+            shutil.copyfile(self._object_path(digest), path)
+            self._evict(index)
+            return dict(obj['checksums'])
+
+
+# vim: set expandtab: ts=4:sw=4:
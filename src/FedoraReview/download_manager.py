@@ -0,0 +1,135 @@
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+
+'''
+Concurrent downloads of spec, srpm and sources.
+'''
+
+import os.path
+import sys
+import time
+
+from multiprocessing.pool import ThreadPool
+from threading import Event, Lock
+
+from helpers import Helpers
+from settings import Settings
+
+
+class Download(object):
+    ''' A queued, running or completed download. Attributes:
+         - url, path: what is downloaded, and where.
+         - label: shown in progress messages e. g., 'Source0'.
+         - state: one of QUEUED, RUNNING, DONE or FAILED.
+         - elapsed: seconds used for the download.
+         - size: bytes in path when done.
+         - error: exception info if FAILED.
+         - checksums: dict of hex digests by algorithm computed
+           while downloading, possibly empty.
+    '''
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, url, path, label):
+        self.url = url
+        self.path = path
+        self.label = label
+        self.state = self.QUEUED
+        self.elapsed = 0.0
+        self.size = 0
+        self.error = None
+        self.checksums = {}
+        self._done = Event()
+
+    def wait(self):
+        ''' Wait for download to complete, return path. Raises the
+        download exception if it failed.
+        '''
+        self._done.wait()
+        if self.error:
+            raise self.error[0], self.error[1], self.error[2]
+        return self.path
+
+
+class _DownloadManager(Helpers):
+    ''' Runs downloads in a pool of threads, at most --downloads at
+    the same time. A url/path already queued or running is not
+    downloaded again.
+    '''
+
+    def __init__(self):
+        Helpers.__init__(self)
+        self._pool = None
+        self._lock = Lock()
+        self.downloads = []
+
+    def _run(self, download):
+        ''' Perform a download, in a pool thread. '''
+        self.log.info("Downloading (%s): %s" % (download.label,
+                                                download.url))
+        download.state = Download.RUNNING
+        start = time.time()
+        try:
+            download.checksums = \
+                self._download(download.url, download.path) or {}
+            download.size = os.path.getsize(download.path)
+            download.state = Download.DONE
+        except:
+            download.error = sys.exc_info()
+            download.state = Download.FAILED
+        download.elapsed = time.time() - start
+        if download.state == Download.DONE:
+            self.log.info("  --> (%s): %d kB in %.1f s" %
+                          (download.label, download.size / 1024,
+                           download.elapsed))
+        download._done.set()
+
+    def submit(self, url, path, label=None):
+        ''' Queue download of url to path, return the Download. '''
+        with self._lock:
+            for download in self.downloads:
+                if download.url == url and download.path == path \
+                and not download._done.is_set():
+                    return download
+            download = Download(url, path, label if label else url)
+            self.downloads.append(download)
+            if not self._pool:
+                self._pool = ThreadPool(max(1, Settings.downloads))
+            self._pool.apply_async(self._run, (download,))
+            return download
+
+    def reset(self):
+        ''' Forget all completed downloads. '''
+        with self._lock:
+            self.downloads = [d for d in self.downloads
+                              if not d._done.is_set()]
+
+    def report(self):
+        ''' Log state and timing for all downloads. '''
+        for download in self.downloads:
+            self.log.debug('Download %-10s %-7s %10d bytes %6.1f s  %s' %
+                           (download.label, download.state, download.size,
+                            download.elapsed, download.url))
+
+
+DownloadManager = _DownloadManager()
+
+# vim: set expandtab: ts=4:sw=4:
@@ -0,0 +1,129 @@
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+
+'''
+Streaming downloads, computing checksums on the fly and resuming
+partial downloads.
+'''
+
+import hashlib
+import httplib
+import os
+import os.path
+import socket
+import urllib2
+
+from settings import Settings
+
+CHUNK_SIZE = 65536
+RETRIES = 3
+TIMEOUT = 120
+
+
+def _read_validator(path):
+    ''' Return ETag/Last-Modified saved for a partial download. '''
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except IOError:
+        return None
+
+
+def _write_validator(path, info):
+    ''' Save ETag or Last-Modified for a partial download, if any. '''
+    validator = info.get('ETag') or info.get('Last-Modified')
+    if validator:
+        with open(path, 'w') as f:
+            f.write(validator)
+    elif os.path.exists(path):
+        os.unlink(path)
+
+
+def retrieve(url, path, algorithms, headers=None, retries=RETRIES):
+    ''' Download url to path, computing digests while writing. Data
+    is written to path.part, renamed to path when complete. A partial
+    file left by an interrupted download is resumed using a http
+    Range request if the server provided an ETag or Last-Modified
+    header, and dropped connections are retried. Returns tuple of
+    (response headers, dict of hex digests by algorithm). Errors,
+    including not modified (304) replies, raise IOError.
+    '''
+    log = Settings.get_logger()
+    part = path + '.part'
+    part_validator = part + '.validator'
+    attempt = 0
+    while True:
+        attempt += 1
+        validator = _read_validator(part_validator)
+        if os.path.exists(part) and not validator:
+            os.unlink(part)
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        request = urllib2.Request(url)
+        for key, value in (headers if headers else {}).iteritems():
+            request.add_header(key, value)
+        if offset:
+            request.add_header('Range', 'bytes=%d-' % offset)
+            request.add_header('If-Range', validator)
+        try:
+            istream = urllib2.urlopen(request, timeout=TIMEOUT)
+        except urllib2.HTTPError as err:
+            if err.code == 416 and offset:
+                # Bad range, partial file is broken.
+                os.unlink(part)
+                continue
+            raise
+        try:
+            hashes = dict([(a, hashlib.new(a)) for a in set(algorithms)])
+            info = istream.info()
+            if offset and istream.getcode() == 206:
+                log.debug('Resuming %s at %d bytes' % (url, offset))
+                with open(part, 'rb') as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), ''):
+                        for h in hashes.itervalues():
+                            h.update(chunk)
+                mode = 'ab'
+            else:
+                offset = 0
+                mode = 'wb'
+                _write_validator(part_validator, info)
+            length = info.get('Content-Length')
+            expected = offset + int(length) if length else None
+            with open(part, mode) as ostream:
+                for chunk in iter(lambda: istream.read(CHUNK_SIZE), ''):
+                    ostream.write(chunk)
+                    for h in hashes.itervalues():
+                        h.update(chunk)
+                size = ostream.tell()
+            if expected and size < expected:
+                raise IOError('got %d of %d bytes' % (size, expected))
+        except (IOError, socket.error, httplib.HTTPException) as err:
+            if attempt > retries:
+                raise IOError('Download of %s failed: %s' % (url, err))
+            log.warning('Retrying interrupted download of %s: %s' %
+                        (url, err))
+            continue
+        finally:
+            istream.close()
+        os.rename(part, path)
+        if os.path.exists(part_validator):
+            os.unlink(part_validator)
+        return info, dict([(a, h.hexdigest())
+                           for a, h in hashes.iteritems()])
+
+
+# vim: set expandtab: ts=4:sw=4:
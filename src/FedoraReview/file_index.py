@@ -0,0 +1,212 @@
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+
+'''
+Indexed file lists, answering fnmatch and regex queries without
+scanning all files for each query.
+'''
+
+import os.path
+import re
+
+from threading import Lock
+
+MAGIC = re.compile('[*?[]')
+# Wildcards and character classes, splitting literal parts.
+MAGIC_CHUNK = re.compile('[*?]|\\[!?\\]?[^]]*\\]|\\[')
+
+
+def translate(pattern):
+    ''' Like fnmatch.translate(), but for a multiline regex matching
+    one path per line: wildcards never matches a newline.
+    '''
+    i, n = 0, len(pattern)
+    res = ''
+    while i < n:
+        c = pattern[i]
+        i += 1
+        if c == '*':
+            res += '[^\\n]*'
+        elif c == '?':
+            res += '[^\\n]'
+        elif c == '[':
+            j = i
+            if j < n and pattern[j] == '!':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            while j < n and pattern[j] != ']':
+                j += 1
+            if j >= n:
+                res += '\\['
+            else:
+                stuff = pattern[i:j].replace('\\', '\\\\')
+                i = j + 1
+                if stuff[0] == '!':
+                    stuff = '^\\n' + stuff[1:]
+                elif stuff[0] == '^':
+                    stuff = '\\' + stuff
+                res += '[%s]' % stuff
+        else:
+            res += re.escape(c)
+    return '^' + res + '$'
+
+
+class _DirNode(object):
+    ''' Directory trie node, lo:hi is the range of all paths below
+    this directory in the sorted path list.
+    '''
+    __slots__ = ['children', 'lo', 'hi']
+
+    def __init__(self, lo):
+        self.children = {}
+        self.lo = lo
+        self.hi = lo
+
+
+class FileIndex(object):
+    ''' Index for a dict of file lists, typically files by rpm. Built
+    once, then queried using fnmatch patterns or regexes. Provides an
+    extension map, a directory trie and a text buffer per list which
+    is searched for literal parts of patterns and by regexes.
+    '''
+
+    def __init__(self, files_by_key):
+        self._keys = sorted(files_by_key.keys())
+        self._text = {}
+        self._by_ext = {}
+        self._regex_cache = {}
+        self._lock = Lock()
+        entries = []
+        for key in self._keys:
+            files = [f for f in files_by_key[key] if f]
+            self._text[key] = '\n'.join(files)
+            for path in files:
+                entries.append((path, key))
+                basename = os.path.basename(path)
+                if '.' in basename:
+                    ext = basename.rsplit('.', 1)[1]
+                    self._by_ext.setdefault(ext, []).append((path, key))
+        entries.sort()
+        self._entries = entries
+        self._trie = _DirNode(0)
+        for ix, (path, key) in enumerate(entries):
+            node = self._trie
+            node.hi = ix + 1
+            for part in path.split('/')[:-1]:
+                if not part:
+                    continue
+                if not part in node.children:
+                    node.children[part] = _DirNode(ix)
+                node = node.children[part]
+                node.hi = ix + 1
+
+    def _compile(self, pattern, regex=False):
+        ''' Return cached, compiled multiline regex for a fnmatch
+        pattern or a plain regex.
+        '''
+        with self._lock:
+            if not (pattern, regex) in self._regex_cache:
+                source = pattern if regex else translate(pattern)
+                self._regex_cache[(pattern, regex)] = \
+                    re.compile(source, re.MULTILINE)
+            return self._regex_cache[(pattern, regex)]
+
+    def _lines_with(self, literal):
+        ''' Return list of (path, key) for paths containing literal,
+        found by plain substring search in the text buffers.
+        '''
+        found = []
+        for key in self._keys:
+            text = self._text[key]
+            pos = text.find(literal)
+            while pos != -1:
+                start = text.rfind('\n', 0, pos) + 1
+                end = text.find('\n', pos)
+                if end == -1:
+                    end = len(text)
+                found.append((text[start:end], key))
+                pos = text.find(literal, end)
+        return found
+
+    def _candidates(self, pattern):
+        ''' Return list of (path, key) which might match pattern. '''
+        if pattern.startswith('*.') and not MAGIC.search(pattern[1:]) \
+                and not '/' in pattern:
+            suffix = pattern[1:]
+            ext = suffix.rsplit('.', 1)[1]
+            return [e for e in self._by_ext.get(ext, [])
+                    if e[0].endswith(suffix)]
+        parts = pattern.split('/')[:-1]
+        if len(parts) >= 2 and parts[0] == '' and not MAGIC.search(parts[1]):
+            node = self._trie
+            for part in parts[1:]:
+                if MAGIC.search(part):
+                    break
+                if not part in node.children:
+                    return []
+                node = node.children[part]
+            return self._entries[node.lo:node.hi]
+        literal = max(MAGIC_CHUNK.split(pattern), key=len)
+        if len(literal) > 1:
+            return self._lines_with(literal)
+        return self._entries
+
+    def get_files_by_pattern(self, pattern):
+        ''' Return dict of lists of files matching fnmatch pattern,
+        with an entry for each key.
+        '''
+        result = dict([(k, []) for k in self._keys])
+        regex = self._compile(pattern)
+        for path, key in self._candidates(pattern):
+            if regex.match(path):
+                result[key].append(path)
+        return result
+
+    def has_files(self, pattern):
+        ''' Return True if any file matches fnmatch pattern. '''
+        regex = self._compile(pattern)
+        for path, key in self._candidates(pattern):
+            if regex.match(path):
+                return True
+        return False
+
+    def has_files_re(self, pattern_re):
+        ''' Return True if any file matches regex (using search()). '''
+        if pattern_re.startswith('.*'):
+            # Same result from search(), without backtracking each line.
+            pattern_re = pattern_re[2:].lstrip('?')
+        regex = self._compile(pattern_re, True)
+        # \A and \Z only matches at start/end of complete buffer.
+        by_line = '\\A' in pattern_re or '\\Z' in pattern_re
+        for key in self._keys:
+            match = regex.search(self._text[key])
+            if not match:
+                if not by_line:
+                    continue
+            elif not '\n' in match.group(0):
+                return True
+            # Match spanning lines or anchored regex, check one path
+            # at a time.
+            for path in self._text[key].split('\n'):
+                if regex.search(path):
+                    return True
+        return False
+
+
+# vim: set expandtab: ts=4:sw=4:
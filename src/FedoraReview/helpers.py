@@ -23,10 +23,13 @@ Tools for helping Fedora package reviewers
 import logging
 import os.path
 import re
-import urllib
 from subprocess import call, Popen, PIPE
 import hashlib
 
+import downloader
+
+from archive import Archive, ArchiveError
+from download_cache import DownloadCache, get_download_cache
 from settings import Settings
 from review_error import FedoraReviewError
 
@@ -65,18 +68,28 @@ class Helpers(object):
         return ck.hexdigest()
 
     def urlretrieve(self, url, path):
+        ''' Download url to path, resuming any partial download. Returns
+        dict of hex digests by algorithm, holding the one set by -k.
+        '''
         try:
-            istream =  urllib.FancyURLopener().open(url)
-            if istream.getcode() and istream.getcode() != 200:
-                raise DownloadError(istream.getcode(), url)
-            with open(path, 'w') as ostream:
-                bytes = istream.read(32767)
-                while bytes != '':
-                    ostream.write(bytes)
-                    bytes = istream.read(32767)
+            info, digests = downloader.retrieve(url, path,
+                                                [Settings.checksum])
         except IOError as err:
-            raise DownloadError(str(err), url)
+            raise DownloadError(getattr(err, 'code', str(err)), url)
+        return digests
 
+    def _download(self, url, path):
+        ''' Retrieve url to path, using the shared download cache for
+        remote urls unless disabled using --cache-size 0. Returns dict
+        of hex digests by algorithm, possibly empty.
+        '''
+        cache = get_download_cache()
+        if not cache or not DownloadCache.is_cacheable(url):
+            return self.urlretrieve(url, path)
+        try:
+            return cache.retrieve(url, path, revalidate=not Settings.cache)
+        except IOError as err:
+            raise DownloadError(getattr(err, 'code', str(err)), url)
 
     def _get_file(self, link, directory, logger=None):
         fname = link.rsplit('/', 1)[1]
@@ -89,22 +102,41 @@ class Helpers(object):
         self.log.debug("  --> %s : %s" % (directory, link))
         if logger:
            logger(False)
-        self.urlretrieve(link, path)
+        self._download(link, path)
         return path 
 
     @staticmethod
     def rpmdev_extract(archive, extract_dir):
         """
-        Unpack archive in extract_dir. Returns true if
-        from subprocess.call() returns 0
+        Unpack archive in extract_dir using rpmdev-extract. Returns
+        true if rpmdev-extract returns 0
         """
-        cmd = 'rpmdev-extract -qC ' + extract_dir + ' ' + archive
-        cmd += ' &>/dev/null'
-        rc = call(cmd, shell=True)
+        with open(os.devnull, 'w') as devnull:
+            try:
+                rc = call(['rpmdev-extract', '-qC', extract_dir, archive],
+                          stdout=devnull, stderr=devnull)
+            except OSError:
+                rc = -1
         if rc != 0:
             Settings.get_logger().debug("Cannot unpack "  + archive)
         return rc == 0
 
+    @staticmethod
+    def extract_archive(archive, extract_dir):
+        """
+        Unpack archive in extract_dir. Tar, zip and compressed files
+        are handled in-process, other formats using rpmdev-extract.
+        Returns true if archive could be unpacked.
+        """
+        if not Archive.is_supported(archive):
+            return Helpers.rpmdev_extract(archive, extract_dir)
+        try:
+            Archive(archive).extract(extract_dir)
+        except ArchiveError as err:
+            Settings.get_logger().debug(str(err))
+            return False
+        return True
+
     @staticmethod
     def check_rpmlint_errors(out, log):
         """ Check the rpmlint output, return(ok, errmsg)
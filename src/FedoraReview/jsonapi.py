@@ -19,36 +19,165 @@
 '''
 JSON API for FedoraReview plugins
 '''
+import atexit
+import errno
+import os
+import re
+import select
 import subprocess
+import time
 from json import JSONEncoder, JSONDecoder
 
 from helpers import Helpers
 from check_base import TestResult
 from mock import Mock
+from settings import Settings
+
+CHUNK_SIZE = 65536
+
 
 class ERR_CODE(object):
     ERR_NO_COMMAND = 1
+    ERR_BAD_REQUEST = 2
+
+
+# Persistent plugin processes by path, kept between reviews.
+_persistent = {}
+
+
+def _close_persistent():
+    """ Let the persistent plugins exit by closing their input. """
+    for proc in _persistent.values():
+        try:
+            proc.stdin.close()
+        except IOError:
+            pass
+        proc.wait()
+    _persistent.clear()
+
+atexit.register(_close_persistent)
+
+
+def run_plugins(plugins, jobs, timeout=None):
+    """ Run the JSONPlugins, at most jobs at the same time. Their
+    output is multiplexed and handled as it arrives. A plugin not
+    answering a request within timeout seconds is killed, None
+    means no timeout. Returns when all plugins are done.
+    """
+    pending = list(plugins)
+    running = {}
+    while pending or running:
+        while pending and len(set(running.values())) < max(1, jobs):
+            plugin = pending.pop(0)
+            if plugin.start(timeout):
+                for fd in plugin.get_fds():
+                    running[fd] = plugin
+        if not running:
+            continue
+        wait = None
+        deadlines = [p.deadline for p in running.values() if p.deadline]
+        if deadlines:
+            wait = max(0, min(deadlines) - time.time())
+        try:
+            readable = select.select(running.keys(), [], [], wait)[0]
+        except select.error as err:
+            if err.args[0] == errno.EINTR:
+                continue
+            raise
+        for fd in readable:
+            plugin = running[fd]
+            start = time.time()
+            plugin.read(fd)
+            # Time spent handling a request doesn't count for others.
+            spent = time.time() - start
+            for other in set(running.values()):
+                if other is not plugin and other.deadline:
+                    other.deadline += spent
+        for plugin in set(running.values()):
+            if not plugin.done and plugin.deadline and \
+            plugin.deadline < time.time():
+                plugin.kill()
+            if plugin.done:
+                for fd in plugin.get_fds():
+                    running.pop(fd, None)
+                plugin.finish()
+
+
+class JSONFramer(object):
+    """Splits plugin output into the texts of complete top level JSON
+    objects. Each chunk is scanned once, only for quotes, backslashes
+    and braces, so framing is linear in the output size however the
+    objects are split over lines and reads.
+    """
+    SPECIAL = re.compile(r'["\\{}]')
+
+    def __init__(self):
+        self.skipped = ''
+        self._parts = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    pending = property(lambda self: self._depth > 0)
+
+    def feed(self, data):
+        """Add data, return list of texts of the objects completed."""
+        frames = []
+        begin = 0
+        pos = 0
+        while pos < len(data):
+            if self._depth == 0:
+                start = data.find('{', pos)
+                if start < 0:
+                    self.skipped += data[pos:].strip()
+                    return frames
+                self.skipped += data[pos:start].strip()
+                pos = begin = start
+            if self._escape:
+                self._escape = False
+                pos += 1
+                continue
+            match = self.SPECIAL.search(data, pos)
+            if not match:
+                break
+            c = match.group()
+            pos = match.end()
+            if self._in_string:
+                if c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c == '{':
+                self._depth += 1
+            elif c == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(data[begin:pos])
+                    frames.append(''.join(self._parts))
+                    self._parts = []
+        if self._depth > 0:
+            self._parts.append(data[begin:])
+        return frames
 
 
 class JSONAPI(object):
     """Base class for all JSON plugin communication"""
-    supported_api = 1
+    supported_api = 3
 
 
 class SetupPlugin(JSONAPI):
-    """First-contact API with plugin"""
+    """First-contact API with plugin, only data available without
+    running anything. The rest is available using the capabilities.
+    """
     def __init__(self, spec, srpm, sources):
         self.pkgname = spec.name
         self.version = spec.version
         self.release = spec.release
         self.srpm = srpm.filename
-        self.spec = {"path": spec.filename,
-                     "text": spec.get_expanded()}
-        self.rpms = []
-        for rpm in srpm.get_files_rpms().keys():
-            self.rpms.append(rpm)
-        self.rpmlint = "\n".join(srpm.rpmlint_output)
-        self.build_dir = Mock.get_builddir()
+        self.spec = {"path": spec.filename}
+        self.capabilities = PluginData.COMMANDS
 
 
 class GetSectionReply(JSONAPI):
@@ -57,6 +186,60 @@ class GetSectionReply(JSONAPI):
         self.text = section_text
 
 
+class GetExpandedSpecReply(JSONAPI):
+    """Reply to get_expanded_spec JSON command"""
+    def __init__(self, text):
+        self.text = text
+
+
+class GetBuildDirReply(JSONAPI):
+    """Reply to get_build_dir JSON command"""
+    def __init__(self, path):
+        self.path = path
+
+
+class GetRpmsReply(JSONAPI):
+    """Reply to get_rpms JSON command"""
+    def __init__(self, rpms):
+        self.rpms = rpms
+
+
+class GetFilesReply(JSONAPI):
+    """Reply to get_files JSON command"""
+    def __init__(self, files):
+        self.files = files
+
+
+class GetRpmlintReply(JSONAPI):
+    """Reply to get_rpmlint JSON command"""
+    def __init__(self, text):
+        self.text = text
+
+
+class GetTagReply(JSONAPI):
+    """Reply to get_tag JSON command"""
+    def __init__(self, tags):
+        self.tags = tags
+
+
+class GetSubpackagesReply(JSONAPI):
+    """Reply to get_subpackages JSON command"""
+    def __init__(self, subpackages):
+        self.subpackages = subpackages
+
+
+class GetRpmHeaderReply(JSONAPI):
+    """Reply to get_rpm_header JSON command"""
+    def __init__(self, header):
+        self.header = header
+
+
+class AnswerReply(JSONAPI):
+    """Reply to has_* JSON commands"""
+    def __init__(self, answer):
+        self.answer = answer
+
+
 class ErrorReply(JSONAPI):
     """Reply used when we encounter error in processing the request
 
@@ -72,12 +255,147 @@ class PluginResponse(JSONAPI):
     command = None
 
 
+class PluginData(object):
+    """Replies to plugin requests for a review. Data is computed when
+    first requested, and shared by all plugins using the same instance.
+    """
+    COMMANDS = ["get_section", "get_expanded_spec", "get_build_dir",
+                "get_rpms", "get_files", "get_rpmlint", "get_tag",
+                "get_subpackages", "has_requires", "has_buildrequires",
+                "has_files", "has_files_re", "get_files_by_pattern",
+                "get_rpm_header"]
+
+    def __init__(self, spec, srpm):
+        self.log = Settings.get_logger()
+        self.spec = spec
+        self.srpm = srpm
+        self._memo = {}
+
+    def _memoize(self, key, func):
+        if not key in self._memo:
+            self._memo[key] = func()
+        return self._memo[key]
+
+    def reply(self, request):
+        """Return reply to request, a command in COMMANDS. Raises
+        AttributeError if a request argument is missing.
+        """
+        return getattr(self, request.command)(request)
+
+    def get_section(self, request):
+        sec_name = "%%%s" % request.section
+        gs_ret = self.spec.get_section(sec_name)
+        if sec_name not in gs_ret:
+            self.log.debug("Plugin asked for non-existent section %s" %
+                           sec_name)
+            return GetSectionReply("")
+        return GetSectionReply("\n".join(gs_ret[sec_name]))
+
+    def get_expanded_spec(self, request):
+        text = self._memoize("expanded", self.spec.get_expanded)
+        return GetExpandedSpecReply(text or "")
+
+    def get_build_dir(self, request):
+        self.srpm.build()
+        return GetBuildDirReply(Mock.get_builddir())
+
+    def get_rpms(self, request):
+        rpms = self._memoize("rpms",
+                             lambda: sorted(self.srpm.get_files_rpms()))
+        return GetRpmsReply(rpms)
+
+    def get_files(self, request):
+        files = self.srpm.get_files_rpms()
+        if hasattr(request, "rpm"):
+            files = {request.rpm: files.get(request.rpm, [])}
+        return GetFilesReply(files)
+
+    def get_rpmlint(self, request):
+        return GetRpmlintReply("\n".join(self.srpm.rpmlint_output))
+
+    def get_tag(self, request):
+        section = getattr(request, "section", "main")
+        if getattr(request, "expand_macros", False):
+            subpackage = None
+            if section.startswith("package "):
+                subpackage = section.split(None, 1)[1]
+            key = ("expanded_tag", request.tag, subpackage)
+            tags = self._memoize(key, lambda:
+                self.spec.get_expanded_tag(request.tag, subpackage))
+        else:
+            if section != "main":
+                section = "%" + section
+            tags = self.spec.find_tag(request.tag, section, False)
+        return GetTagReply(tags)
+
+    def get_subpackages(self, request):
+        subpackages = self._memoize("subpackages",
+                                    self.spec.get_subpackages)
+        return GetSubpackagesReply(subpackages)
+
+    @staticmethod
+    def _has_dep(deps, request):
+        """Return True if deps has request.name, with the constraint in
+        request.version if present, whitespace ignored.
+        """
+        version = getattr(request, "version", None)
+        for dep in deps:
+            parts = dep.split(None, 1)
+            if parts[0] != request.name:
+                continue
+            if not version:
+                return True
+            if len(parts) > 1 and \
+            "".join(parts[1].split()) == "".join(version.split()):
+                return True
+        return False
+
+    def has_requires(self, request):
+        subpackage = getattr(request, "subpackage", None)
+        requires = self._memoize(("requires", subpackage), lambda:
+            self.spec.get_requires(subpackage))
+        return AnswerReply(self._has_dep(requires, request))
+
+    def has_buildrequires(self, request):
+        buildrequires = self._memoize("buildrequires",
+                                      self.spec.get_buildrequires)
+        return AnswerReply(self._has_dep(buildrequires, request))
+
+    def has_files(self, request):
+        index = self.srpm.get_file_index()
+        return AnswerReply(index.has_files(request.pattern))
+
+    def has_files_re(self, request):
+        index = self.srpm.get_file_index()
+        return AnswerReply(index.has_files_re(request.pattern))
+
+    def get_files_by_pattern(self, request):
+        index = self.srpm.get_file_index()
+        return GetFilesReply(index.get_files_by_pattern(request.pattern))
+
+    def get_rpm_header(self, request):
+        headers = self.srpm.get_rpm_headers()
+        if not request.rpm in headers:
+            return ErrorReply("no such rpm: " + request.rpm,
+                              ERR_CODE.ERR_BAD_REQUEST)
+        hdr = headers[request.rpm]
+        return GetRpmHeaderReply({"name": hdr.name,
+                                  "version": hdr.version,
+                                  "release": hdr.release,
+                                  "arch": hdr.arch,
+                                  "requires": hdr.requires,
+                                  "provides": hdr.provides,
+                                  "scriptlets": hdr.scriptlets,
+                                  "scriptlet_progs": hdr.scriptlet_progs})
+
+
 class JSONPlugin(Helpers):
     """Plugin for communicating with external review checks using JSON"""
 
-    def __init__(self, base, plugin_path):
+    def __init__(self, base, plugin_path, data=None):
         Helpers.__init__(self)
         self.plugin_path = plugin_path
+        self.data = data if data else PluginData(base.spec, base.srpm)
         self.version = None
         self.spec = base.spec
         self.srpm = base.srpm
@@ -88,6 +406,13 @@ class JSONPlugin(Helpers):
         self.plug_in = None
         self.plug_out = None
         self.plug_err = None
+        self.deadline = None
+        self._proc = None
+        self._timeout = None
+        self._open = set()
+        self._persistent = False
+        self._framer = JSONFramer()
+        self._errout = []
 
     name = property(lambda self: self.plugin_path)
 
@@ -102,38 +427,96 @@ class JSONPlugin(Helpers):
 
     def run(self):
         """Run the plugin to produce results"""
-        plugin_proc = subprocess.Popen(self.plugin_path,
-                                       bufsize=-1,
-                                       stdout=subprocess.PIPE,
-                                       stderr=subprocess.PIPE,
-                                       stdin=subprocess.PIPE)
-        self.plug_in = plugin_proc.stdin
-        self.plug_out = plugin_proc.stdout
-        self.plug_err = plugin_proc.stderr
+        run_plugins([self], 1, Settings.plugin_timeout)
+
+    done = property(lambda self: self._persistent or not self._open)
+
+    def start(self, timeout=None):
+        """Start the plugin, or reuse a persistent one, and send the
+        setup. Returns False if the plugin cannot be started.
+        """
+        self._timeout = timeout
+        proc = _persistent.pop(self.plugin_path, None)
+        if proc and proc.poll() is None:
+            self.__debug("Reusing persistent plugin")
+            self._proc = proc
+        else:
+            self.__debug("Starting")
+            try:
+                self._proc = subprocess.Popen(self.plugin_path,
+                                              bufsize=-1,
+                                              stdout=subprocess.PIPE,
+                                              stderr=subprocess.PIPE,
+                                              stdin=subprocess.PIPE)
+            except OSError, e:
+                self.__error("Cannot start")
+                self.__error(e)
+                return False
+        self.plug_in = self._proc.stdin
+        self.plug_out = self._proc.stdout
+        self.plug_err = self._proc.stderr
+        self._open = set(self.get_fds())
 
         setup = SetupPlugin(self.spec, self.srpm, self.sources)
         try:
             self.__send_obj(setup)
-
-            final_data = ""
-            while True:
-                data = plugin_proc.stdout.readline()
-                if data == "":
-                    break
-                final_data = final_data + data
-                obj = self.__get_class_from_json(final_data)
-                if obj:
-                    self.__handle_reply(obj)
-                    final_data = ""
         except IOError, e:
             self.__error("Error communicating")
             self.__error(e)
-
-        errout = self.plug_err.read()
-        while errout != "":
+        return True
+
+    def get_fds(self):
+        """Return the file descriptors to read plugin output from."""
+        return [self.plug_out.fileno(), self.plug_err.fileno()]
+
+    def read(self, fd):
+        """Handle available output on fd from get_fds()."""
+        data = os.read(fd, CHUNK_SIZE)
+        if data == "":
+            self._open.discard(fd)
+        if fd == self.plug_err.fileno():
+            self._errout.append(data)
+            return
+        for text in self._framer.feed(data):
+            obj = self.__get_class_from_json(text)
+            if obj:
+                try:
+                    self.__handle_reply(obj)
+                except IOError, e:
+                    self.__error("Error communicating")
+                    self.__error(e)
+        if self._framer.skipped:
+            self.__debug("Ignoring output: " + self._framer.skipped)
+            self._framer.skipped = ''
+        if data == "" and self._framer.pending:
+            self.__error("Output ends inside a JSON object")
+
+    def kill(self):
+        """Stop a plugin not answering in time."""
+        self.__error("No reply in %d seconds, killing it" % self._timeout)
+        self._persistent = False
+        self._open = set()
+        self._proc.kill()
+
+    def finish(self):
+        """Wait for the plugin to exit after its output is closed, or
+        keep it for the next review if persistent.
+        """
+        self.deadline = None
+        errout = "".join(self._errout)
+        self._errout = []
+        if errout != "":
             self.__error(errout)
-            errout = self.plug_err.read()
-
+        if self._persistent:
+            _persistent[self.plugin_path] = self._proc
+            return
+        try:
+            self.plug_in.close()
+        except IOError:
+            pass
+        self.plug_out.close()
+        self.plug_err.close()
+        self._proc.wait()
 
     def get_results(self):
         """Returns array of results
@@ -146,19 +529,18 @@ class JSONPlugin(Helpers):
 
         returns None if JSON cannot be decoded
         """
-        ret = None
         try:
             json_obj = self.decoder.decode(text)
-            ret = PluginResponse()
-            for key in json_obj.keys():
-                setattr(ret, key, json_obj[key])
-            if not hasattr(ret, "command"):
-                self.__error("plugin returned JSON object without 'command' ")
-                # Reply has to have this
-                return None
-        except ValueError:
-            # ret is set to None
-            pass
+        except ValueError, e:
+            self.__error("Cannot decode reply: %s" % e)
+            return None
+        ret = PluginResponse()
+        for key in json_obj.keys():
+            setattr(ret, key, json_obj[key])
+        if not hasattr(ret, "command"):
+            self.__error("plugin returned JSON object without 'command' ")
+            # Reply has to have this
+            return None
         return ret
 
     def __handle_reply(self, reply):
@@ -167,6 +549,10 @@ class JSONPlugin(Helpers):
             self.__debug("Processing results")
             if hasattr(reply, "version"):
                 self.version = reply.version
+            if getattr(reply, "supported_api", 1) >= 2 and \
+            getattr(reply, "persistent", False):
+                self.__debug("Keeping persistent plugin")
+                self._persistent = True
 
             for result in reply.checks:
                 extra = None
@@ -179,18 +565,13 @@ class JSONPlugin(Helpers):
                                                result["text"],
                                                result["type"],
                                                result["result"], extra))
-        elif reply.command == "get_section":
-            self.__debug("get_section call")
-            sec_name = "%%%s" % reply.section
-            gs_ret = self.spec.get_section(sec_name)
-            if sec_name not in gs_ret:
-                section_text = ""
-                self.log.debug("Plugin %s asked for non-existent"
-                               "section %s" % (self.plugin_path,
-                                               sec_name))
-            else:
-                section_text = "\n".join(gs_ret[sec_name])
-            msg = GetSectionReply(section_text)
+        elif reply.command in PluginData.COMMANDS:
+            self.__debug("%s call" % reply.command)
+            try:
+                msg = self.data.reply(reply)
+            except AttributeError, e:
+                self.__error("bad %s request: %s" % (reply.command, e))
+                msg = ErrorReply(str(e), ERR_CODE.ERR_BAD_REQUEST)
             self.__send_obj(msg)
         else:
             msg = "unrecognized message command %s"  % reply.command
@@ -202,6 +583,8 @@ class JSONPlugin(Helpers):
         self.plug_in.write(self.encoder.encode(obj))
         self.plug_in.write("\n\n")
         self.plug_in.flush()
+        if self._timeout:
+            self.deadline = time.time() + self._timeout
 
     def __debug(self, msg):
         self.log.debug("Plugin %s: %s" % (self.plugin_path,msg))
@@ -26,38 +26,42 @@ import os.path
 
 from glob import glob
 from urlparse import urlparse
-from subprocess import call, Popen, PIPE, STDOUT
+from subprocess import Popen, PIPE, STDOUT
 
+from chroot_pool import ChrootPool
+from chroot_rpmdb import ChrootRpmDb
 from helpers import Helpers
+from mock_shell import MockShell, MockShellError
 from review_dirs import ReviewDirs
 from settings import Settings
 
 
-_RPMLINT_SCRIPT="""
-mock  @config@ --shell << 'EOF'
-echo 'rpmlint:'
-rpmlint @rpm_names@
-echo 'rpmlint-done:'
-EOF
-"""
-
 class _Mock(Helpers):
     """ Some basic operations on the mock chroot env, a singleton. """
 
     def __init__(self):
         Helpers.__init__(self)
+        self.warm_root = None
+        self.uniqueext = None
+        self._config_roots = {}
+        self._pool = None
+        self._rpmdb = None
+        self._shell = None
 
     def _get_root(self):
         config = 'default'
         if Settings.mock_config:
             config  = Settings.mock_config
         path = os.path.join('/etc/mock', config + '.cfg')
-
-        config_opts= {}
-        with open(path) as f:
-            config = f.read()
-        exec config
-        self.mock_root = config_opts['root']
+        if not path in self._config_roots:
+            config_opts= {}
+            with open(path) as f:
+                config = f.read()
+            exec config
+            self._config_roots[path] = config_opts['root']
+        self.mock_root = self._config_roots[path]
+        if self.root_ext:
+            self.mock_root += '-' + self.root_ext
 
     def _get_dir(self, subdir=None):
         if not hasattr(self, 'mock_root'):
@@ -89,6 +93,9 @@ class _Mock(Helpers):
     """ The directory where mock leaves built rpms and logs """
     resultdir = property(get_resultdir)
 
+    """ mock --uniqueext used for the root, if any. """
+    root_ext = property(lambda self: self.warm_root or self.uniqueext)
+
     """ Mock's %_topdir seen from the outside. """
     topdir = property(lambda self: get_builddir(self))
 
@@ -100,16 +107,81 @@ class _Mock(Helpers):
             opt = ''
         if not 'resultdir' in opt:
             opt += ' --resultdir=' + ReviewDirs.results + ' '
+        if self.warm_root:
+            opt += ' --uniqueext=' + self.warm_root + ' --no-clean '
+        elif self.uniqueext:
+            opt += ' --uniqueext=' + self.uniqueext + ' '
         return opt
 
+    def acquire_warm_root(self):
+        ''' If --chroot-pool is used, reserve an initialized root from
+        the pool for the current mock config, used by all subsequent
+        mock commands.
+        '''
+        if self.warm_root or Settings.chroot_pool <= 0:
+            return
+        self._pool = ChrootPool(Settings.mock_config, Settings.chroot_pool)
+        self.warm_root = self._pool.acquire()
+        if self.warm_root:
+            self.reset()
+
+    def release_warm_root(self):
+        ''' Return root reserved by acquire_warm_root() to the pool. '''
+        self.close_shell()
+        if self.warm_root:
+            self._pool.release(self.warm_root)
+            self.warm_root = None
+            self.reset()
+
+    def get_shell(self):
+        """ Return a started MockShell session in current root, reused
+        until close_shell(). Other mock commands close it, since it
+        holds the root lock.
+        """
+        if not self._shell:
+            cmd = ['mock']
+            if Settings.mock_config:
+                cmd.extend(['-r', Settings.mock_config])
+            if self.root_ext:
+                cmd.append('--uniqueext=' + self.root_ext)
+            self._shell = MockShell(cmd)
+        self._shell.start()
+        return self._shell
+
+    def close_shell(self):
+        """ Exit the session started by get_shell(), if any. """
+        if self._shell:
+            self._shell.close()
+            self._shell = None
+
+    def run_in_chroot(self, command):
+        """ Run shell command in the chroot using the shared session,
+        return (exit code, output). Raises MockShellError.
+        """
+        return self.get_shell().run(command)
+
+    def get_rpmdb(self):
+        """ Return the ChrootRpmDb for current root, cached until
+        invalidate_rpmdb() is called.
+        """
+        dbpath = self._get_dir('root/var/lib/rpm')
+        if not self._rpmdb or self._rpmdb.dbpath != dbpath:
+            self._rpmdb = ChrootRpmDb(dbpath)
+        return self._rpmdb
+
+    def invalidate_rpmdb(self):
+        """ Packages in root have changed, drop cached rpmdb data. """
+        if self._rpmdb:
+            self._rpmdb.invalidate()
+
+    def get_installed(self, packages):
+        """ Return dict of epoch:version-release by name for the
+        packages installed in root, using one rpmdb query.
+        """
+        return self.get_rpmdb().query(packages)
+
     def is_installed(self, package):
-        cmd = 'rpm --dbpath '
-        cmd += self._get_dir('root/var/lib/rpm')
-        cmd += ' -q ' + package
-        cmd += ' &>/dev/null'
-        self.log.debug('Check install cmd: ' + cmd)
-        rc = call(cmd, shell=True)
-        return rc == 0
+        return package in self.get_installed([package])
 
     def install(self, rpm_files):
         """
@@ -127,25 +199,32 @@ class _Mock(Helpers):
             cmd.extend(self.get_mock_options().split())
             return cmd
 
-        for f in rpm_files:
-            p = os.path.basename(f).rsplit('-',2)[0]
-            if self.is_installed(p):
-                self.log.debug('Removing already installed: ' + f)
-                rpm_files.remove(f)
-
-        if len(rpm_files) == 0:
+        names = [os.path.basename(f).rsplit('-',2)[0] for f in rpm_files]
+        installed = self.get_installed(names)
+        to_install = []
+        for f, name in zip(rpm_files, names):
+            if name in installed:
+                self.log.debug('Skipping already installed: %s (%s)'
+                               % (f, installed[name]))
+            else:
+                to_install.append(f)
+
+        if len(to_install) == 0:
             return
+        self.close_shell()
         cmd = mock_cmd()
         cmd.append("install")
-        cmd.extend(rpm_files)
+        cmd.extend(to_install)
         self.log.debug('Install command: ' + ', '.join(cmd))
         try:
             p = Popen(cmd, stdout=PIPE, stderr=STDOUT)
             output, error = p.communicate()
             logging.debug(log_text(output, error), exc_info=True)
         except OSError as e:
-            logging.warning(log_text(output, error), exc_info=True)
-            return output
+            logging.warning(log_text(cmd, e), exc_info=True)
+            return str(e)
+        finally:
+            self.invalidate_rpmdb()
         if p.returncode != 0:
             logging.warning("Install command returned error code %i",
                             p.returncode)
@@ -153,6 +232,7 @@ class _Mock(Helpers):
 
     def init(self):
         """ Run a mock --init command. """
+        self.close_shell()
         cmd = ["mock", "--init"]
         self.log.debug('Init command: ' + ' '.join(cmd))
         try:
@@ -160,22 +240,15 @@ class _Mock(Helpers):
             output, error = p.communicate()
             logging.debug(output + str(error), exc_info=True)
         except OSError as e:
-            logging.warning(output + str(error), exc_info=True)
-            return output
+            logging.warning('Init command failed', exc_info=True)
+            return str(e)
+        finally:
+            self.invalidate_rpmdb()
         if p.returncode != 0:
             logging.warning("init command returned error code %i",
                             p.returncode)
         return None if p.returncode == 0 else output
 
-    def _run(self, script):
-        """ Run a script,  return (ok, output). """
-        try:
-            p = Popen(script, stdout=PIPE, stderr=STDOUT, shell=True)
-            output, error = p.communicate()
-        except OSError as e:
-            return False, e.strerror
-        return True, output
-
     def rpmlint_rpms(self, rpms):
         """ Install and run rpmlint on  packages,
         Requires packages already installed.
@@ -185,38 +258,19 @@ class _Mock(Helpers):
         if error:
             return False, error
 
-        script = _RPMLINT_SCRIPT
         basenames = [ os.path.basename(r) for r in rpms]
         names = [r.rsplit('-', 2)[0] for r in basenames]
         rpm_names = ' '.join(list(set(names)))
-      
-        config = ''
-        if Settings.mock_config:
-            config = '-r ' + Settings.mock_config 
-        script = script.replace('@config@', config)
-        script = script.replace('@rpm_names@', rpm_names)
-        ok, output = self._run(script)
-        self.log.debug( "Script output: " + output)
-
-        if not ok:
-            return False, output + '\n'
+        try:
+            rc, output = self.run_in_chroot('rpmlint ' + rpm_names)
+        except MockShellError as err:
+            return False, str(err) + '\n'
+        self.log.debug( "Rpmlint output: " + output)
 
         ok, err_msg = self.check_rpmlint_errors(output, self.log)
         if err_msg:
             return False, err_msg
-
-        lines = output.split('\n')
-        l = ''
-        while not l.startswith('rpmlint:') and len(lines) > 0:
-            l = lines.pop(0)
-        text = ''
-        for l in lines:
-            if l.startswith('<mock-'):
-                l=l[l.find('#'):]
-            if l.startswith('rpmlint-done:'):
-                break
-            text += l + '\n'
-        return ok, text
+        return ok, output
 
     def have_cache_for(self, name):
         ''' Return true if there is at least one srpm and one rpm in
@@ -0,0 +1,187 @@
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+
+'''
+A long-lived mock --shell session running commands in the chroot.
+'''
+
+import errno
+import os
+import select
+import time
+import uuid
+
+from subprocess import Popen, PIPE, STDOUT
+from threading import Lock
+
+from review_error import FedoraReviewError
+from settings import Settings
+
+# Default seconds to wait for a reply.
+TIMEOUT = 3600
+
+# mock --shell is interactive and prints '<mock-chroot>#' prompts,
+# which would end up in the output. Cleared before the first request.
+_PROMPTS = "PS1=''; PS2=''; export PS1 PS2\n"
+
+# Each request is run in a subshell, its output is followed by a line
+# '<marker> <exit code>'. The extra newline guarantees the marker starts
+# a line; it's removed from the reply.
+_REQUEST = """( %s
+) < /dev/null 2>&1
+echo "
+%s $?"
+"""
+
+
+class MockShellError(FedoraReviewError):
+    ''' The shell session cannot be started or is broken. '''
+    pass
+
+
+class MockShell(object):
+    ''' A mock --shell process reading commands from stdin. Each
+    command is framed by a unique end marker carrying the exit code,
+    so several commands can be run without restarting mock. The
+    session holds mock's root lock, it must be closed before running
+    other mock commands on the same root.
+    '''
+
+    def __init__(self, mock_cmd, timeout=TIMEOUT):
+        ''' mock_cmd: list, mock command and options except --shell.
+        timeout: default seconds to wait for a reply, None for ever.
+        '''
+        self.log = Settings.get_logger()
+        self.mock_cmd = mock_cmd
+        self.timeout = timeout
+        self._proc = None
+        self._buffer = ''
+        self._marker = '@@fedora-review-' + uuid.uuid4().hex
+        self._lock = Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def is_running(self):
+        ''' Return True if the session is started and alive. '''
+        return self._proc is not None and self._proc.poll() is None
+
+    def _kill(self):
+        ''' Terminate a broken session. '''
+        if self._proc:
+            try:
+                self._proc.kill()
+            except OSError:
+                pass
+            self._proc.wait()
+            self._proc = None
+        self._buffer = ''
+
+    def _read_reply(self, timeout):
+        ''' Read output until the end marker, return (rc, output). '''
+        deadline = time.time() + timeout if timeout else None
+        fd = self._proc.stdout.fileno()
+        head = self._marker + ' '
+        while True:
+            start = self._buffer.find('\n' + head)
+            if start != -1:
+                end = self._buffer.find('\n', start + 1)
+                if end != -1:
+                    output = self._buffer[:start]
+                    rc = self._buffer[start + 1 + len(head):end]
+                    self._buffer = self._buffer[end + 1:]
+                    return int(rc), output
+            wait = None
+            if deadline:
+                wait = deadline - time.time()
+                if wait <= 0:
+                    self._kill()
+                    raise MockShellError('Timeout waiting for mock shell')
+            try:
+                ready = select.select([fd], [], [], wait)[0]
+            except select.error as err:
+                if err.args[0] == errno.EINTR:
+                    continue
+                raise
+            if not ready:
+                continue
+            data = os.read(fd, 65536)
+            if not data:
+                output = self._buffer
+                self._kill()
+                raise MockShellError('mock shell exited: ' + output)
+            self._buffer += data
+
+    def _send(self, command, timeout, prefix=''):
+        ''' Send one framed request, return (rc, output). '''
+        try:
+            self._proc.stdin.write(prefix +
+                                   _REQUEST % (command, self._marker))
+            self._proc.stdin.flush()
+        except IOError as err:
+            self._kill()
+            raise MockShellError('Cannot write to mock shell: ' + str(err))
+        return self._read_reply(timeout)
+
+    def start(self):
+        ''' Start mock --shell and wait until it's ready. '''
+        if self.is_running():
+            return
+        cmd = self.mock_cmd + ['--shell']
+        self.log.debug('Starting mock shell: ' + ' '.join(cmd))
+        try:
+            self._proc = Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=STDOUT)
+        except OSError as err:
+            raise MockShellError('Cannot run mock: ' + str(err))
+        # Leading mock messages end up before the first marker.
+        self._buffer = '\n'
+        with self._lock:
+            rc, output = self._send('true', self.timeout, _PROMPTS)
+        self.log.debug('Mock shell started: ' + output.strip())
+
+    def run(self, command, timeout=None):
+        ''' Run shell command in the chroot, return (exit code, stdout
+        and stderr). The session is started if required.
+        '''
+        if not self.is_running():
+            self.start()
+        with self._lock:
+            self.log.debug('Mock shell command: ' + command)
+            rc, output = self._send(command,
+                                    timeout if timeout else self.timeout)
+        return rc, output
+
+    def close(self):
+        ''' Exit the shell. '''
+        if not self._proc:
+            return
+        try:
+            self._proc.stdin.write('exit\n')
+            self._proc.stdin.close()
+        except IOError:
+            pass
+        self._proc.wait()
+        self._proc = None
+        self._buffer = ''
+
+
+# vim: set expandtab: ts=4:sw=4:
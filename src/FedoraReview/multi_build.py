@@ -0,0 +1,153 @@
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+
+'''
+Concurrent builds of the srpm using several mock configs.
+'''
+
+import os
+import os.path
+import time
+
+from glob import glob
+from multiprocessing.pool import ThreadPool
+
+import build_log
+
+from build_cache import get_build_cache, get_build_key, relevant_options
+from settings import Settings
+
+
+class ConfigBuild(object):
+    ''' Build of srpm using one mock config, results and build log in
+    resultdir. Attributes after run():
+      - rc: mock exit code or an error string, 0 if OK.
+      - elapsed: seconds used.
+      - cached: True if results were restored from the build cache.
+    '''
+
+    def __init__(self, srpm, config, resultdir, mock='mock'):
+        self.log = Settings.get_logger()
+        self.srpm = srpm
+        self.config = config
+        self.resultdir = resultdir
+        self.logfile = os.path.join(resultdir, 'mock-output.log')
+        self.mock = mock
+        self.rc = None
+        self.elapsed = 0.0
+        self.cached = False
+
+    ok = property(lambda self: self.rc == 0)
+
+    def get_rpms(self):
+        ''' Return list of built binary rpms. '''
+        return [r for r in glob(os.path.join(self.resultdir, '*.rpm'))
+                if not r.endswith('.src.rpm')]
+
+    def get_command(self):
+        ''' Return the mock command line, as a list. '''
+        return [self.mock, '-r', self.config, '--rebuild',
+                '--resultdir=' + self.resultdir] + \
+               relevant_options(Settings.mock_options) + [self.srpm]
+
+    def run(self):
+        ''' Build, restoring results from the build cache if possible. '''
+        start = time.time()
+        if not os.path.exists(self.resultdir):
+            os.makedirs(self.resultdir)
+        cache = get_build_cache()
+        key = None
+        if cache:
+            key = get_build_key(self.srpm, self.config,
+                                Settings.mock_options)
+            if cache.restore(key, self.resultdir):
+                self.rc, self.cached = 0, True
+        if not self.cached:
+            self.log.info('Building %s using %s'
+                          % (os.path.basename(self.srpm), self.config))
+            self.log.debug('Build command: ' + ' '.join(self.get_command()))
+            try:
+                self.rc, index = build_log.run_logged(self.get_command(),
+                                                      self.logfile)
+                if self.rc == 0 and index.has(build_log.ERROR):
+                    self.rc = 'Build error(s)'
+            except (OSError, IOError) as err:
+                self.rc = 'Cannot run mock: ' + str(err)
+            if cache and self.rc == 0:
+                cache.store(key, self.resultdir,
+                            os.path.basename(self.srpm))
+        self.elapsed = time.time() - start
+        self.log.info(self.summary())
+        return self
+
+    def summary(self):
+        ''' One line describing the result. '''
+        if self.rc is None:
+            return self.config + ': not built'
+        if self.cached:
+            state = 'OK (cached)'
+        elif self.ok:
+            state = 'OK'
+        else:
+            state = 'FAILED (%s), see %s' % (self.rc, self.logfile)
+        return '%s: %s in %.0f s' % (self.config, state, self.elapsed)
+
+
+def _run_build(build):
+    return build.run()
+
+
+class MultiBuild(object):
+    ''' Builds of srpm using each config in configs, at most jobs
+    running at the same time. Results for a config are kept in
+    topdir/results-<config>.
+    '''
+
+    def __init__(self, srpm, configs, topdir, jobs, mock='mock'):
+        self.builds = [ConfigBuild(srpm, c,
+                                   os.path.join(topdir, 'results-' + c),
+                                   mock)
+                       for c in configs]
+        self.jobs = max(1, min(jobs, len(configs)))
+        self._pool = None
+        self._result = None
+
+    def start(self):
+        ''' Start the builds in the background. '''
+        if self._pool or not self.builds:
+            return
+        self._pool = ThreadPool(self.jobs)
+        self._result = self._pool.map_async(_run_build, self.builds, 1)
+        self._pool.close()
+
+    def wait(self):
+        ''' Wait until all builds are done, return list of ConfigBuild
+        in configs order.
+        '''
+        self.start()
+        if self._pool:
+            self._result.get()
+            self._pool.join()
+        return self.builds
+
+    def summary(self):
+        ''' Text listing all build results, after wait(). '''
+        return '\n'.join([b.summary() for b in self.builds])
+
+
+# vim: set expandtab: ts=4:sw=4:
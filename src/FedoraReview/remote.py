@@ -0,0 +1,277 @@
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+
+'''
+Running the build and checks on other hosts, the --workers.
+
+The coordinator fetches the spec and srpm and runs 'fedora-review
+--worker <options>' on a worker host. On stdin, it writes a json header
+line {"name": <name>, "files": [[<basename>, <size>], ...]} followed by
+the file contents. The worker reviews the package and writes a json
+reply on stdout: {"rc": <exit code>, "results": [<TestResult>, ...],
+"plugins": [[<path>, <version>], ...]}. Logging goes to stderr.
+'''
+
+import json
+import multiprocessing
+import os
+import os.path
+import pipes
+import shutil
+import sys
+import tempfile
+
+from subprocess import Popen, PIPE
+
+from check_base import Attachment, TestResult
+from review_dirs import ReviewDirs
+from review_error import FedoraReviewError
+from settings import Settings
+
+# Settings forwarded to the workers: (attribute, option).
+_FORWARDED = [('mock_config', '--mock-config'),
+              ('mock_options', '--mock-options'),
+              ('extra_mock_configs', '--extra-mock-configs'),
+              ('single', '--single'),
+              ('exclude', '--exclude'),
+              ('checksum', '--checksum'),
+              ('nobuild', '--no-build'),
+              ('verbose', '--verbose')]
+
+_WORKER_SCRIPT = 'import sys\n' \
+                 'from FedoraReview.review_helper import ReviewHelper\n' \
+                 'sys.exit(ReviewHelper().run())\n'
+
+
+class RemoteError(FedoraReviewError):
+    ''' A worker failed to review a package. '''
+    pass
+
+
+def dump_result(result):
+    ''' Return json-friendly dict for a TestResult. '''
+    return {'name': result.name,
+            'url': result.url,
+            'group': result.group,
+            'deprecates': result.deprecates,
+            'text': result.text,
+            'type': result.type,
+            'result': result.result,
+            'output_extra': result.output_extra,
+            'attachments': [[a.header, a.text, a.order_hint]
+                            for a in result.attachments]}
+
+
+def load_result(d):
+    ''' Return TestResult for a dict from dump_result(). '''
+    return TestResult(d['name'], d['url'], d['group'], d['deprecates'],
+                      d['text'], d['type'], d['result'], d['output_extra'],
+                      [Attachment(*a) for a in d['attachments']])
+
+
+def get_worker_options():
+    ''' Return list of command line options for the workers. '''
+    options = []
+    for attr, option in _FORWARDED:
+        value = getattr(Settings, attr, None)
+        if value is True:
+            options.append(option)
+        elif value:
+            options.append('%s=%s' % (option, value))
+    return options
+
+
+class Transport(object):
+    ''' A worker host, running at most slots reviews at the same time.
+    command is the list running fedora-review on the host, args are
+    appended to it, shell quoted if quote is set.
+    '''
+
+    quote = False
+
+    def __init__(self, name, command, slots=1):
+        self.log = Settings.get_logger()
+        self.name = name
+        self.command = command
+        self.slots = max(1, slots)
+        self.env = None
+
+    def get_command(self, args):
+        ''' Return command running 'fedora-review args' on the host. '''
+        if self.quote:
+            args = [pipes.quote(a) for a in args]
+        return self.command + args
+
+    def review(self, name, paths, logfile):
+        ''' Review package name using the spec and srpm in paths on
+        the host, worker log in logfile. Return (results, plugins)
+        as for the worker reply, raise RemoteError on errors.
+        '''
+        cmd = self.get_command(['--worker'] + get_worker_options())
+        self.log.debug('Worker command: ' + ' '.join(cmd))
+        files = [[os.path.basename(p), os.path.getsize(p)] for p in paths]
+        with open(logfile, 'w') as log:
+            try:
+                proc = Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=log,
+                             env=self.env)
+            except OSError as err:
+                raise RemoteError('%s: cannot run worker: %s'
+                                  % (self.name, err))
+            try:
+                proc.stdin.write(json.dumps({'name': name,
+                                             'files': files}) + '\n')
+                for path in paths:
+                    with open(path, 'rb') as f:
+                        shutil.copyfileobj(f, proc.stdin)
+                proc.stdin.close()
+            except IOError:
+                pass
+            reply = proc.stdout.read()
+            proc.wait()
+        try:
+            reply = json.loads(reply)
+        except ValueError:
+            raise RemoteError('%s: no reply from worker, see %s'
+                              % (self.name, logfile))
+        if reply['rc'] != 0:
+            raise RemoteError('%s: review failed, see %s'
+                              % (self.name, logfile))
+        return map(load_result, reply['results']), reply['plugins']
+
+
+class SSHTransport(Transport):
+    ''' Runs fedora-review on another host using ssh. '''
+
+    quote = True
+
+    def __init__(self, name, slots=1):
+        Transport.__init__(self, name,
+                           ['ssh', '-T', '-o', 'BatchMode=yes', name,
+                            'fedora-review'],
+                           slots)
+
+
+class LocalTransport(Transport):
+    ''' Runs workers as local processes, a stand-in for a host. '''
+
+    def __init__(self, name='local', slots=1, command=None):
+        Transport.__init__(self, name,
+                           command if command else
+                               [sys.executable, '-c', _WORKER_SCRIPT],
+                           slots)
+        topdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.env = dict(os.environ)
+        self.env['PYTHONPATH'] = \
+            ':'.join(filter(None, [topdir, os.environ.get('PYTHONPATH')]))
+
+
+class WorkerPool(object):
+    ''' The worker hosts, shared by batch processes. acquire() returns
+    the host with the lowest load relative to its slots.
+    '''
+
+    def __init__(self, transports):
+        self.transports = transports
+        self._running = multiprocessing.Array('i', len(transports))
+
+    slots = property(lambda self: sum([t.slots for t in self.transports]))
+
+    @staticmethod
+    def from_spec(spec):
+        ''' Return WorkerPool for a --workers list like
+        "local:2,builder1:4,user@builder2".
+        '''
+        transports = []
+        for word in [w.strip() for w in spec.split(',') if w.strip()]:
+            host, sep, slots = word.rpartition(':')
+            if not sep or not slots.isdigit():
+                host, slots = word, '1'
+            if host == 'local':
+                transports.append(LocalTransport(host, int(slots)))
+            else:
+                transports.append(SSHTransport(host, int(slots)))
+        if not transports:
+            raise RemoteError('No hosts in --workers')
+        return WorkerPool(transports)
+
+    def get_loads(self):
+        ''' Return list of running reviews for each host. '''
+        with self._running.get_lock():
+            return list(self._running)
+
+    def acquire(self):
+        ''' Return the least loaded Transport, to release() when done. '''
+        with self._running.get_lock():
+            loads = [(float(self._running[i]) / t.slots, i)
+                     for i, t in enumerate(self.transports)]
+            i = min(loads)[1]
+            self._running[i] += 1
+        return self.transports[i]
+
+    def release(self, transport):
+        ''' Return transport from acquire() to the pool. '''
+        with self._running.get_lock():
+            self._running[self.transports.index(transport)] -= 1
+
+
+def run_worker(infile, outfile):
+    ''' Review the package sent by the coordinator on infile in a
+    temporary directory, write the reply on outfile. Return exit code.
+    '''
+    from review_helper import ReviewHelper
+
+    header = json.loads(infile.readline())
+    workdir = tempfile.mkdtemp(prefix='fedora-review-worker-')
+    oldpwd = os.getcwd()
+    try:
+        for name, size in header['files']:
+            path = os.path.join(workdir, os.path.basename(name))
+            with open(path, 'wb') as f:
+                while size > 0:
+                    buff = infile.read(min(size, 65536))
+                    if not buff:
+                        raise RemoteError('Truncated input: ' + name)
+                    f.write(buff)
+                    size -= len(buff)
+        os.chdir(workdir)
+        ReviewDirs.reset()
+        Settings.name = header['name']
+        helper = ReviewHelper()
+        rc = helper.review()
+        reply = {'rc': rc, 'results': [], 'plugins': []}
+        if rc == 0 and helper.checks:
+            reply['results'] = map(dump_result, helper.checks.results)
+            reply['plugins'] = [[p.plugin_path, p.version]
+                                for p in helper.checks.ext_checks]
+    finally:
+        os.chdir(oldpwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    outfile.write(json.dumps(reply) + '\n')
+    outfile.flush()
+    return rc
+
+
+def serve_worker():
+    ''' Run the --worker mode, stdout is only used for the reply. '''
+    sys.stdout.flush()
+    reply = os.fdopen(os.dup(1), 'w')
+    os.dup2(2, 1)
+    return run_worker(sys.stdin, reply)
+
+
+# vim: set expandtab: ts=4:sw=4:
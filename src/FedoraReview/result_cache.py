@@ -0,0 +1,153 @@
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+
+'''
+Persistent cache for check results, reused when reviewing unchanged
+packages with unchanged checks.
+'''
+
+import errno
+import hashlib
+import inspect
+import json
+import os
+import os.path
+import tempfile
+
+from threading import Lock
+
+from check_base import Attachment, CheckBase
+from settings import Settings
+from version import __version__, build_id
+
+CACHE_DIR = os.path.join(os.environ['XDG_CACHE_HOME']
+                             if 'XDG_CACHE_HOME' in os.environ
+                             else os.path.expanduser('~/.cache'),
+                         'fedora-review', 'results')
+
+CHUNK_SIZE = 65536
+
+_cache = None
+_cache_lock = Lock()
+
+
+def get_result_cache():
+    ''' Return the shared ResultCache, None unless --result-cache. '''
+    global _cache
+    with _cache_lock:
+        if not _cache and Settings.result_cache:
+            _cache = ResultCache(CACHE_DIR)
+        return _cache
+
+
+class ResultCache(object):
+    ''' Check results stored as json in cache_dir/<key>.json. The key
+    is a digest of the fedora-review version, the check name, the source
+    of the module defining it and the inputs it needs: spec, srpm and
+    binary rpms. Only checks which do not use the chroot are cached.
+    '''
+
+    def __init__(self, cache_dir):
+        self.log = Settings.get_logger()
+        self.cache_dir = cache_dir
+        self._digests = {}
+        self._lock = Lock()
+        try:
+            os.makedirs(cache_dir)
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise
+
+    @staticmethod
+    def is_cacheable(check):
+        ''' Return True if check result only depends on its inputs. '''
+        return check.cacheable and check.needs is not None and \
+            not CheckBase.NEEDS_CHROOT in check.needs
+
+    def get_digest(self, path):
+        ''' Return sha256 digest of file, computed once unless the
+        file is modified.
+        '''
+        stat = os.stat(path)
+        key = (path, stat.st_mtime, stat.st_size)
+        with self._lock:
+            if key in self._digests:
+                return self._digests[key]
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), ''):
+                h.update(chunk)
+        with self._lock:
+            self._digests[key] = h.hexdigest()
+        return self._digests[key]
+
+    def get_key(self, check):
+        ''' Return key for check using current inputs. '''
+        h = hashlib.sha256()
+        h.update('%s %s\0%s\0' % (__version__, build_id, check.name))
+        source = inspect.getsourcefile(check.__class__)
+        h.update(self.get_digest(source) + '\0')
+        h.update(self.get_digest(check.spec.filename) + '\0')
+        if CheckBase.NEEDS_SOURCES in check.needs or \
+        CheckBase.NEEDS_RPMS in check.needs:
+            h.update(self.get_digest(check.srpm.filename) + '\0')
+        if CheckBase.NEEDS_RPMS in check.needs:
+            rpms = [r for r in check.srpm.get_used_rpms()
+                        if not r.endswith('.src.rpm')]
+            for rpm in sorted(rpms, key=os.path.basename):
+                h.update(os.path.basename(rpm) + '\0')
+                h.update(self.get_digest(rpm) + '\0')
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def restore(self, key, check):
+        ''' Set the result of check as stored for key. Return True
+        if found, else False.
+        '''
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+        except (IOError, ValueError):
+            return False
+        check.state = entry['state']
+        check.text = entry['text']
+        check.type = entry['type']
+        check.output_extra = entry['output_extra']
+        check.attachments = [Attachment(*a) for a in entry['attachments']]
+        os.utime(self._path(key), None)
+        self.log.debug('Result cache: restored ' + check.name)
+        return True
+
+    def store(self, key, check):
+        ''' Save the result of check for key. '''
+        entry = {'name': check.name,
+                 'state': check.state,
+                 'text': check.text,
+                 'type': check.type,
+                 'output_extra': check.output_extra,
+                 'attachments': [[a.header, a.text, a.order_hint]
+                                 for a in check.attachments]}
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entry, f)
+        os.rename(tmp, self._path(key))
+
+
+# vim: set expandtab: ts=4:sw=4:
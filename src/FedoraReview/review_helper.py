@@ -28,9 +28,11 @@ import os.path
 from FedoraReview import BugException, BugzillaBug, Checks, \
           ChecksLister, CleanExitError, FedoraReviewError, Mock, \
           NameBug, ReviewDirs, ReviewDirExistsError, Settings, \
-          SettingsError, UrlBug, Sources
+          SettingsError, UrlBug, Sources, DownloadManager
 
 from FedoraReview import __version__, build_full
+from FedoraReview.checks_class import write_report
+from FedoraReview.remote import RemoteError, WorkerPool, serve_worker
 
 
 class ConfigError(FedoraReviewError):
@@ -52,6 +54,8 @@ class ReviewHelper(object):
         self.verbose = False
         self.outfile = None
         self.prebuilt = False
+        # remote.Transport running build and checks, None if local.
+        self.worker = None
 
     def __download_sources(self):
         sources = self.checks.spec.get_sources('Source')
@@ -78,7 +82,10 @@ class ReviewHelper(object):
             raise HandledError()
 
         Settings.name = self.bug.get_name()
-        self.__run_checks(self.bug.spec_file, self.bug.srpm_file)
+        if self.worker:
+            self.__run_remote(self.bug.spec_file, self.bug.srpm_file)
+        else:
+            self.__run_checks(self.bug.spec_file, self.bug.srpm_file)
 
     def __list_checks(self):
         """ List all the checks available.
@@ -90,45 +97,96 @@ class ReviewHelper(object):
 
     def __run_checks(self, spec, srpm):
         self.checks = Checks(spec, srpm )
+        if self.checks.srpm:
+            self.checks.srpm.start_extra_builds()
         if Settings.no_report:
             self.outfile = '/dev/null'
         else:
             self.outfile = ReviewDirs.report_path(self.checks.spec.name)
         with open(self.outfile,"w") as output:
-            if Settings.nobuild:
-                self.checks.srpm.is_build = True
             self.log.info('Running checks and generate report\n')
             self.checks.run_checks(output=output,
                                    writedown=not Settings.no_report)
             output.close()
+        if self.checks.srpm:
+            self.checks.srpm.get_extra_builds()
+        DownloadManager.report()
         if not os.path.exists('BUILD'):
             os.symlink(Mock.get_builddir('BUILD'), 'BUILD')
         if not Settings.no_report:
             print "Review in: " + self.outfile
 
-    def run(self):
-        self.log.debug( "Command  line: " + ' '.join(sys.argv))
+    def __run_remote(self, spec, srpm):
+        ''' Build and run checks on self.worker, write report. '''
+        self.log.info('Running build and checks on ' + self.worker.name)
         try:
-            Settings.init()
-            make_report = True
-            if Settings.list_checks:
-                self.__list_checks()
-                make_report = False
-            elif Settings.version:
-                self.__print_version()
-                make_report = False
-            elif Settings.url:
-                self.log.info("Processing bug on url: " + Settings.url )
-                self.bug = UrlBug(Settings.url)
-            elif Settings.bug:
-                self.log.info("Processing bugzilla bug: " + Settings.bug )
-                self.bug = BugzillaBug(Settings.bug, user=Settings.user)
-            elif Settings.name:
-                self.log.info("Processing local files: " + Settings.name )
-                self.bug = NameBug(Settings.name)
-            if make_report:
-                self.__do_report()
-            return 0
+            results, plugins = self.worker.review(
+                Settings.name, [spec, srpm],
+                os.path.join(ReviewDirs.root, 'worker.log'))
+        except RemoteError as err:
+            self.log.error(err.value)
+            raise HandledError()
+        if Settings.no_report:
+            self.outfile = '/dev/null'
+        else:
+            self.outfile = ReviewDirs.report_path(Settings.name)
+        with open(self.outfile, "w") as output:
+            write_report(output, results, plugins)
+        if not Settings.no_report:
+            print "Review in: " + self.outfile
+
+    def __get_bug(self):
+        """ Return the bug to review as given by Settings. """
+        if Settings.url:
+            self.log.info("Processing bug on url: " + Settings.url )
+            return UrlBug(Settings.url)
+        elif Settings.bug:
+            self.log.info("Processing bugzilla bug: " + Settings.bug )
+            return BugzillaBug(Settings.bug, user=Settings.user)
+        elif Settings.name:
+            self.log.info("Processing local files: " + Settings.name )
+            return NameBug(Settings.name)
+
+    def __review(self):
+        if Settings.workers and not self.worker:
+            self.worker = WorkerPool.from_spec(Settings.workers).acquire()
+        self.bug = self.__get_bug()
+        try:
+            self.__do_report()
+        finally:
+            Mock.release_warm_root()
+
+    def __run(self):
+        Settings.init()
+        if Settings.list_checks:
+            self.__list_checks()
+        elif Settings.version:
+            self.__print_version()
+        elif Settings.batch:
+            from FedoraReview.batch import BatchReview
+            return BatchReview.from_file(Settings.batch).run()
+        elif Settings.worker:
+            return serve_worker()
+        elif Settings.serve:
+            from FedoraReview.serve import ReviewServer, SOCKET
+            ReviewServer(Settings.socket or SOCKET,
+                         Settings.batch_jobs).serve_forever()
+        elif Settings.submit:
+            from FedoraReview.serve import ServeError, SOCKET, submit_job
+            try:
+                return submit_job(Settings.socket or SOCKET,
+                                  Settings.submit, Settings.priority)
+            except ServeError as err:
+                self.log.error(err.value)
+                raise HandledError()
+        else:
+            self.__review()
+
+    def __run_guarded(self, func):
+        """ Run func, return exit code for it and the errors raised. """
+        try:
+            rc = func()
+            return rc if rc else 0
         except BugException as err:
             print str(err)
             return 2
@@ -149,7 +207,16 @@ class ReviewHelper(object):
             self.log.debug("Exception down the road...", exc_info=True)
             self.log.error("Exception down the road...")
             return 1
-        return 0
+
+    def review(self):
+        """ Review the --bug, --url or --name in current Settings,
+        which must be initialized. Return exit code.
+        """
+        return self.__run_guarded(self.__review)
+
+    def run(self):
+        self.log.debug( "Command  line: " + ' '.join(sys.argv))
+        return self.__run_guarded(self.__run)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,147 @@
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+
+'''
+Header data for binary rpms, read once using the rpm bindings.
+'''
+
+import os
+import os.path
+import rpm
+
+from threading import Lock
+
+from settings import Settings
+
+SCRIPTLETS = {'pretrans':  (rpm.RPMTAG_PRETRANS,  rpm.RPMTAG_PRETRANSPROG),
+              'pre':       (rpm.RPMTAG_PREIN,     rpm.RPMTAG_PREINPROG),
+              'post':      (rpm.RPMTAG_POSTIN,    rpm.RPMTAG_POSTINPROG),
+              'preun':     (rpm.RPMTAG_PREUN,     rpm.RPMTAG_PREUNPROG),
+              'postun':    (rpm.RPMTAG_POSTUN,    rpm.RPMTAG_POSTUNPROG),
+              'posttrans': (rpm.RPMTAG_POSTTRANS, rpm.RPMTAG_POSTTRANSPROG)}
+
+
+def _get_list(hdr, tag):
+    ''' Return array tag as a (possibly empty) list. '''
+    value = hdr[tag]
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def format_deps(hdr, name_tag, flags_tag, version_tag):
+    ''' Return dependencies formatted as by rpm -q --requires. '''
+    deps = []
+    names = _get_list(hdr, name_tag)
+    flags = _get_list(hdr, flags_tag)
+    versions = _get_list(hdr, version_tag)
+    for name, flag, version in map(None, names, flags, versions):
+        op = ''
+        if flag and flag & rpm.RPMSENSE_LESS:
+            op += '<'
+        if flag and flag & rpm.RPMSENSE_GREATER:
+            op += '>'
+        if flag and flag & rpm.RPMSENSE_EQUAL:
+            op += '='
+        if op and version:
+            deps.append('%s %s %s' % (name, op, version))
+        else:
+            deps.append(name)
+    return deps
+
+
+class RpmHeader(object):
+    ''' Data from a binary rpm header. Attributes:
+         - path: the rpm file.
+         - name, version, release, arch: as in header.
+         - files: list of paths in package.
+         - modes, sizes: file modes and sizes, in same order as files.
+         - requires, provides: list of formatted dependencies.
+         - scriptlets: dict of scriptlet body by name e. g., 'post'.
+         - scriptlet_progs: dict of scriptlet interpreter by name.
+    '''
+
+    def __init__(self, path, hdr):
+        self.path = path
+        self.name = hdr[rpm.RPMTAG_NAME]
+        self.version = hdr[rpm.RPMTAG_VERSION]
+        self.release = hdr[rpm.RPMTAG_RELEASE]
+        self.arch = hdr[rpm.RPMTAG_ARCH]
+        self.files = _get_list(hdr, rpm.RPMTAG_FILENAMES)
+        self.modes = _get_list(hdr, rpm.RPMTAG_FILEMODES)
+        self.sizes = _get_list(hdr, rpm.RPMTAG_FILESIZES)
+        self.requires = format_deps(hdr,
+                                    rpm.RPMTAG_REQUIRENAME,
+                                    rpm.RPMTAG_REQUIREFLAGS,
+                                    rpm.RPMTAG_REQUIREVERSION)
+        self.provides = format_deps(hdr,
+                                    rpm.RPMTAG_PROVIDENAME,
+                                    rpm.RPMTAG_PROVIDEFLAGS,
+                                    rpm.RPMTAG_PROVIDEVERSION)
+        self.scriptlets = {}
+        self.scriptlet_progs = {}
+        for name, (body_tag, prog_tag) in SCRIPTLETS.iteritems():
+            if hdr[body_tag]:
+                self.scriptlets[name] = hdr[body_tag]
+            prog = hdr[prog_tag]
+            if prog:
+                self.scriptlet_progs[name] = \
+                    ' '.join(prog) if isinstance(prog, list) else prog
+
+    basename = property(lambda self: os.path.basename(self.path))
+
+
+class RpmHeaderIndex(object):
+    ''' Headers for a set of rpms, each rpm read once. Entries are
+    re-read if the file is modified.
+    '''
+
+    def __init__(self):
+        self.log = Settings.get_logger()
+        self._headers = {}
+        self._lock = Lock()
+
+    @staticmethod
+    def _read_header(path):
+        ''' Read header from rpm file, signatures are not checked. '''
+        ts = rpm.TransactionSet()
+        ts.setVSFlags(rpm._RPMVSF_NOSIGNATURES)
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            return ts.hdrFromFdno(fd)
+        finally:
+            os.close(fd)
+
+    def get(self, path):
+        ''' Return RpmHeader for given rpm path. '''
+        stat = os.stat(path)
+        key = (stat.st_mtime, stat.st_size)
+        with self._lock:
+            if path in self._headers and self._headers[path][0] == key:
+                return self._headers[path][1]
+            self.log.debug('Reading rpm header: ' + path)
+            header = RpmHeader(path, self._read_header(path))
+            self._headers[path] = (key, header)
+            return header
+
+    def get_all(self, paths):
+        ''' Return dict of RpmHeader by basename for all paths. '''
+        return dict([(os.path.basename(p), self.get(p)) for p in paths])
+
+
+# vim: set expandtab: ts=4:sw=4:
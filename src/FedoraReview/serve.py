@@ -0,0 +1,427 @@
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+
+'''
+Review daemon running queued reviews in warm worker processes, and
+the client submitting reviews to it.
+
+The daemon listens on a unix socket. A client sends one json request
+on a line, the replies are json events, one per line:
+  - {"op": "submit", "item": <batch line>, "priority": <n>,
+    "follow": <bool>} queues a review as for a --batch line. Replies
+    are a "queued" event and, if following, "started", "log" and
+    finally "done" events, the last one with the result.
+  - {"op": "status"} replies with a "status" event listing all jobs.
+'''
+
+import errno
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import os.path
+import socket
+import sys
+import time
+import Queue
+import SocketServer
+
+from threading import Event, Lock, Semaphore, Thread
+
+import batch
+import checks_class
+
+from chroot_pool import _is_alive
+
+from review_error import FedoraReviewError
+from settings import Settings
+
+SOCKET = os.path.join(os.environ['XDG_CACHE_HOME']
+                          if 'XDG_CACHE_HOME' in os.environ
+                          else os.path.expanduser('~/.cache'),
+                      'fedora-review', 'serve.sock')
+
+# Seconds between checks for dead workers.
+WATCH_INTERVAL = 1
+
+# Set in each worker process by _init_worker().
+_worker = {}
+
+
+class ServeError(FedoraReviewError):
+    ''' Cannot talk to the review daemon. '''
+    pass
+
+
+class _ProgressHandler(logging.Handler):
+    ''' Forwards log messages in a worker to the daemon. '''
+
+    def emit(self, record):
+        if not 'job' in _worker:
+            return
+        try:
+            _worker['progress'].put((_worker['job'], 'log',
+                                     self.format(record)))
+        except Exception:
+            self.handleError(record)
+
+
+def _init_worker(counter, jobs, progress):
+    ''' Setup a worker process as for a batch, forward log messages. '''
+    batch._init_worker(counter, jobs)
+    _worker['progress'] = progress
+    handler = _ProgressHandler(logging.INFO)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logging.getLogger('').addHandler(handler)
+
+
+def _review(job_id, item):
+    ''' Run a review in a worker, report result to the daemon. '''
+    _worker['job'] = job_id
+    _worker['progress'].put((job_id, 'pid', os.getpid()))
+    try:
+        result = batch._review(item)
+    except:
+        logging.getLogger('').debug('Review failed', exc_info=True)
+        result = dict(item)
+        result.update({'rc': 1, 'report': None, 'elapsed': 0.0,
+                       'worker': batch._worker.get('index', 0)})
+    finally:
+        del _worker['job']
+    _worker['progress'].put((job_id, 'done', result))
+
+
+def _failed(item):
+    ''' Return result for a review which didn't complete. '''
+    result = dict(item)
+    result.update({'rc': 1, 'report': None, 'elapsed': 0.0, 'worker': 0})
+    return result
+
+
+class Job(object):
+    ''' A queued review. '''
+
+    def __init__(self, job_id, item, priority):
+        self.id = job_id
+        self.item = item
+        self.priority = priority
+        self.state = 'queued'
+        self.submitted = time.time()
+        self.started = None
+        self.result = None
+        self.pid = None
+        self.subscribers = []
+
+    def to_dict(self):
+        ''' Return json-friendly description. '''
+        return {'id': self.id, 'item': self.item,
+                'priority': self.priority, 'state': self.state,
+                'pid': self.pid, 'result': self.result}
+
+
+class _Handler(SocketServer.StreamRequestHandler):
+    ''' Serves one client request. '''
+
+    def _send(self, event):
+        self.wfile.write(json.dumps(event) + '\n')
+        self.wfile.flush()
+
+    def _submit(self, request):
+        item = batch.parse_item(str(request.get('item', '')))
+        if not item:
+            self._send({'event': 'error', 'message': 'Bad item'})
+            return
+        subscriber = Queue.Queue() if request.get('follow', True) \
+                         else None
+        job = self.server.review_server.submit(
+                  item, int(request.get('priority', 0)), subscriber)
+        self._send({'event': 'queued', 'id': job.id})
+        if subscriber is None:
+            return
+        try:
+            while True:
+                event = subscriber.get()
+                self._send(event)
+                if event['event'] == 'done':
+                    break
+        finally:
+            self.server.review_server.unsubscribe(job, subscriber)
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            if request.get('op') == 'submit':
+                self._submit(request)
+            elif request.get('op') == 'status':
+                self._send({'event': 'status',
+                            'jobs': self.server.review_server.status()})
+            else:
+                self._send({'event': 'error', 'message': 'Bad op'})
+        except ValueError as err:
+            self._send({'event': 'error', 'message': str(err)})
+        except socket.error:
+            pass
+
+
+class _UnixServer(SocketServer.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class ReviewServer(object):
+    ''' Runs submitted reviews in a pool of jobs worker processes,
+    highest priority first and else in submit order. Workers are
+    forked after loading plugins and reused, keeping them, Bugzilla
+    sessions and mock roots warm between reviews.
+    '''
+
+    def __init__(self, socket_path, jobs):
+        self.log = Settings.get_logger()
+        self.socket_path = socket_path
+        self.jobs = max(1, jobs)
+        self._queue = Queue.PriorityQueue()
+        self._jobs = {}
+        self._lock = Lock()
+        self._ids = itertools.count(1)
+        self._slots = Semaphore(self.jobs)
+        self._progress = None
+        self._pool = None
+        self._server = None
+        self._threads = []
+        self._stopped = Event()
+        self._lost = False
+
+    def submit(self, item, priority=0, subscriber=None):
+        ''' Queue review of item as returned by batch.parse_item().
+        Events for the job are put on the subscriber queue, if any.
+        Return the Job.
+        '''
+        with self._lock:
+            job = Job(self._ids.next(), item, priority)
+            if subscriber is not None:
+                job.subscribers.append(subscriber)
+            self._jobs[job.id] = job
+        self._queue.put((-priority, job.id, job))
+        self.log.info('Queued job %d: %s' % (job.id, item['value']))
+        return job
+
+    def unsubscribe(self, job, subscriber):
+        ''' Stop sending events for job to subscriber. '''
+        with self._lock:
+            if subscriber in job.subscribers:
+                job.subscribers.remove(subscriber)
+
+    def status(self):
+        ''' Return list of all jobs, as dicts. '''
+        with self._lock:
+            return [self._jobs[i].to_dict() for i in sorted(self._jobs)]
+
+    def _publish(self, job, event):
+        with self._lock:
+            for subscriber in job.subscribers:
+                subscriber.put(event)
+
+    def _finish(self, job, result):
+        job.state = 'done'
+        job.result = result
+        self.log.info('Job %d done, rc: %s' % (job.id, result['rc']))
+        self._publish(job, {'event': 'done', 'id': job.id,
+                            'result': result})
+
+    def _done(self, job, result):
+        ''' Finish a running job and free its slot, once. '''
+        with self._lock:
+            if job.state != 'running':
+                return
+            job.state = 'done'
+        self._finish(job, result)
+        self._slots.release()
+
+    def _dispatch(self):
+        ''' Thread starting queued jobs when there is a free worker. '''
+        while True:
+            self._slots.acquire()
+            job = self._queue.get()[2]
+            if not job:
+                break
+            job.state = 'running'
+            job.started = time.time()
+            self.log.info('Starting job %d' % job.id)
+            self._publish(job, {'event': 'started', 'id': job.id})
+            self._pool.apply_async(_review, (job.id, job.item))
+
+    def _forward(self):
+        ''' Thread forwarding log messages and results from workers. '''
+        while True:
+            msg = self._progress.get()
+            if not msg:
+                break
+            job_id, what, data = msg
+            job = self._jobs[job_id]
+            if what == 'done':
+                self._done(job, data)
+            elif what == 'pid':
+                job.pid = data
+            else:
+                self._publish(job, {'event': 'log', 'id': job_id,
+                                    'message': data})
+
+    def _watch(self):
+        ''' Thread finishing jobs with rc 1 when their worker died. The
+        pool replaces the worker but never completes its task. A job is
+        given up if its worker is gone in two checks in a row, so that a
+        'done' sent just before exiting is forwarded first.
+        '''
+        suspects = set()
+        while not self._stopped.wait(WATCH_INTERVAL):
+            with self._lock:
+                dead = [j for j in self._jobs.values()
+                        if j.state == 'running' and j.pid and
+                            not _is_alive(j.pid)]
+            for job in dead:
+                if job.id in suspects:
+                    self.log.warning('Worker %d running job %d died'
+                                     % (job.pid, job.id))
+                    self._lost = True
+                    self._done(job, _failed(job.item))
+            suspects = set(j.id for j in dead)
+
+    def start(self):
+        ''' Fork the workers and start running queued jobs. '''
+        if self._pool:
+            return
+        checks_class._load_plugins()
+        self._progress = multiprocessing.Queue()
+        counter = multiprocessing.Value('i', 0)
+        self._pool = multiprocessing.Pool(self.jobs, _init_worker,
+                                          (counter, self.jobs,
+                                           self._progress))
+        self._stopped.clear()
+        for target in [self._dispatch, self._forward, self._watch]:
+            thread = Thread(target=target)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def listen(self):
+        ''' Create the socket, serve_forever() accepts clients on it. '''
+        try:
+            os.makedirs(os.path.dirname(self.socket_path))
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX)
+            try:
+                probe.connect(self.socket_path)
+            except socket.error:
+                os.unlink(self.socket_path)
+            else:
+                raise ServeError('A server is already listening on '
+                                 + self.socket_path)
+            finally:
+                probe.close()
+        self._server = _UnixServer(self.socket_path, _Handler)
+        self._server.review_server = self
+
+    def serve_forever(self):
+        ''' Serve clients until interrupted. '''
+        self.start()
+        if not self._server:
+            self.listen()
+        self.log.info('Serving reviews on %s, %d in parallel'
+                      % (self.socket_path, self.jobs))
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        ''' Close socket, wait for running jobs. Queued jobs are
+        finished with rc 1.
+        '''
+        if self._server:
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self._server = None
+        if not self._pool:
+            return
+        self._queue.put((float('-inf'), 0, None))
+        self._threads[0].join()
+        self._pool.close()
+        while [j for j in self.status() if j['state'] == 'running']:
+            time.sleep(0.1)
+        if self._lost:
+            # The pool waits for a task lost by a dead worker for ever.
+            self._pool.terminate()
+        self._pool.join()
+        self._progress.put(None)
+        self._threads[1].join()
+        self._stopped.set()
+        self._threads[2].join()
+        self._pool = None
+        self._threads = []
+        self._lost = False
+        while not self._queue.empty():
+            job = self._queue.get()[2]
+            self._finish(job, _failed(job.item))
+
+
+def request(socket_path, req):
+    ''' Send request to the daemon, yield the reply events. '''
+    sock = socket.socket(socket.AF_UNIX)
+    try:
+        sock.connect(socket_path)
+    except socket.error as err:
+        raise ServeError('Cannot connect to review server at %s: %s'
+                         % (socket_path, err))
+    f = sock.makefile('r+')
+    try:
+        f.write(json.dumps(req) + '\n')
+        f.flush()
+        for line in f:
+            yield json.loads(line)
+    finally:
+        f.close()
+        sock.close()
+
+
+def submit_job(socket_path, line, priority=0, out=sys.stdout):
+    ''' Submit a review of a --batch line and print the progress.
+    Return the review exit code.
+    '''
+    for event in request(socket_path, {'op': 'submit', 'item': line,
+                                       'priority': priority}):
+        if event['event'] == 'error':
+            raise ServeError(event['message'])
+        elif event['event'] == 'log':
+            out.write(event['message'] + '\n')
+        elif event['event'] == 'done':
+            result = event['result']
+            if result['report']:
+                out.write('Review in: %s\n' % result['report'])
+            return result['rc']
+        else:
+            out.write('Job %d %s\n' % (event['id'], event['event']))
+    raise ServeError('Connection closed by review server')
+
+
+# vim: set expandtab: ts=4:sw=4:
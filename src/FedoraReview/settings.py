@@ -24,6 +24,7 @@ import argparse
 import grp
 import logging
 import errno
+import multiprocessing
 import os
 import os.path
 import re
@@ -131,6 +132,17 @@ class _Settings(object):
                     metavar='<url>',
                      help='Use another bugzilla, using complete'
                           ' url to bug page.')
+        modes.add_argument('--batch', metavar='<file>', dest='batch',
+                    help='Review all bugs, urls and names listed in'
+                         ' <file>, one per line, - for stdin.')
+        modes.add_argument('--serve', action='store_true', default=False,
+                    help='Run as a daemon reviewing items submitted'
+                         ' using --submit.')
+        modes.add_argument('--submit', metavar='<item>', dest='submit',
+                    help='Let the --serve daemon review <item>, a line'
+                         ' as in a --batch file, and print the progress.')
+        modes.add_argument('--worker', action='store_true', default=False,
+                    help=argparse.SUPPRESS)
         modes.add_argument('-d','--display-checks', default = False,
                     action='store_true',dest='list_checks',
                     help='List all available checks.')
@@ -147,6 +159,21 @@ class _Settings(object):
                     help='Configuration to use for the mock build,'
                          " defaults to 'root' defined in" 
                          ' /etc/mock/default.cfg')
+        optional.add_argument('--chroot-pool', dest='chroot_pool', type=int,
+                    metavar='<roots>', default=0,
+                    help='Reuse up to <roots> initialized mock roots for'
+                         ' the mock config, restored from a snapshot'
+                         ' for each review. Requires a mock config with'
+                         ' snapshot support.')
+        optional.add_argument('--extra-mock-configs',
+                    dest='extra_mock_configs', metavar='"<config>,..."',
+                    help='Comma-separated list of additional mock'
+                         ' configs (as for --mock-config) to build the'
+                         ' srpm with, concurrently with the review.')
+        optional.add_argument('--mock-builds', dest='mock_builds', type=int,
+                    metavar='<builds>', default=2,
+                    help='Max number of --extra-mock-configs builds run in'
+                         ' parallel, defaults to 2.')
         optional.add_argument('--no-report',  action='store_true',
                     help='Do not print review report.')
         optional.add_argument('--no-build', action='store_true',
@@ -170,6 +197,58 @@ class _Settings(object):
         optional.add_argument('-x', '--exclude',
                     dest='exclude', metavar='"test,..."',
                     help='Comma-separated list of tests to exclude.')
+        optional.add_argument('-j', '--jobs', dest='jobs', type=int,
+                    metavar='<jobs>', default=multiprocessing.cpu_count(),
+                    help='Max number of checks run in parallel, defaults'
+                         ' to number of cpus.')
+        optional.add_argument('--workers', dest='workers',
+                    metavar='"<host>[:<slots>],..."',
+                    help='Build and run checks on these hosts using ssh,'
+                         ' at most <slots> (default 1) reviews at a time'
+                         ' on each. The host local runs them locally.')
+        optional.add_argument('--plugin-jobs', dest='plugin_jobs', type=int,
+                    metavar='<plugins>', default=multiprocessing.cpu_count(),
+                    help='Max number of external plugins run in parallel,'
+                         ' defaults to number of cpus.')
+        optional.add_argument('--plugin-timeout', dest='plugin_timeout',
+                    type=int, metavar='<seconds>', default=600,
+                    help='Stop external plugins not answering a request'
+                         ' within <seconds>, 0 waits forever. Defaults'
+                         ' to 600.')
+        optional.add_argument('--batch-jobs', dest='batch_jobs', type=int,
+                    metavar='<reviews>', default=2,
+                    help='Max number of reviews run in parallel using'
+                         ' --batch or --serve, defaults to 2.')
+        optional.add_argument('--socket', dest='socket', metavar='<path>',
+                    help='Unix socket used by --serve and --submit,'
+                         ' defaults to ~/.cache/fedora-review/serve.sock.')
+        optional.add_argument('--priority', dest='priority', type=int,
+                    metavar='<n>', default=0,
+                    help='Priority of the --submit item, higher runs'
+                         ' first. Defaults to 0.')
+        optional.add_argument('--no-pipeline', action='store_false',
+                    dest='pipeline',
+                    help='Do not build the package in the background'
+                         ' while sources are downloaded and spec file'
+                         ' checks are run.')
+        optional.add_argument('--cache-size', dest='cache_size', type=int,
+                    metavar='<MiB>', default=1024,
+                    help='Max size of the download cache shared by all'
+                         ' reviews, 0 disables it. Defaults to 1024.')
+        optional.add_argument('--build-cache-size', dest='build_cache_size',
+                    type=int, metavar='<MiB>', default=2048,
+                    help='Max size of the cache of built packages shared'
+                         ' by all reviews, 0 disables it. Defaults to'
+                         ' 2048.')
+        optional.add_argument('--result-cache', action='store_true',
+                    dest='result_cache', default=False,
+                    help='Reuse results of checks not using the mock'
+                         ' chroot from earlier reviews with the same spec,'
+                         ' srpm and rpms.')
+        optional.add_argument('--downloads', dest='downloads', type=int,
+                    metavar='<downloads>', default=4,
+                    help='Max number of parallel downloads, defaults'
+                         ' to 4.')
         optional.add_argument('-k', '--checksum', dest='checksum', default='sha256',
                     choices=['md5', 'sha1', 'sha224', 'sha256',
                              'sha384', 'sha512'],
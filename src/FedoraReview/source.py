@@ -23,73 +23,108 @@ Tools for helping Fedora package reviewers
 import os.path
 import shutil
 
+from threading import Lock
 from urlparse import urlparse
 
+from archive import Archive, ArchiveError
+from download_manager import DownloadManager
 from helpers import Helpers
 from review_dirs import ReviewDirs
 from review_error import FedoraReviewError
 from settings import Settings
 
 class Source(Helpers):
-    ''' A source defined in the specfile.
-    Attributes:
+    ''' A source defined in the specfile. The download is started when
+    created, and the attributes depending on it are available when
+    it's completed. Attributes:
          - url: complete url, possibly file://
          - filename: local filename
          - tag: as defined in specfile e. g., 'Source0'
          - sources: container holding this source.
          - local: True if the source is just a file, false
            if it's a downloaded url
+         - local_src: file in startdir used instead of a failed
+           download, or None.
+         - downloaded: False if the download failed.
+         - checksums: dict of hex digests by algorithm, computed
+           while downloading.
     '''
     def __init__(self, sources, tag, url):
-
-        def my_logger(cache):
-             if cache:
-                 path = urlparse(url).path
-                 self.log.info("Using cached data for (%s): %s" %
-                               (tag, os.path.basename(path)))
-             else:
-                 self.log.info("Downloading (%s): %s" % (tag, url))
-
-
         Helpers.__init__(self)
         self.sources = sources
         self.tag = tag
-        self.downloaded = True
-        is_url = urlparse(url)[0] != ''
-        if is_url:  # This is a URL, Download it
-            self.url = url
-            self.local = False
-            try:
-                self.filename = self._get_file(url,
-                                               ReviewDirs.upstream,
-                                               my_logger)
-            except:
-                self.log.debug('Download error on ' + url,
-                                exc_info=True)
-                self.log.warning('Cannot download url: ' + url)
-                self.downloaded = False
-                # get the filename
-                url = urlparse(url)[2].split('/')[-1]
-
-        if not is_url or not self.downloaded:  # this is a local file in the SRPM
-            local_src = os.path.join(ReviewDirs.startdir, url)
-            if os.path.exists(local_src):
-                self.log.info(
-                    "Using local file " + url + " as " + tag)
-                srcdir = ReviewDirs.startdir
-                self.local_src = local_src
-                self.local = False
+        self._spec_url = url
+        self._attrs = None
+        self._lock = Lock()
+        self._extract_lock = Lock()
+        self._pending = None
+        if urlparse(url)[0] != '':
+            fname = url.rsplit('/', 1)[1]
+            path = os.path.join(ReviewDirs.upstream, fname)
+            if os.path.exists(path) and Settings.cache:
+                self.log.info("Using cached data for (%s): %s" %
+                              (tag, fname))
+                self._attrs = {'url': url, 'filename': path, 'local': False,
+                               'local_src': None, 'downloaded': True,
+                               'checksums': {}}
             else:
-                self.log.info("No upstream for (%s): %s" % (tag, url))
-                srcdir = ReviewDirs.srpm_unpacked
-                self.local = True
-            self.filename = os.path.join(srcdir, url)
-            self.url = 'file://' + self.filename
+                self._pending = DownloadManager.submit(url, path, tag)
+
+    def _resolve(self):
+        ''' Wait for the download, return dict of attributes. '''
+        with self._lock:
+            if self._attrs:
+                return self._attrs
+            attrs = {'downloaded': True, 'local_src': None,
+                     'checksums': {}}
+            url = self._spec_url
+            is_url = urlparse(url)[0] != ''
+            if is_url:
+                attrs['url'] = url
+                attrs['local'] = False
+                try:
+                    attrs['filename'] = self._pending.wait()
+                    attrs['checksums'] = self._pending.checksums
+                except:
+                    self.log.debug('Download error on ' + url,
+                                    exc_info=True)
+                    self.log.warning('Cannot download url: ' + url)
+                    attrs['downloaded'] = False
+                    # get the filename
+                    url = urlparse(url)[2].split('/')[-1]
+
+            if not is_url or not attrs['downloaded']:
+                # this is a local file in the SRPM
+                local_src = os.path.join(ReviewDirs.startdir, url)
+                if os.path.exists(local_src):
+                    self.log.info(
+                        "Using local file " + url + " as " + self.tag)
+                    srcdir = ReviewDirs.startdir
+                    attrs['local_src'] = local_src
+                    attrs['local'] = False
+                else:
+                    self.log.info("No upstream for (%s): %s" %
+                                  (self.tag, url))
+                    srcdir = ReviewDirs.srpm_unpacked
+                    attrs['local'] = True
+                attrs['filename'] = os.path.join(srcdir, url)
+                attrs['url'] = 'file://' + attrs['filename']
+            self._attrs = attrs
+            return attrs
+
+    url = property(lambda self: self._resolve()['url'])
+    filename = property(lambda self: self._resolve()['filename'])
+    local = property(lambda self: self._resolve()['local'])
+    local_src = property(lambda self: self._resolve()['local_src'])
+    downloaded = property(lambda self: self._resolve()['downloaded'])
+    checksums = property(lambda self: self._resolve()['checksums'])
 
     def check_source_checksum(self):
         self.log.debug("Checking source {0} : {1}".format(Settings.checksum,
                                                           self.filename))
         if self.downloaded:
+            if Settings.checksum in self.checksums:
+                return self.checksums[Settings.checksum]
             sum = self._checksum(self.filename)
             return sum
         else:
@@ -109,13 +144,37 @@ class Source(Helpers):
             could be extracted e. g., plain files are copied to the
             extract-dir.
         '''
-        self.extract_dir = os.path.join(ReviewDirs.upstream_unpacked,
-                                        self.tag)
-        if not os.path.exists(self.extract_dir):
-            os.mkdir(self.extract_dir)
-        if self.downloaded:
-            if not self.rpmdev_extract(self.filename, self.extract_dir):
-                shutil.copy(self.filename, self.extract_dir)
+        with self._extract_lock:
+            if hasattr(self, 'extract_dir'):
+                return
+            extract_dir = os.path.join(ReviewDirs.upstream_unpacked,
+                                       self.tag)
+            if not os.path.exists(extract_dir):
+                os.mkdir(extract_dir)
+            if self.downloaded:
+                if not self.extract_archive(self.filename, extract_dir):
+                    shutil.copy(self.filename, extract_dir)
+            self.extract_dir = extract_dir
+
+    def list_files(self):
+        ''' Return list of all files in the source, as paths in the
+        extract_dir. Archives are listed without extracting them when
+        possible.
+        '''
+        if not hasattr(self, 'extract_dir') and self.downloaded \
+        and Archive.is_supported(self.filename):
+            extract_dir = os.path.join(ReviewDirs.upstream_unpacked,
+                                       self.tag)
+            try:
+                return [os.path.join(extract_dir, name)
+                        for name in Archive(self.filename).list()]
+            except ArchiveError as err:
+                self.log.debug(str(err))
+        self.extract()
+        files = []
+        for root, dirs, names in os.walk(self.extract_dir):
+            files.extend([os.path.join(root, name) for name in names])
+        return files
 
     def get_source_topdir(self):
         """
@@ -24,6 +24,9 @@ import logging
 import os.path
 import glob
 
+from multiprocessing.pool import ThreadPool
+
+from file_index import FileIndex
 from source import Source
 from settings import Settings
 
@@ -36,6 +39,7 @@ class Sources(object):
     def __init__(self, spec):
         self.log = Settings.get_logger()
         self._sources_files = None
+        self._file_index = None
         self._sources = {}
         for tag, url in spec.get_sources('Source').iteritems():
             self.add(tag, url)
@@ -57,12 +61,24 @@ class Sources(object):
         """ Get all source objects """
         return [self._sources[s] for s in self._sources]
 
+    def _map(self, func):
+        """ Return [func(s) for s in sources], using several threads. """
+        sources = self._sources.values()
+        jobs = min(Settings.jobs, len(sources))
+        if jobs < 2:
+            return map(func, sources)
+        pool = ThreadPool(jobs)
+        try:
+            return pool.map(func, sources)
+        finally:
+            pool.close()
+            pool.join()
+
     def extract_all(self):
         """ Extract all sources which are detected can be extracted based
-        on their extension.
+        on their extension, in parallel.
         """
-        for source in self._sources.values():
-            source.extract()
+        self._map(lambda s: s.extract())
 
     def extract(self, source_url=None, source_filename=None):
         """ Extract the source specified by its url or filename.
@@ -79,33 +95,33 @@ class Sources(object):
                 source.extract()
 
     def get_files_sources(self):
-        """ Return the list of all files found in the sources. """
+        """ Return the list of all files found in the sources. Archives
+        are listed without extracting them if possible.
+        """
         if self._sources_files:
             return self._sources_files
-        try:
-            self.extract_all()
-        except  OSError as e:
-            self.log.error( "OS error extracting ",  + str(e))
-            self.log.debug( "Extract error ",  + str(e), exc_info=True)
-            self._source_files = []
-            return []
+
+        def list_files(source):
+            try:
+                self.log.debug('Adding files found in %s' % source.filename)
+                return source.list_files()
+            except OSError as e:
+                self.log.error("OS error listing %s: %s" %
+                               (source.filename, str(e)))
+                self.log.debug("List error", exc_info=True)
+                return []
+
         sources_files = []
-        for source in self._sources.values():
-            # If the sources are not extracted then we add the source itself
-            if not source.extract_dir:
-                self.log.debug('%s cannot be extracted, adding as such'
-                               ' to sources' % source.filename)
-                sources_files.append(source.filename)
-            else:
-                try:
-                    self.log.debug('Adding files found in %s' % source.filename)
-                    for root, subFolders, files in os.walk(source.extract_dir):
-                        for filename in files:
-                            sources_files.append(os.path.join(root, filename))
-                except AttributeError as e:
-                    self.log.debug( "get_files_sources(): Attribute error " + str(e))
+        for files in self._map(list_files):
+            sources_files.extend(files)
         self._sources_files = sources_files
         return sources_files
 
+    def get_file_index(self):
+        """ Return a FileIndex for the files in get_files_sources(). """
+        if not self._file_index:
+            self._file_index = FileIndex({'': self.get_files_sources()})
+        return self._file_index
+
 
 # vim: set expandtab: ts=4:sw=4:
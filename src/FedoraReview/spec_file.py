@@ -26,6 +26,7 @@ import subprocess
 
 from subprocess import call, Popen, PIPE, STDOUT
 
+from rpm_index import format_deps
 from settings import Settings
 
 SECTIONS = ['build', 'changelog', 'check', 'clean', 'description', 'files',
@@ -54,6 +55,7 @@ class SpecFile(object):
 
         ts = rpm.TransactionSet()
         self.spec_obj = ts.parseSpec(self.filename)
+        self._header_tags = None
 
         self.name = self.get_from_spec('name')
         self.version = self.get_from_spec('version')
@@ -119,7 +121,47 @@ class SpecFile(object):
             for line in sections[sec]:
                 print "      %s" % line
 
+    def _get_header_tags(self):
+        ''' Return all tags in the parsed spec's main package header
+        as a dict indexed by tag number, or None if not available.
+        Read from spec_obj once, and cached.
+        '''
+        if self._header_tags is not None:
+            return self._header_tags
+        try:
+            if self.spec_obj.packages:
+                hdr = self.spec_obj.packages[0].header
+            else:
+                hdr = self.spec_obj.sourceHeader
+            tags = {}
+            for tag in hdr.keys():
+                tags[tag] = hdr[tag]
+        except (AttributeError, TypeError, rpm.error):
+            self.log.debug("Cannot read tags from parsed spec",
+                           exc_info=True)
+            return None
+        self._header_tags = tags
+        return tags
+
     def get_from_spec(self, macro):
+        ''' Get the value for a given tag (macro is resolved) from the
+        parsed spec. Returns None if the tag is unknown or not present.
+        '''
+        tags = self._get_header_tags()
+        if tags is None:
+            return self._query_spec(macro)
+        tag = getattr(rpm, 'RPMTAG_' + macro.upper(), None)
+        if tag is None:
+            return None
+        value = tags.get(tag)
+        if isinstance(value, list):
+            # As rpm --qf, use first element for array tags.
+            value = value[0] if value else None
+        if value is None or value == '':
+            return None
+        return str(value)
+
+    def _query_spec(self, macro):
         ''' Use rpm for a value for a given tag (macro is resolved)'''
         qf = '%{' + macro.upper() + "}\n"  # The RPM tag to search for
         # get the name
@@ -198,9 +240,7 @@ class SpecFile(object):
         values = []
         lines = self.lines
         if section:
-            lines = self.get_section(section)
-            if lines:
-                lines = lines[section]
+            lines = self.get_section(section).get(section, [])
         for line in lines:
             # check for release
             for key in keys:
@@ -215,6 +255,77 @@ class SpecFile(object):
                         values.append(value)
         return values
 
+    def _get_package_header(self, subpackage=None):
+        ''' Return header of main package or given subpackage, either
+        as in %package -n or the suffix of the name. Returns None if not
+        available.
+        '''
+        try:
+            if subpackage is None:
+                if self.spec_obj.packages:
+                    return self.spec_obj.packages[0].header
+                return self.spec_obj.sourceHeader
+            for pkg in self.spec_obj.packages[1:]:
+                name = pkg.header[rpm.RPMTAG_NAME]
+                if name in [subpackage, '%s-%s' % (self.name, subpackage)]:
+                    return pkg.header
+        except (AttributeError, TypeError, rpm.error):
+            self.log.debug("Cannot read package header from parsed spec",
+                           exc_info=True)
+        return None
+
+    def get_subpackages(self):
+        ''' Return subpackages from parsed spec, as the suffix of the
+        package name or the full name if not starting with it.
+        '''
+        subpackages = []
+        try:
+            packages = self.spec_obj.packages[1:]
+        except (AttributeError, TypeError, rpm.error):
+            return subpackages
+        for pkg in packages:
+            name = pkg.header[rpm.RPMTAG_NAME]
+            if name.startswith(self.name + '-'):
+                name = name[len(self.name) + 1:]
+            subpackages.append(name)
+        return subpackages
+
+    def get_expanded_tag(self, tag, subpackage=None):
+        ''' Return list of values for tag from parsed spec, macros
+        resolved, for main package or given subpackage.
+        '''
+        hdr = self._get_package_header(subpackage)
+        rpmtag = getattr(rpm, 'RPMTAG_' + tag.upper(), None)
+        if hdr is None or rpmtag is None:
+            return []
+        value = hdr[rpmtag]
+        if value is None or value == '':
+            return []
+        if not isinstance(value, list):
+            value = [value]
+        return [str(v) for v in value]
+
+    def get_requires(self, subpackage=None):
+        ''' Return list of requires for main package or subpackage,
+        formatted as by rpm -q --requires.
+        '''
+        hdr = self._get_package_header(subpackage)
+        if hdr is None:
+            return []
+        return format_deps(hdr, rpm.RPMTAG_REQUIRENAME,
+                           rpm.RPMTAG_REQUIREFLAGS,
+                           rpm.RPMTAG_REQUIREVERSION)
+
+    def get_buildrequires(self):
+        ''' Return list of build requires, formatted as requires. '''
+        try:
+            hdr = self.spec_obj.sourceHeader
+        except (AttributeError, rpm.error):
+            return []
+        return format_deps(hdr, rpm.RPMTAG_REQUIRENAME,
+                           rpm.RPMTAG_REQUIREFLAGS,
+                           rpm.RPMTAG_REQUIREVERSION)
+
     def get_section(self, section):
         '''
         get the lines in a section in the spec file
@@ -22,14 +22,23 @@ Tools for helping Fedora package reviewers
 
 import logging
 import os.path
+import re
+import shlex
 
 from glob import glob
 from subprocess import call
+from threading import RLock, Thread
 
+import build_log
+
+from build_cache import get_build_cache, get_build_key
+from file_index import FileIndex
 from helpers import Helpers
 from mock import Mock
+from multi_build import MultiBuild
 from review_dirs import ReviewDirs
 from review_error import FedoraReviewError
+from rpm_index import RpmHeaderIndex
 from settings import Settings
 
 
@@ -46,7 +55,16 @@ class SRPMFile(Helpers):
         self.spec = spec
         self.is_build = False
         self.build_failed = False
+        self.from_cache = False
+        self.build_index = None
+        self._log_index = None
+        self._extra_builds = None
+        self._build_lock = RLock()
+        self._build_thread = None
+        self._build_error = None
         self._rpm_files = None
+        self._file_index = None
+        self.rpm_index = RpmHeaderIndex()
         self.rpmlint_output = []
         self.unpack()
 
@@ -56,38 +74,35 @@ class SRPMFile(Helpers):
             return;
 
         wdir = ReviewDirs.srpm_unpacked
-        oldpwd = os.getcwd()
-        os.chdir(wdir)
-        src = src if src else self.filename
+        src = os.path.abspath(src if src else self.filename)
         cmd = 'rpm2cpio ' + src + ' | cpio -u -i --quiet'
-        rc = call(cmd, shell=True)
+        rc = call(cmd, shell=True, cwd=wdir)
         if rc != 0:
             self.log.warn(
                   "Cannot unpack %s into %s" % (self.filename, wdir))
         else:
             self.unpacked_src = wdir
-        os.chdir(oldpwd)
 
     def extract(self, path):
         """ Extract a named source and return containing directory. """
-        self.filename = os.path.basename(path)
-        self.unpack(path)
+        filename = os.path.basename(path)
+        self.unpack()
         files = glob( os.path.join(self.unpacked_src, '*'))
-        if not self.filename in [os.path.basename(f) for f in files]:
+        if not filename in [os.path.basename(f) for f in files]:
             self.log.error(
                'Trying to unpack non-existing source: ' + path)
             return None
         extract_dir = os.path.join(self.unpacked_src,
-                                   self.filename  + '-extract')
+                                   filename  + '-extract')
         if os.path.exists(extract_dir):
             return extract_dir
         else:
             os.mkdir(extract_dir)
-        rv = self.rpmdev_extract(os.path.join(self.unpacked_src,
-                                              self.filename),
-                                 extract_dir)
+        rv = self.extract_archive(os.path.join(self.unpacked_src,
+                                               filename),
+                                  extract_dir)
         if not rv:
-            self.log.error("Cannot unpack " +  self.filename)
+            self.log.error("Cannot unpack " +  filename)
             return None
         return extract_dir
 
@@ -102,18 +117,74 @@ class SRPMFile(Helpers):
         """
         if Settings.prebuilt:
             return SRPMFile.BUILD_PREBUILT
-        if self.build_failed:
-            return SRPMFile.BUILD_FAIL
-        if force:
-            return self.mockbuild(True)
-        if self.is_build or Settings.nobuild:
-            if Mock.have_cache_for(self.spec.name):
-                self.log.debug('Using already built rpms.')
+        with self._build_lock:
+            if self._build_error:
+                error, self._build_error = self._build_error, None
+                raise error
+            if self.build_failed:
+                return SRPMFile.BUILD_FAIL
+            if force:
+                return self.mockbuild(True)
+            if self.is_build:
                 return SRPMFile.BUILD_OK
-            else:
-                self.log.info(
-                     'No valid cache, building despite --no-build.')
-        return self.mockbuild(force)
+            if self.restore_build():
+                return SRPMFile.BUILD_OK
+            if Settings.nobuild:
+                if Mock.have_cache_for(self.spec.name):
+                    self.log.debug('Using already built rpms.')
+                    self.is_build = True
+                    return SRPMFile.BUILD_OK
+                else:
+                    self.log.info(
+                         'No valid cache, building despite --no-build.')
+            return self.mockbuild(force)
+
+    def _background_build(self):
+        """ Thread running build(). An error is raised again by the
+        first build() call after it.
+        """
+        with self._build_lock:
+            try:
+                self.build()
+            except FedoraReviewError as err:
+                self._build_error = err
+            except Exception as err:
+                self.log.debug('Background build failed', exc_info=True)
+                self._build_error = err
+
+    def start_build(self):
+        """ Start build() in a background thread. Later build()
+        calls wait until it's done.
+        """
+        if self._build_thread or Settings.prebuilt:
+            return
+        self.log.debug('Starting build in background')
+        self._build_thread = Thread(target=self._background_build,
+                                    name='mock-build')
+        self._build_thread.daemon = True
+        self._build_thread.start()
+
+    def _get_build_key(self):
+        """ Return the build cache key for this srpm. """
+        return get_build_key(self.filename, Settings.mock_config,
+                             Settings.mock_options)
+
+    def restore_build(self):
+        """ Restore rpms and logs from a previous build of the same
+        srpm, mock config and options from the build cache. Return
+        True if found.
+        """
+        cache = get_build_cache()
+        if not cache:
+            return False
+        if not cache.restore(self._get_build_key(), Mock.resultdir):
+            return False
+        self.log.info('Using cached build of ' +
+                      os.path.basename(self.filename))
+        self.is_build = True
+        self.from_cache = True
+        self._log_index = None
+        return True
 
     def mockbuild(self, force=False):
         """ Run a mock build against the package.
@@ -123,40 +194,89 @@ class SRPMFile(Helpers):
         :kwarg silence, boolean to set/remove the output from the mock
             build.
         """
+        Mock.acquire_warm_root()
+        Mock.close_shell()
         info = 'Rebuilding ' + self.filename + ' using '
         if Settings.mock_config:
              self.log.info(info + 'mock root ' + Settings.mock_config)
         else:
              self.log.info(info + 'default root')
-        cmd = 'mock'
+        cmd = ['mock']
         if Settings.mock_config:
-            cmd += ' -r ' + Settings.mock_config
+            cmd.extend(['-r', Settings.mock_config])
         if Settings.log_level > logging.INFO:
-            cmd += ' -q'
-        cmd += ' --rebuild'
-        cmd +=  ' ' + Mock.get_mock_options()
-        cmd += ' ' + self.filename + ' 2>&1 | tee build.log'
-        if not Settings.verbose and not ' -q' in cmd:
-            cmd += ' | egrep "Results and/or logs|ERROR" '
-        self.log.debug('Mock command: %s' % cmd)
-        rc = call(cmd, shell=True)
+            cmd.append('-q')
+        cmd.append('--rebuild')
+        cmd.extend(shlex.split(Mock.get_mock_options()))
+        cmd.append(self.filename)
+        if Settings.verbose or '-q' in cmd:
+            echo = lambda l: True
+        else:
+            echo = re.compile('Results and/or logs|ERROR').search
+        self.log.debug('Mock command: %s' % ' '.join(cmd))
+        try:
+            logfile = os.path.join(ReviewDirs.root, 'build.log')
+            rc, self.build_index = build_log.run_logged(cmd, logfile, echo)
+        except (OSError, IOError) as err:
+            self.log.error('Cannot run mock: ' + str(err))
+            rc, self.build_index = 'Cannot run mock', None
+        self._log_index = None
+        Mock.invalidate_rpmdb()
         Mock.builddir_cleanup()
         rc = str(rc)
-        try:
-            with open('build.log') as f:
-                log  = '\n'.join(f.readlines())
-                if 'ERROR' in log:
-                    rc = 'Build error(s)'
-        except:
-            rc = "Can't open logfile"
+        if self.build_index and self.build_index.has(build_log.ERROR):
+            rc = 'Build error(s)'
+        if self.build_index:
+            for name, seconds in self.build_index.get_timings():
+                self.log.debug('Build timing: %s: %.1f s' % (name, seconds))
         if rc == '0':
             self.is_build = True
+            self.from_cache = False
             self.log.info('Build completed')
+            cache = get_build_cache()
+            if cache:
+                cache.store(self._get_build_key(), Mock.resultdir,
+                            os.path.basename(self.filename))
         else:
             self.log.info('Build failed rc = ' + rc)
             self.build_failed = True
             raise FedoraReviewError('Mock build failed.')
-        return rc
+        return SRPMFile.BUILD_OK
+
+    def start_extra_builds(self):
+        """ Start building the srpm in the background using the
+        --extra-mock-configs, if any.
+        """
+        if self._extra_builds or Settings.prebuilt or \
+        not Settings.extra_mock_configs:
+            return
+        configs = [c.strip() for c in Settings.extra_mock_configs.split(',')
+                   if c.strip()]
+        self._extra_builds = MultiBuild(os.path.abspath(self.filename),
+                                        configs, ReviewDirs.root,
+                                        Settings.mock_builds)
+        self._extra_builds.start()
+
+    def get_extra_builds(self):
+        """ Return list of multi_build.ConfigBuild for the
+        --extra-mock-configs, waiting until they are done.
+        """
+        if not self._extra_builds:
+            return []
+        return self._extra_builds.wait()
+
+    def get_build_log_index(self):
+        """ Return a build_log.BuildLogIndex for the rpmbuild log
+        build.log in resultdir, None if there is no such log.
+        """
+        if not self._log_index:
+            path = os.path.join(Mock.resultdir, 'build.log')
+            try:
+                self._log_index = build_log.parse_file(path)
+            except IOError:
+                self.log.debug('Cannot read build log ' + path)
+                return None
+        return self._log_index
 
     def get_build_dir(self):
         """ Return the BUILD directory from the mock environment.
@@ -225,30 +345,41 @@ class SRPMFile(Helpers):
             return rpms
         return filter(lambda s: not exclude_pattern in s, rpms)
 
-    def get_files_rpms(self):
-        """ Generate the list files contained in RPMs generated by the
-        mock build or present using --prebuilt
+    def get_rpm_headers(self):
+        """ Return dict of RpmHeader by basename for all binary rpms
+        generated by the mock build or present using --prebuilt.
         """
-        if self._rpm_files:
-            return self._rpm_files
         if Settings.prebuilt and not hasattr(self, 'prebuilt_info'):
             rpms = self.get_used_rpms()
             hdr = "Using local rpms: "
             sep = '\n' + ' ' * len(hdr)
             self.log.info(hdr + sep.join(rpms))
             self.prebuilt_info = True
+        elif Settings.prebuilt:
+            rpms = self.get_used_rpms()
         else:
             self.build()
             rpms = glob(os.path.join(Mock.resultdir, '*.rpm'))
+        rpms = filter(lambda r: not r.endswith('.src.rpm'), rpms)
+        return self.rpm_index.get_all(rpms)
+
+    def get_files_rpms(self):
+        """ Generate the list files contained in RPMs generated by the
+        mock build or present using --prebuilt
+        """
+        if self._rpm_files:
+            return self._rpm_files
         rpm_files = {}
-        for rpm in rpms:
-            if rpm.endswith('.src.rpm'):
-                continue
-            cmd = 'rpm -qpl %s' % rpm
-            rc = self._run_cmd(cmd)
-            rpm_files[os.path.basename(rpm)] = rc.split('\n')
+        for name, header in self.get_rpm_headers().iteritems():
+            rpm_files[name] = header.files
         self._rpm_files = rpm_files
         return rpm_files
 
+    def get_file_index(self):
+        """ Return a FileIndex for the files in get_files_rpms(). """
+        if not self._file_index:
+            self._file_index = FileIndex(self.get_files_rpms())
+        return self._file_index
+
 
 # vim: set expandtab: ts=4:sw=4:
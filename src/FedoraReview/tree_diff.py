@@ -0,0 +1,151 @@
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+
+'''
+Compare directory trees using checksums, diff only what differs.
+'''
+
+import hashlib
+import os
+import os.path
+import stat
+
+from multiprocessing.pool import ThreadPool
+from subprocess import call
+
+CHUNK_SIZE = 65536
+
+
+def _hash_file(path):
+    ''' Return sha1 hex digest of file contents. '''
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), ''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _is_binary(path):
+    ''' Guess if file is binary, as diff does. '''
+    with open(path, 'rb') as f:
+        return '\0' in f.read(8192)
+
+
+class TreeDiff(object):
+    ''' Compares two directory trees a and b by computing checksums
+    for all files, in jobs threads. Attributes after compare():
+      - only_a, only_b: sorted relative paths only in one tree. If a
+        directory is missing, its contents are not listed.
+      - differ: sorted relative paths of files which differ.
+    '''
+
+    def __init__(self, a, b, jobs=1):
+        self.a = a
+        self.b = b
+        self.jobs = max(1, jobs)
+        self.only_a = []
+        self.only_b = []
+        self.differ = []
+
+    @staticmethod
+    def _scan(top):
+        ''' Return (dict of kind by relative path, list of regular
+        files) for tree at top. Symlinks have kind 'link:<target>'.
+        '''
+        entries = {}
+        files = []
+        for root, dirs, names in os.walk(top):
+            reldir = os.path.relpath(root, top)
+            for name in dirs + names:
+                path = os.path.join(root, name)
+                relpath = os.path.normpath(os.path.join(reldir, name))
+                mode = os.lstat(path).st_mode
+                if stat.S_ISLNK(mode):
+                    entries[relpath] = 'link:' + os.readlink(path)
+                elif stat.S_ISDIR(mode):
+                    entries[relpath] = 'dir'
+                elif stat.S_ISREG(mode):
+                    entries[relpath] = 'file'
+                    files.append(relpath)
+        return entries, files
+
+    def _hash_all(self, paths):
+        ''' Return list of digests for paths, computed in parallel. '''
+        if self.jobs < 2 or len(paths) < 2:
+            return map(_hash_file, paths)
+        pool = ThreadPool(min(self.jobs, len(paths)))
+        try:
+            return pool.map(_hash_file, paths, 16)
+        finally:
+            pool.close()
+            pool.join()
+
+    def compare(self):
+        ''' Compare the trees, return True if they are equal. '''
+        a_entries, a_files = self._scan(self.a)
+        b_entries, b_files = self._scan(self.b)
+
+        def only(entries, other):
+            missing = set([p for p in entries if not p in other])
+            return sorted([p for p in missing
+                           if not os.path.dirname(p) in missing])
+
+        self.only_a = only(a_entries, b_entries)
+        self.only_b = only(b_entries, a_entries)
+        common = [p for p in a_files if b_entries.get(p) == 'file']
+        size_differ = set([p for p in common
+                           if os.path.getsize(os.path.join(self.a, p)) !=
+                               os.path.getsize(os.path.join(self.b, p))])
+        same_size = [p for p in common if not p in size_differ]
+        sums = self._hash_all([os.path.join(self.a, p) for p in same_size] +
+                              [os.path.join(self.b, p) for p in same_size])
+        a_sums, b_sums = sums[:len(same_size)], sums[len(same_size):]
+        differ = size_differ
+        differ.update([p for p, a_sum, b_sum
+                       in zip(same_size, a_sums, b_sums) if a_sum != b_sum])
+        differ.update([p for p in a_entries
+                       if p in b_entries and a_entries[p] != b_entries[p]])
+        self.differ = sorted(differ)
+        return not (self.only_a or self.only_b or self.differ)
+
+    def write(self, stream):
+        ''' Write the differences found by compare() to stream, in the
+        format used by diff -U2 -r. Text diffs are made by diff(1),
+        writing directly to stream.
+        '''
+        for top, paths in [(self.a, self.only_a), (self.b, self.only_b)]:
+            for path in paths:
+                dirpath = os.path.join(top, os.path.dirname(path))
+                stream.write('Only in %s: %s\n' %
+                             (os.path.normpath(dirpath),
+                              os.path.basename(path)))
+        for path in self.differ:
+            a = os.path.join(self.a, path)
+            b = os.path.join(self.b, path)
+            if not (os.path.isfile(a) and os.path.isfile(b)) or \
+            os.path.islink(a) or os.path.islink(b):
+                stream.write('File %s differs from %s\n' % (a, b))
+            elif _is_binary(a) or _is_binary(b):
+                stream.write('Binary files %s and %s differ\n' % (a, b))
+            else:
+                stream.write('diff -U2 %s %s\n' % (a, b))
+                stream.flush()
+                call(['/usr/bin/diff', '-U2', a, b], stdout=stream)
+
+
+# vim: set expandtab: ts=4:sw=4:
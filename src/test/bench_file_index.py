@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+#-*- coding: UTF-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+'''
+Micro-benchmark: has_files() and friends on a synthetic 100k file
+package, plain fnmatch loops vs FileIndex. Usage:
+
+    $ ./bench_file_index.py [nr of files]
+'''
+
+import os
+import sys
+sys.path.insert(0,os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                               '..')))
+
+import fnmatch
+import re
+import time
+
+from FedoraReview.file_index import FileIndex
+
+# Queries as done by the checks' is_applicable() and run().
+PATTERNS = ['*.h', '*.a', '*.so', '*.pc', '*.desktop', '*.jar', '*.pom',
+            '*.la', '*COPYING*', '*LICEN*', '[/usr]/[s]bin/*',
+            '/usr/share/locale/*/LC_MESSAGES/*.mo',
+            '/usr/share/javadoc/texlive/*.html']
+REGEXES = [r'/usr/(lib|lib64)/[\w\-]*\.so\.[0-9]', r'.*\.c(?:pp)',
+           r'^/usr/(share|lib|lib64)/sugar/activities/']
+ROUNDS = 5
+
+
+def make_files(count):
+    ''' Return a texlive-like dict of file lists by rpm. '''
+    exts = ['tex', 'sty', 'pdf', 'afm', 'pfb', 'tfm', 'map', 'enc']
+    files = {}
+    for i in range(count):
+        rpm = 'texlive-pkg%02d-2012-1.fc18.noarch.rpm' % (i % 40)
+        path = '/usr/share/texlive/texmf-dist/%s/dir%d/file%d.%s' % \
+                   (exts[i % 8], i % 97, i, exts[(i / 8) % 8])
+        files.setdefault(rpm, []).append(path)
+    return files
+
+
+def old_has_files(rpm_files, pattern):
+    for rpm in rpm_files:
+        for fn in rpm_files[rpm]:
+            if fnmatch.fnmatch(fn, pattern):
+                return True
+    return False
+
+
+def old_has_files_re(rpm_files, pattern_re):
+    fn_pat = re.compile(pattern_re)
+    for rpm in rpm_files:
+        for fn in rpm_files[rpm]:
+            if fn_pat.search(fn):
+                return True
+    return False
+
+
+def old_get_files_by_pattern(rpm_files, pattern):
+    result = {}
+    for rpm in rpm_files:
+        result[rpm] = []
+        for fn in rpm_files[rpm]:
+            if fnmatch.fnmatch(fn, pattern):
+                result[rpm].append(fn)
+    return result
+
+
+def run_queries(has_files, has_files_re, get_files_by_pattern):
+    start = time.time()
+    for i in range(ROUNDS):
+        for pattern in PATTERNS:
+            has_files(pattern)
+            get_files_by_pattern(pattern)
+        for regex in REGEXES:
+            has_files_re(regex)
+    return time.time() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    files = make_files(count)
+    old = run_queries(lambda p: old_has_files(files, p),
+                      lambda p: old_has_files_re(files, p),
+                      lambda p: old_get_files_by_pattern(files, p))
+    start = time.time()
+    index = FileIndex(files)
+    build = time.time() - start
+    new = run_queries(index.has_files,
+                      index.has_files_re,
+                      index.get_files_by_pattern)
+    print "Files: %d, queries: %d" % \
+        (count, ROUNDS * (2 * len(PATTERNS) + len(REGEXES)))
+    print "fnmatch loops : %7.3f s" % old
+    print "FileIndex     : %7.3f s (+ %.3f s to build index)" % (new, build)
+    print "Speedup       : %7.1f x" % (old / (new + build))
+
+
+if __name__ == '__main__':
+    main()
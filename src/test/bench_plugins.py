@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+#-*- coding: UTF-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+'''
+Micro-benchmark: a JSON plugin emitting a pretty-printed results
+message with thousands of checks and chatty stderr. Compares the old
+decode-after-every-line reader with JSONFramer, then runs the plugin
+for real. Usage:
+
+    $ ./bench_plugins.py [nr of results]
+'''
+
+import os
+import sys
+sys.path.insert(0,os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                               '..')))
+
+import json
+import shutil
+import stat
+import tempfile
+import time
+
+from FedoraReview import Settings
+from FedoraReview import jsonapi
+from FedoraReview.jsonapi import CHUNK_SIZE, JSONAPI, JSONFramer, \
+     JSONPlugin
+
+PLUGIN = '''#!%s
+import json
+import sys
+
+for line in iter(sys.stdin.readline, ''):
+    if line.strip() == '':
+        break
+checks = []
+for i in range(%d):
+    sys.stderr.write('Checking %%d\\n' %% i)
+    checks.append({"name": "CheckBench%%d" %% i, "url": "http://x",
+                   "group": "Generic", "deprecates": [],
+                   "text": "Benchmark check {%%d}" %% i, "type": "SHOULD",
+                   "result": "pass", "output_extra": '"%%d"' %% i})
+print json.dumps({"supported_api": 1, "command": "results",
+                  "checks": checks}, indent=4)
+'''
+
+
+class _FakeSetup(JSONAPI):
+
+    def __init__(self, spec, srpm, sources):
+        self.pkgname = 'bench'
+
+
+class _FakeBase(object):
+    spec = None
+    srpm = None
+    sources = None
+
+
+def make_output(count):
+    ''' Return the stdout of the plugin for count results. '''
+    checks = [{"name": "CheckBench%d" % i, "url": "http://x",
+               "group": "Generic", "deprecates": [],
+               "text": "Benchmark check {%d}" % i, "type": "SHOULD",
+               "result": "pass", "output_extra": '"%d"' % i}
+              for i in range(count)]
+    return json.dumps({"supported_api": 1, "command": "results",
+                       "checks": checks}, indent=4) + '\n'
+
+
+def old_read(output):
+    ''' The pre-JSONFramer reader: decode all lines after each line. '''
+    decoder = json.JSONDecoder()
+    objs = []
+    data = ''
+    for line in output.split('\n'):
+        data += line + '\n'
+        try:
+            objs.append(decoder.decode(data))
+            data = ''
+        except ValueError:
+            pass
+    return objs
+
+
+def new_read(output):
+    decoder = json.JSONDecoder()
+    framer = JSONFramer()
+    objs = []
+    for i in range(0, len(output), CHUNK_SIZE):
+        for text in framer.feed(output[i:i + CHUNK_SIZE]):
+            objs.append(decoder.decode(text))
+    return objs
+
+
+def run_plugin(count):
+    ''' Run the benchmark plugin, return (time, nr of results). '''
+    tmpdir = tempfile.mkdtemp()
+    path = os.path.join(tmpdir, 'bench')
+    with open(path, 'w') as f:
+        f.write(PLUGIN % (sys.executable, count))
+    os.chmod(path, stat.S_IRWXU)
+    jsonapi.SetupPlugin = _FakeSetup
+    sys.argv = ['fedora-review', '-n', 'bench', '--prebuilt']
+    Settings.init(True)
+    Settings.get_logger().setLevel(100)
+    try:
+        start = time.time()
+        plugin = JSONPlugin(_FakeBase(), path)
+        plugin.run()
+        return time.time() - start, len(plugin.get_results())
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    output = make_output(count)
+    start = time.time()
+    old = old_read(output)
+    old_time = time.time() - start
+    start = time.time()
+    new = new_read(output)
+    new_time = time.time() - start
+    assert old == new
+    plugin_time, results = run_plugin(count)
+    print "Results: %d, output: %d bytes, %d lines" % \
+        (count, len(output), output.count('\n'))
+    print "Decode per line : %7.3f s" % old_time
+    print "JSONFramer      : %7.3f s" % new_time
+    print "Speedup         : %7.1f x" % (old_time / new_time)
+    print "Plugin run      : %7.3f s, %d results" % (plugin_time, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -38,6 +38,23 @@ from test_R_checks import TestRChecks
 from test_options  import TestOptions
 from test_util     import TestUtil
 from test_ext      import TestExt
+from test_scheduler import TestScheduler
+from test_file_index import TestFileIndex
+from test_download_cache import TestDownloadCache, TestDownloadManager, \
+     TestDownloader
+from test_archive import TestArchive
+from test_tree_diff import TestTreeDiff
+from test_chroot_pool import TestChrootPool
+from test_chroot_rpmdb import TestChrootRpmDb
+from test_mock_shell import TestMockShell
+from test_build_cache import TestBuildCache
+from test_build_log import TestBuildLog
+from test_multi_build import TestMultiBuild
+from test_batch import TestBatch
+from test_serve import TestServe
+from test_remote import TestRemote
+from test_result_cache import TestResultCache
+from test_plugins import TestPlugins
 
 from test_env      import no_net
 
@@ -50,6 +67,10 @@ if not 'REVIEW_LOGLEVEL' in os.environ:
 
 Mock.init()
 
-for t in 'Misc', 'Bugzilla', 'Checks', 'RChecks', 'Options', 'Util', 'Ext':
+for t in ('Misc', 'Bugzilla', 'Checks', 'RChecks', 'Options', 'Util', 'Ext',
+          'Scheduler', 'FileIndex', 'DownloadCache', 'DownloadManager',
+          'Downloader', 'Archive', 'TreeDiff', 'ChrootPool', 'ChrootRpmDb',
+          'MockShell', 'BuildCache', 'BuildLog', 'MultiBuild', 'Batch',
+          'Serve', 'Remote', 'ResultCache', 'Plugins'):
    test = eval( 'unittest.TestLoader().loadTestsFromTestCase(Test%s)' % t)
    unittest.TextTestRunner(verbosity=VERBOSITY).run(test)
@@ -0,0 +1,159 @@
+#!/usr/bin/python -tt
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+'''
+Unit tests for in-process archive handling
+'''
+
+import os
+import sys
+sys.path.insert(0,os.path.abspath('../'))
+
+import gzip
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+from StringIO import StringIO
+
+from FedoraReview import Settings
+from FedoraReview.archive import Archive, ArchiveError, lzma
+
+FILES = {'foo-1.0/README': 'readme\n',
+         'foo-1.0/src/foo.c': 'int main() { return 0; }\n',
+         'foo-1.0/COPYING': 'GPL\n'}
+
+
+class TestArchive(unittest.TestCase):
+
+    def setUp(self):
+        sys.argv = ['fedora-review','-n','python-test','--prebuilt']
+        Settings.init(True)
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def make_tar(self, name, mode, extra=None):
+        path = os.path.join(self.tmpdir, name)
+        tar = tarfile.open(path, mode)
+        members = dict(FILES)
+        members.update(extra if extra else {})
+        for member, data in sorted(members.iteritems()):
+            info = tarfile.TarInfo(member)
+            info.size = len(data)
+            tar.addfile(info, StringIO(data))
+        tar.close()
+        return path
+
+    def check_archive(self, path):
+        archive = Archive(path)
+        self.assertEqual(sorted(archive.list()), sorted(FILES.keys()))
+        extract_dir = os.path.join(self.tmpdir, 'extract')
+        os.mkdir(extract_dir)
+        archive.extract(extract_dir)
+        for member, data in FILES.iteritems():
+            with open(os.path.join(extract_dir, member)) as f:
+                self.assertEqual(f.read(), data)
+
+    def test_tar(self):
+        ''' Compressed tar files are listed and extracted. '''
+        for name, mode in [('foo-1.0.tar.gz', 'w:gz'),
+                           ('foo-1.0.tar.bz2', 'w:bz2'),
+                           ('foo-1.0.tar', 'w')]:
+            self.check_archive(self.make_tar(name, mode))
+            shutil.rmtree(os.path.join(self.tmpdir, 'extract'))
+
+    @unittest.skipIf(not lzma, 'No lzma module available')
+    def test_xz(self):
+        ''' xz compressed tar file is listed and extracted. '''
+        tar = self.make_tar('foo-1.0.tar', 'w')
+        with open(tar, 'rb') as src:
+            with lzma.LZMAFile(tar + '.xz', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+        self.check_archive(tar + '.xz')
+
+    def test_zip(self):
+        ''' Zip file is listed and extracted. '''
+        path = os.path.join(self.tmpdir, 'foo-1.0.zip')
+        with zipfile.ZipFile(path, 'w') as zip:
+            for member, data in FILES.iteritems():
+                zip.writestr(member, data)
+        self.check_archive(path)
+
+    def test_compressed(self):
+        ''' Single compressed file is uncompressed. '''
+        path = os.path.join(self.tmpdir, 'foo.txt.gz')
+        with gzip.open(path, 'wb') as f:
+            f.write('foo\n')
+        archive = Archive(path)
+        self.assertEqual(archive.list(), ['foo.txt'])
+        archive.extract(self.tmpdir)
+        with open(os.path.join(self.tmpdir, 'foo.txt')) as f:
+            self.assertEqual(f.read(), 'foo\n')
+
+    def test_unsafe(self):
+        ''' Members outside the extract dir are skipped. '''
+        path = self.make_tar('foo-1.0.tar.gz', 'w:gz',
+                             {'../evil': 'evil\n', '/tmp/evil': 'evil\n'})
+        self.check_archive(path)
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, 'evil')))
+
+    def test_symlinks(self):
+        ''' Symlinks leading outside the extract dir are skipped. '''
+        outside = os.path.join(self.tmpdir, 'outside')
+        os.mkdir(outside)
+        path = os.path.join(self.tmpdir, 'links.tar')
+        tar = tarfile.open(path, 'w')
+        for name, target in [('evil', outside), ('up', '../outside'),
+                             ('foo-1.0/lib.so', 'lib.so.1')]:
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.SYMTYPE
+            info.linkname = target
+            tar.addfile(info)
+        for name in ['evil/passwd', 'up/passwd']:
+            info = tarfile.TarInfo(name)
+            info.size = 5
+            tar.addfile(info, StringIO('evil\n'))
+        tar.close()
+        extract_dir = os.path.join(self.tmpdir, 'extract')
+        os.mkdir(extract_dir)
+        Archive(path).extract(extract_dir)
+        self.assertEqual(os.listdir(outside), [])
+        for name in ['evil', 'up']:
+            self.assertFalse(os.path.islink(os.path.join(extract_dir, name)))
+        self.assertEqual(os.readlink(os.path.join(extract_dir, 'foo-1.0',
+                                                  'lib.so')), 'lib.so.1')
+
+    def test_errors(self):
+        ''' Broken and unknown archives. '''
+        path = os.path.join(self.tmpdir, 'foo-1.0.tar.gz')
+        with open(path, 'w') as f:
+            f.write('not a gzip file')
+        self.assertRaises(ArchiveError, Archive(path).list)
+        self.assertRaises(ArchiveError, Archive(path).extract, self.tmpdir)
+        self.assertFalse(Archive.is_supported('foo-1.0.7z'))
+        self.assertTrue(Archive.is_supported('foo-1.0.tgz'))
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim: set expandtab: ts=4:sw=4:
@@ -0,0 +1,87 @@
+#!/usr/bin/python -tt
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+'''
+Unit tests for batch reviews.
+'''
+
+import os
+import sys
+sys.path.insert(0,os.path.abspath('../'))
+
+import json
+import shutil
+import tempfile
+import unittest
+
+from FedoraReview import ReviewDirs, Settings
+from FedoraReview.batch import BatchReview, SUMMARY, parse_item
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        sys.argv = ['fedora-review','-n','python-test','--prebuilt']
+        Settings.init(True)
+        self.startdir = ReviewDirs.startdir
+        self.tmpdir = tempfile.mkdtemp()
+        ReviewDirs.startdir = self.tmpdir
+
+    def tearDown(self):
+        ReviewDirs.startdir = self.startdir
+        os.chdir(self.startdir)
+        shutil.rmtree(self.tmpdir)
+
+    def test_parse(self):
+        ''' Bugs, urls and names are recognized. '''
+        self.assertEqual(parse_item('817268\n'),
+                         {'mode': 'bug', 'value': '817268'})
+        self.assertEqual(parse_item('http://bugzilla.example.com/1'),
+                         {'mode': 'url',
+                          'value': 'http://bugzilla.example.com/1'})
+        self.assertEqual(parse_item('python-test'),
+                         {'mode': 'name', 'value': 'python-test'})
+        self.assertEqual(parse_item('name: 1234'),
+                         {'mode': 'name', 'value': '1234'})
+        self.assertEqual(parse_item('  # comment'), None)
+        self.assertEqual(parse_item(''), None)
+
+    def test_run(self):
+        ''' All items are processed in workers, summary is written. '''
+        path = os.path.join(self.tmpdir, 'items')
+        with open(path, 'w') as f:
+            f.write('# Nothing to find here\nno-such-package\n'
+                    'name:other-package\n\n')
+        batch = BatchReview.from_file(path)
+        self.assertEqual(len(batch.items), 2)
+        self.assertEqual(batch.run(), 1)
+        with open(os.path.join(self.tmpdir, SUMMARY)) as f:
+            results = json.load(f)
+        self.assertEqual([r['value'] for r in results],
+                         ['no-such-package', 'other-package'])
+        for result in results:
+            self.assertNotEqual(result['rc'], 0)
+            self.assertEqual(result['report'], None)
+            self.assertTrue(result['worker'] > 0)
+        self.assertEqual(os.getcwd(), os.path.realpath(self.startdir))
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim: set expandtab: ts=4:sw=4:
@@ -0,0 +1,154 @@
+#!/usr/bin/python -tt
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+'''
+Unit tests for the build results cache.
+'''
+
+import os
+import sys
+sys.path.insert(0,os.path.abspath('../'))
+
+import shutil
+import tempfile
+import unittest
+
+from glob import glob
+
+from FedoraReview import Mock, Settings, SRPMFile
+from FedoraReview.build_cache import BuildCache, get_build_key, \
+     relevant_options
+
+
+class _Spec(object):
+    name = 'python-test'
+
+
+class _FakeSrpm(SRPMFile):
+    ''' Records mock builds instead of running them. '''
+
+    def unpack(self, src=None):
+        self.builds = 0
+
+    def restore_build(self):
+        return False
+
+    def mockbuild(self, force=False):
+        self.builds += 1
+        self.is_build = True
+        return SRPMFile.BUILD_OK
+
+
+class TestBuildCache(unittest.TestCase):
+
+    def setUp(self):
+        sys.argv = ['fedora-review','-n','python-test','--prebuilt']
+        Settings.init(True)
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmpdir, 'cache')
+        self.resultdir = os.path.join(self.tmpdir, 'results')
+        os.mkdir(self.resultdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, path, data):
+        with open(path, 'w') as f:
+            f.write(data)
+        return path
+
+    def make_results(self, nvr, size=10):
+        for path in glob(os.path.join(self.resultdir, '*')):
+            os.unlink(path)
+        for name in [nvr + '.src.rpm', nvr + '.noarch.rpm', 'build.log']:
+            self.write(os.path.join(self.resultdir, name), 'x' * size)
+
+    def get_results(self):
+        return sorted(map(os.path.basename,
+                          glob(os.path.join(self.resultdir, '*'))))
+
+    def test_nobuild(self):
+        ''' --no-build only skips the build if there are rpms. '''
+        Settings.prebuilt = False
+        Settings.nobuild = True
+        try:
+            Mock.have_cache_for = lambda name: False
+            srpm = _FakeSrpm('python-test-1.0-1.fc16.src.rpm', _Spec())
+            self.assertEqual(srpm.build(), SRPMFile.BUILD_OK)
+            self.assertEqual(srpm.builds, 1)
+            Mock.have_cache_for = lambda name: True
+            srpm = _FakeSrpm('python-test-1.0-1.fc16.src.rpm', _Spec())
+            self.assertEqual(srpm.build(), SRPMFile.BUILD_OK)
+            self.assertEqual(srpm.builds, 0)
+            self.assertTrue(srpm.is_build)
+        finally:
+            del Mock.have_cache_for
+            Settings.prebuilt = True
+            Settings.nobuild = False
+
+    def test_key(self):
+        ''' Keys depend on srpm contents, config and relevant options. '''
+        srpm = self.write(os.path.join(self.tmpdir, 'foo.src.rpm'), 'foo')
+        key = get_build_key(srpm, 'fedora-18-i386', '--no-cleanup-after')
+        self.assertEqual(key, get_build_key(srpm, 'fedora-18-i386',
+                         '--resultdir /tmp/x --uniqueext=review0 -q'))
+        self.assertNotEqual(key, get_build_key(srpm, 'fedora-17-i386',
+                                               None))
+        self.assertNotEqual(key, get_build_key(srpm, 'fedora-18-i386',
+                                               '--with=tests'))
+        self.write(srpm, 'bar')
+        self.assertNotEqual(key, get_build_key(srpm, 'fedora-18-i386',
+                                               None))
+        self.assertEqual(relevant_options(
+                             '--resultdir /tmp -q --define "foo bar"'),
+                         ['--define', 'foo bar'])
+
+    def test_store_restore(self):
+        ''' Stored results replace stale rpms when restored. '''
+        cache = BuildCache(self.cache_dir, 1000)
+        self.assertEqual(cache.restore('key1', self.resultdir), None)
+        self.make_results('foo-1.0-1')
+        cache.store('key1', self.resultdir, 'foo-1.0-1.src.rpm')
+        self.make_results('foo-0.9-1')
+        restored = cache.restore('key1', self.resultdir)
+        self.assertEqual(len(restored), 3)
+        self.assertEqual(self.get_results(),
+                         ['build.log', 'foo-1.0-1.noarch.rpm',
+                          'foo-1.0-1.src.rpm'])
+        cache = BuildCache(self.cache_dir, 1000)
+        self.assertTrue(cache.restore('key1', self.resultdir))
+
+    def test_evict(self):
+        ''' Least recently used entries are removed. '''
+        cache = BuildCache(self.cache_dir, 70)
+        for key in ['key1', 'key2']:
+            self.make_results(key)
+            cache.store(key, self.resultdir, key)
+        self.assertTrue(cache.restore('key1', self.resultdir))
+        self.make_results('key3')
+        cache.store('key3', self.resultdir, 'key3')
+        self.assertTrue(cache.restore('key1', self.resultdir))
+        self.assertEqual(cache.restore('key2', self.resultdir), None)
+        self.assertFalse(os.path.exists(
+            os.path.join(self.cache_dir, 'entries', 'key2')))
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim: set expandtab: ts=4:sw=4:
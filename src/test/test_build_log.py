@@ -0,0 +1,99 @@
+#!/usr/bin/python -tt
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+'''
+Unit tests for the streaming build log analyzer.
+'''
+
+import os
+import sys
+sys.path.insert(0,os.path.abspath('../'))
+
+import shutil
+import tempfile
+import unittest
+
+from FedoraReview import Settings
+from FedoraReview import build_log
+
+LOG = '''Executing(%prep): /bin/sh -e /var/tmp/rpm-tmp.Ab3
++ cd /builddir/build/BUILD
+Executing(%build): /bin/sh -e /var/tmp/rpm-tmp.Xy1
++ gcc -O2 -g -pipe -Wall -fstack-protector -c foo.c -o foo.o
+gcc -O2 -g -fPIC -shared -o libfoo.so foo.o
+make: Nothing to be done for `all'.
+Processing files: foo-1.0-1.fc18.x86_64
+warning: File listed twice: /usr/share/doc/foo-1.0/README
+warning: File listed twice: /usr/bin/foo
+error: Installed (but unpackaged) file(s) found:
+'''
+
+
+class TestBuildLog(unittest.TestCase):
+
+    def setUp(self):
+        sys.argv = ['fedora-review','-n','python-test','--prebuilt']
+        Settings.init(True)
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_parse_file(self):
+        ''' Events are found in a rpmbuild log. '''
+        path = os.path.join(self.tmpdir, 'build.log')
+        with open(path, 'w') as f:
+            f.write(LOG)
+        index = build_log.parse_file(path)
+        self.assertEqual(index.lines, 10)
+        self.assertEqual(index.get_duplicate_files(),
+                         ['/usr/share/doc/foo-1.0/README', '/usr/bin/foo'])
+        self.assertEqual(index.get(build_log.DUPLICATE_FILE)[0].lineno, 8)
+        self.assertEqual(index.get_compiler_flags(),
+                         set(['-O2', '-g', '-pipe', '-Wall', '-c', '-o',
+                              '-fstack-protector', '-fPIC', '-shared']))
+        self.assertEqual(len(index.get(build_log.RPM_ERROR)), 1)
+        self.assertFalse(index.has(build_log.ERROR))
+        self.assertEqual(index.get_timings(), [])
+
+    def test_run_logged(self):
+        ''' Command output is logged, analyzed and filtered live. '''
+        script = 'echo "Start: build phase"; sleep 0.3; ' \
+                 'echo "ERROR: Exception(foo.src.rpm)"; ' \
+                 'echo "Finish: build phase"; ' \
+                 'echo "Results and/or logs in: /tmp/results"; exit 3'
+        logfile = os.path.join(self.tmpdir, 'build.log')
+        echoed = []
+        rc, index = build_log.run_logged(['/bin/sh', '-c', script],
+                                         logfile, echoed.append)
+        self.assertEqual(rc, 3)
+        self.assertEqual(len(echoed), 4)
+        with open(logfile) as f:
+            self.assertEqual(f.read(), ''.join(echoed))
+        self.assertEqual([e.lineno for e in index.get(build_log.ERROR)],
+                         [2])
+        timings = index.get_timings()
+        self.assertEqual(len(timings), 1)
+        self.assertEqual(timings[0][0], 'build phase')
+        self.assertTrue(timings[0][1] >= 0.3)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim: set expandtab: ts=4:sw=4:
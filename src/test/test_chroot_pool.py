@@ -0,0 +1,116 @@
+#!/usr/bin/python -tt
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+'''
+Unit tests for the warm mock root pool, using a fake mock script.
+'''
+
+import os
+import sys
+sys.path.insert(0,os.path.abspath('../'))
+
+import json
+import shutil
+import tempfile
+import unittest
+
+from FedoraReview import Settings
+from FedoraReview.chroot_pool import ChrootPool
+
+FAKE_MOCK = os.path.abspath('fake-mock/mock')
+
+
+class TestChrootPool(unittest.TestCase):
+
+    def setUp(self):
+        sys.argv = ['fedora-review','-n','python-test','--prebuilt']
+        Settings.init(True)
+        self.tmpdir = tempfile.mkdtemp()
+        self.state_file = os.path.join(self.tmpdir, 'pool.json')
+        os.environ['FAKE_MOCK_STATE'] = self.tmpdir
+        os.environ['FAKE_MOCK_LOG'] = os.path.join(self.tmpdir, 'log')
+        os.environ['FAKE_MOCK_INIT_TIME'] = '0.5'
+
+    def tearDown(self):
+        for key in ['FAKE_MOCK_STATE', 'FAKE_MOCK_LOG',
+                    'FAKE_MOCK_INIT_TIME', 'FAKE_MOCK_NO_SNAPSHOT']:
+            if key in os.environ:
+                del os.environ[key]
+        shutil.rmtree(self.tmpdir)
+
+    def get_pool(self, size):
+        return ChrootPool('fedora-rawhide-x86_64', size,
+                          self.state_file, FAKE_MOCK)
+
+    def get_commands(self):
+        with open(os.environ['FAKE_MOCK_LOG']) as f:
+            return [l.split()[3:] for l in f.readlines()]
+
+    def test_reuse(self):
+        ''' Root is created once, then restored. '''
+        pool = self.get_pool(1)
+        ext = pool.acquire()
+        self.assertEqual(ext, 'review0')
+        self.assertEqual(pool.acquire(), None)
+        pool.release(ext)
+        self.assertEqual(pool.acquire(), 'review0')
+        self.assertEqual(self.get_commands(),
+                         [['--init'],
+                          ['--snapshot', ChrootPool.SNAPSHOT],
+                          ['--rollback-to', ChrootPool.SNAPSHOT]])
+        with open(self.state_file) as f:
+            root = json.load(f)['fedora-rawhide-x86_64']['review0']
+        self.assertTrue(root['init_time'] >= 0.5)
+        self.assertTrue(root['saved'] > 0.0)
+
+    def test_size(self):
+        ''' New roots are created while all others are busy. '''
+        pool = self.get_pool(2)
+        os.environ['FAKE_MOCK_INIT_TIME'] = '0'
+        self.assertEqual(pool.acquire(), 'review0')
+        self.assertEqual(pool.acquire(), 'review1')
+        self.assertEqual(pool.acquire(), None)
+
+    def test_names(self):
+        ''' New roots don't reuse names of existing ones. '''
+        pool = self.get_pool(3)
+        os.environ['FAKE_MOCK_INIT_TIME'] = '0'
+        self.assertEqual(pool.acquire(), 'review0')
+        self.assertEqual(pool.acquire(), 'review1')
+        # As after a failed restore of review0.
+        with open(self.state_file) as f:
+            state = json.load(f)
+        del state['fedora-rawhide-x86_64']['review0']
+        with open(self.state_file, 'w') as f:
+            json.dump(state, f)
+        self.assertEqual(pool.acquire(), 'review0')
+        self.assertEqual(pool.acquire(), 'review2')
+
+    def test_no_snapshot(self):
+        ''' Pool is not used without snapshot support. '''
+        os.environ['FAKE_MOCK_NO_SNAPSHOT'] = '1'
+        pool = self.get_pool(1)
+        self.assertEqual(pool.acquire(), None)
+        with open(self.state_file) as f:
+            self.assertEqual(json.load(f)['fedora-rawhide-x86_64'], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim: set expandtab: ts=4:sw=4:
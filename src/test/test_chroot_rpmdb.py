@@ -0,0 +1,92 @@
+#!/usr/bin/python -tt
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+'''
+Unit tests for the cached chroot rpmdb query, using a fake rpm script.
+'''
+
+import os
+import sys
+sys.path.insert(0,os.path.abspath('../'))
+
+import shutil
+import tempfile
+import unittest
+
+from FedoraReview import Settings
+from FedoraReview.chroot_rpmdb import ChrootRpmDb
+
+FAKE_RPM = os.path.abspath('fake-mock/rpm')
+
+
+class TestChrootRpmDb(unittest.TestCase):
+
+    def setUp(self):
+        sys.argv = ['fedora-review','-n','python-test','--prebuilt']
+        Settings.init(True)
+        self.tmpdir = tempfile.mkdtemp()
+        self.set_packages(['bash 0:4.2.37-2.fc18',
+                           'rpmlint 0:1.4-11.fc18',
+                           'python 1:2.7.3-13.fc18'])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def set_packages(self, lines):
+        with open(os.path.join(self.tmpdir, 'packages'), 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def count_queries(self):
+        try:
+            with open(os.path.join(self.tmpdir, 'queries')) as f:
+                return len(f.readlines())
+        except IOError:
+            return 0
+
+    def test_query(self):
+        ''' Many names are resolved using one rpm invocation. '''
+        rpmdb = ChrootRpmDb(self.tmpdir, FAKE_RPM)
+        self.assertEqual(rpmdb.query(['python', 'rpmlint', 'foo']),
+                         {'python': '1:2.7.3-13.fc18',
+                          'rpmlint': '0:1.4-11.fc18'})
+        self.assertEqual(rpmdb.query(['bash']), {'bash': '0:4.2.37-2.fc18'})
+        self.assertEqual(rpmdb.query([]), {})
+        self.assertEqual(self.count_queries(), 1)
+
+    def test_invalidate(self):
+        ''' Changes are seen only after invalidate(). '''
+        rpmdb = ChrootRpmDb(self.tmpdir, FAKE_RPM)
+        self.assertEqual(rpmdb.query(['foo']), {})
+        self.set_packages(['foo 0:1.0-1.fc18'])
+        self.assertEqual(rpmdb.query(['foo']), {})
+        rpmdb.invalidate()
+        self.assertEqual(rpmdb.query(['foo']), {'foo': '0:1.0-1.fc18'})
+        self.assertEqual(self.count_queries(), 2)
+
+    def test_errors(self):
+        ''' Missing rpm command or database: nothing installed. '''
+        os.unlink(os.path.join(self.tmpdir, 'packages'))
+        self.assertEqual(ChrootRpmDb(self.tmpdir, FAKE_RPM).get_all(), {})
+        rpmdb = ChrootRpmDb(self.tmpdir, '/nonexisting/rpm')
+        self.assertEqual(rpmdb.query(['bash']), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim: set expandtab: ts=4:sw=4:
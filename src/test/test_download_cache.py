@@ -0,0 +1,277 @@
+#!/usr/bin/python -tt
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+'''
+Unit tests for the download cache and manager, using a local http
+server.
+'''
+
+import os
+import sys
+sys.path.insert(0,os.path.abspath('../'))
+
+import fcntl
+import hashlib
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import urllib2
+
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+from FedoraReview import Settings
+from FedoraReview import downloader
+from FedoraReview.download_cache import DownloadCache
+from FedoraReview.download_manager import Download, _DownloadManager
+
+
+class _Handler(BaseHTTPRequestHandler):
+    ''' Serves server.files, a dict of (body, etag) by path. Supports
+    ranges, and closes the connection after server.drop_after bytes
+    if set.
+    '''
+
+    def do_GET(self):
+        time.sleep(self.server.delay)
+        if not self.path in self.server.files:
+            self.send_error(404)
+            return
+        body, etag = self.server.files[self.path]
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.server.downloads += 1
+        offset = 0
+        if self.headers.get('Range') and \
+        self.headers.get('If-Range') == etag:
+            offset = int(self.headers['Range'][6:-1])
+            self.server.ranges.append(offset)
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' %
+                             (offset, len(body) - 1, len(body)))
+        else:
+            self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body) - offset))
+        self.end_headers()
+        if self.server.drop_after:
+            self.wfile.write(body[offset:offset + self.server.drop_after])
+            self.server.drop_after = None
+            return
+        self.wfile.write(body[offset:])
+
+    def log_message(self, *args):
+        pass
+
+
+class _ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _HTTPTestCase(unittest.TestCase):
+    ''' Runs a http server serving some files. '''
+
+    def setUp(self):
+        sys.argv = ['fedora-review','-n','python-test','--prebuilt']
+        Settings.init(True)
+        self.server = _ThreadedHTTPServer(('127.0.0.1', 0), _Handler)
+        self.server.delay = 0
+        self.server.drop_after = None
+        self.server.ranges = []
+        self.server.files = {'/foo-1.0.tar.gz': ('foo' * 1000, '"v1"'),
+                             '/bar-1.0.tar.gz': ('bar' * 1000, '"v1"')}
+        self.server.downloads = 0
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = 'http://127.0.0.1:%d/' % self.server.server_port
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmpdir)
+
+
+class TestDownloadCache(_HTTPTestCase):
+
+    def setUp(self):
+        _HTTPTestCase.setUp(self)
+        self.cache = DownloadCache(os.path.join(self.tmpdir, 'cache'),
+                                   1024 * 1024)
+
+    def retrieve(self, name, **kwargs):
+        path = os.path.join(self.tmpdir, name)
+        digests = self.cache.retrieve(self.url + name, path, **kwargs)
+        with open(path) as f:
+            return f.read(), digests
+
+    def test_revalidate(self):
+        ''' Unmodified files are downloaded once. '''
+        body, digests = self.retrieve('foo-1.0.tar.gz')
+        self.assertEqual(body, 'foo' * 1000)
+        self.assertEqual(digests['sha256'],
+                         hashlib.sha256('foo' * 1000).hexdigest())
+        body, digests = self.retrieve('foo-1.0.tar.gz')
+        self.assertEqual(body, 'foo' * 1000)
+        self.assertEqual(self.server.downloads, 1)
+        self.server.files['/foo-1.0.tar.gz'] = ('foo2' * 1000, '"v2"')
+        body, digests = self.retrieve('foo-1.0.tar.gz')
+        self.assertEqual(body, 'foo2' * 1000)
+        self.assertEqual(self.server.downloads, 2)
+        body, digests = self.retrieve('foo-1.0.tar.gz', revalidate=False)
+        self.assertEqual(body, 'foo2' * 1000)
+        self.assertEqual(self.server.downloads, 2)
+
+    def test_checksum(self):
+        ''' Known content is used without any request. '''
+        self.retrieve('foo-1.0.tar.gz')
+        self.server.files = {}
+        checksum = hashlib.sha256('foo' * 1000).hexdigest()
+        body, digests = self.retrieve('foo-1.1.tar.gz', checksum=checksum)
+        self.assertEqual(body, 'foo' * 1000)
+
+    def test_offline(self):
+        ''' Cached copy is used if server is unavailable, but not
+        if the file is removed.
+        '''
+        self.retrieve('foo-1.0.tar.gz')
+        self.retrieve('bar-1.0.tar.gz')
+        del self.server.files['/bar-1.0.tar.gz']
+        self.assertRaises(urllib2.HTTPError,
+                          self.retrieve, 'bar-1.0.tar.gz')
+        self.server.shutdown()
+        self.server.server_close()
+        body, digests = self.retrieve('foo-1.0.tar.gz')
+        self.assertEqual(body, 'foo' * 1000)
+
+    def test_evict(self):
+        ''' Least recently used files are removed. '''
+        self.cache.max_size = 5000
+        self.retrieve('foo-1.0.tar.gz')
+        self.retrieve('bar-1.0.tar.gz')
+        objects = os.listdir(self.cache.objects_dir)
+        self.assertEqual(objects,
+                         [hashlib.sha256('bar' * 1000).hexdigest()])
+        self.retrieve('bar-1.0.tar.gz')
+        self.assertEqual(self.server.downloads, 2)
+        self.retrieve('foo-1.0.tar.gz')
+        self.assertEqual(self.server.downloads, 3)
+
+    def test_same_url(self):
+        ''' Downloads of the same url wait for each other. '''
+        url = self.url + 'foo-1.0.tar.gz'
+        path = os.path.join(self.cache.partial_dir,
+                            hashlib.sha1(url).hexdigest())
+        results = []
+        with open(path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            thread = threading.Thread(
+                target=lambda: results.append(self.retrieve(
+                    'foo-1.0.tar.gz')[0]))
+            thread.start()
+            time.sleep(0.3)
+            self.assertEqual(results, [])
+        thread.join()
+        self.assertEqual(results, ['foo' * 1000])
+
+
+class TestDownloader(_HTTPTestCase):
+
+    def retrieve(self, name):
+        path = os.path.join(self.tmpdir, name)
+        info, digests = downloader.retrieve(self.url + name, path,
+                                            ['md5', 'sha256'])
+        with open(path) as f:
+            return f.read(), digests
+
+    def test_checksums(self):
+        ''' Digests are computed while downloading. '''
+        body, digests = self.retrieve('foo-1.0.tar.gz')
+        self.assertEqual(body, 'foo' * 1000)
+        self.assertEqual(digests,
+                         {'md5': hashlib.md5(body).hexdigest(),
+                          'sha256': hashlib.sha256(body).hexdigest()})
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir,
+                                                     'foo-1.0.tar.gz.part')))
+
+    def test_resume(self):
+        ''' Dropped connection is resumed using a range request. '''
+        self.server.drop_after = 1000
+        body, digests = self.retrieve('foo-1.0.tar.gz')
+        self.assertEqual(body, 'foo' * 1000)
+        self.assertEqual(digests['sha256'],
+                         hashlib.sha256(body).hexdigest())
+        self.assertEqual(self.server.ranges, [1000])
+
+    def test_stale_part(self):
+        ''' Partial file from another version is not resumed. '''
+        part = os.path.join(self.tmpdir, 'foo-1.0.tar.gz.part')
+        with open(part, 'w') as f:
+            f.write('old' * 100)
+        with open(part + '.validator', 'w') as f:
+            f.write('"v0"')
+        body, digests = self.retrieve('foo-1.0.tar.gz')
+        self.assertEqual(body, 'foo' * 1000)
+        self.assertEqual(self.server.ranges, [])
+
+
+class TestDownloadManager(_HTTPTestCase):
+
+    def setUp(self):
+        _HTTPTestCase.setUp(self)
+        sys.argv = ['fedora-review','-n','python-test','--prebuilt',
+                    '--cache-size', '0', '--downloads', '2']
+        Settings.init(True)
+        self.manager = _DownloadManager()
+
+    def submit(self, name):
+        return self.manager.submit(self.url + name,
+                                   os.path.join(self.tmpdir, name),
+                                   name)
+
+    def test_parallel(self):
+        ''' Downloads are run concurrently, at most --downloads. '''
+        self.server.delay = 0.5
+        start = time.time()
+        downloads = [self.submit(n) for n in ['foo-1.0.tar.gz',
+                                              'bar-1.0.tar.gz',
+                                              'foo-1.0.tar.gz',
+                                              'nosuch-1.0.tar.gz']]
+        self.assertEqual(downloads[0], downloads[2])
+        self.assertEqual(downloads[0].wait(),
+                         os.path.join(self.tmpdir, 'foo-1.0.tar.gz'))
+        downloads[1].wait()
+        self.assertRaises(Exception, downloads[3].wait)
+        elapsed = time.time() - start
+        self.assertTrue(1.0 <= elapsed < 1.5)
+        self.assertEqual([d.state for d in downloads],
+                         [Download.DONE, Download.DONE, Download.DONE,
+                          Download.FAILED])
+        self.assertEqual(downloads[1].size, 3000)
+        self.assertTrue(downloads[1].elapsed >= 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim: set expandtab: ts=4:sw=4:
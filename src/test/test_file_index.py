@@ -0,0 +1,110 @@
+#!/usr/bin/python -tt
+#-*- coding: UTF-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+'''
+Unit tests for the FileIndex class
+'''
+
+import os
+import sys
+sys.path.insert(0,os.path.abspath('../'))
+
+import fnmatch
+import re
+import unittest
+
+from FedoraReview.file_index import FileIndex
+
+FILES = {
+    'foo-1.0-1.fc16.x86_64.rpm': [
+        '/etc/foo.d/foo',
+        '/usr/bin/foo',
+        '/usr/lib64/libfoo.so.1',
+        '/usr/lib64/libfoo.so.1.0.0',
+        '/usr/share/doc/foo-1.0/COPYING',
+        '/usr/share/locale/de/LC_MESSAGES/foo.mo',
+        '/usr/share/applications/foo.desktop'],
+    'foo-devel-1.0-1.fc16.x86_64.rpm': [
+        '/usr/include/foo.h',
+        '/usr/include/foo/[odd].h',
+        '/usr/lib64/libfoo.so',
+        '/usr/lib64/pkgconfig/foo.pc'],
+    'foo-static-1.0-1.fc16.x86_64.rpm': [
+        '/usr/lib64/libfoo.a',
+        '/usr/share/foo/data.tar.gz'],
+    }
+
+PATTERNS = ['*.h', '*.so', '*.a', '*.pc', '*.desktop', '*.tar.gz',
+            '*.jar', '*COPYING*', '*licen*', '[/usr]/[s]bin/*',
+            '/usr/share/locale/*/LC_MESSAGES/*.mo',
+            '/usr/share/javadoc/foo/*.html', '/usr/include/*',
+            '/usr/include/foo/[[]odd].h', '/usr/lib64/libfoo.so.?',
+            '*/libfoo.so.[!2]*', '*.d/foo', '/no/such/*']
+
+REGEXES = [r'/usr/(lib|lib64)/[\w\-]*\.so\.[0-9]', r'.*\.c(?:pp)',
+           r'^/usr/(share|lib|lib64)/sugar/activities/', r'\.mo$',
+           r'foo\.h\Z', r'bin/[^x]+']
+
+
+def _fnmatch_files(pattern):
+    ''' Reference implementation, as in old CheckBase. '''
+    result = {}
+    for rpm in FILES:
+        result[rpm] = [f for f in FILES[rpm]
+                          if fnmatch.fnmatch(f, pattern)]
+    return result
+
+
+class TestFileIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = FileIndex(FILES)
+
+    def test_has_files(self):
+        for pattern in PATTERNS:
+            expected = any(_fnmatch_files(pattern).values())
+            self.assertEqual(self.index.has_files(pattern), expected,
+                             pattern)
+
+    def test_get_files_by_pattern(self):
+        for pattern in PATTERNS:
+            result = self.index.get_files_by_pattern(pattern)
+            for rpm, files in _fnmatch_files(pattern).iteritems():
+                self.assertEqual(sorted(result[rpm]), sorted(files),
+                                 pattern)
+
+    def test_has_files_re(self):
+        for regex in REGEXES:
+            expected = False
+            for files in FILES.values():
+                for f in files:
+                    if re.search(regex, f):
+                        expected = True
+            self.assertEqual(self.index.has_files_re(regex), expected,
+                             regex)
+
+    def test_empty(self):
+        index = FileIndex({})
+        self.assertFalse(index.has_files('*'))
+        self.assertFalse(index.has_files_re('.*'))
+        self.assertEqual(index.get_files_by_pattern('*'), {})
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestFileIndex)
+    unittest.TextTestRunner(verbosity=2).run(suite)
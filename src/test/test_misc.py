@@ -32,6 +32,7 @@ import re
 import shutil
 
 from FedoraReview.helpers import Helpers
+from FedoraReview.rpm_index import RpmHeaderIndex
 from FedoraReview import Checks, NameBug, Sources, Source, ReviewDirs, \
      SRPMFile, SpecFile, Mock, Settings
 from FedoraReview import BugzillaBug, NameBug
@@ -139,12 +140,20 @@ class TestMisc(unittest.TestCase):
         # resolve the dist-tag
         dist = self.helpers._run_cmd('rpm --eval %dist')[:-1]
         self.assertEqual(spec.release,'1'+dist)
+        self.assertEqual(spec.get_from_spec('License'), 'GPLv2+')
+        # Unknown and missing tags.
+        self.assertEqual(spec.get_from_spec('NoSuchTag'), None)
+        self.assertEqual(spec.get_from_spec('Vendor'), None)
         # test misc rpm values (without macro resolve)
         self.assertEqual(spec.find_tag('Release'), ['1%{?dist}'])
         self.assertEqual(spec.find_tag('License'), ['GPLv2+'])
         self.assertEqual(spec.find_tag('Group'), ['Development/Languages'])
         # Test rpm value not there
         self.assertEqual(spec.find_tag('PreReq'), [])
+        # Test values from parsed spec
+        self.assertEqual(spec.get_expanded_tag('License'), ['GPLv2+'])
+        self.assertEqual(spec.get_subpackages(), [])
+        self.assertTrue('python-devel' in spec.get_buildrequires())
         # Test get sections
         expected = {'%clean': ['rm -rf $RPM_BUILD_ROOT']}
         self.assertEqual(spec.get_section('%clean'), expected)
@@ -194,6 +203,21 @@ class TestMisc(unittest.TestCase):
         self.assertEqual(1, len(rpms))
         os.chdir(self.startdir)
 
+    def test_rpm_index(self):
+        ''' Test the RpmHeaderIndex class. '''
+        index = RpmHeaderIndex()
+        path = os.path.abspath(
+                   'desktop-file/python-test-1.0-1.fc16.noarch.rpm')
+        header = index.get(path)
+        self.assertEqual(header.name, 'python-test')
+        self.assertEqual(header.basename,
+                         'python-test-1.0-1.fc16.noarch.rpm')
+        self.assertTrue(len(header.files) > 0)
+        self.assertEqual(len(header.files), len(header.modes))
+        self.assertEqual(len(header.files), len(header.sizes))
+        self.assertTrue('python-test = 1.0-1.fc16' in header.provides)
+        self.assertTrue(index.get(path) is header)
+
     @unittest.skipIf(no_net, 'No network available')
     def test_checksum_command_line(self):
         sys.argv = ['fedora-review','-n','python-test','--prebuilt',
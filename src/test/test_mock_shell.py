@@ -0,0 +1,101 @@
+#!/usr/bin/python -tt
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+'''
+Unit tests for the mock shell session, using a fake mock script.
+'''
+
+import os
+import sys
+sys.path.insert(0,os.path.abspath('../'))
+
+import shutil
+import tempfile
+import unittest
+
+from FedoraReview import Settings
+from FedoraReview.mock_shell import MockShell, MockShellError, TIMEOUT
+
+FAKE_MOCK = os.path.abspath('fake-mock/mock')
+
+
+class TestMockShell(unittest.TestCase):
+
+    def setUp(self):
+        sys.argv = ['fedora-review','-n','python-test','--prebuilt']
+        Settings.init(True)
+        self.tmpdir = tempfile.mkdtemp()
+        os.environ['FAKE_MOCK_STATE'] = self.tmpdir
+        os.environ['FAKE_MOCK_LOG'] = os.path.join(self.tmpdir, 'log')
+
+    def tearDown(self):
+        for key in ['FAKE_MOCK_STATE', 'FAKE_MOCK_LOG']:
+            del os.environ[key]
+        shutil.rmtree(self.tmpdir)
+
+    def count_sessions(self):
+        with open(os.environ['FAKE_MOCK_LOG']) as f:
+            return len([l for l in f if '--shell' in l])
+
+    def test_requests(self):
+        ''' Several commands run in one mock process. '''
+        with MockShell([FAKE_MOCK, '-r', 'fedora-18-i386']) as shell:
+            self.assertEqual(shell.run('echo foo; echo bar'),
+                             (0, 'foo\nbar\n'))
+            self.assertEqual(shell.run('printf foo'), (0, 'foo'))
+            self.assertEqual(shell.run('echo err >&2; exit 3'),
+                             (3, 'err\n'))
+            self.assertEqual(shell.run('true'), (0, ''))
+            self.assertEqual(shell.run('cat # comment'), (0, ''))
+            self.assertEqual(shell.run('echo; echo'), (0, '\n\n'))
+            self.assertEqual(shell.run('basename $PWD'),
+                             (0, 'fedora-18-i386\n'))
+            self.assertTrue(shell.is_running())
+        self.assertFalse(shell.is_running())
+        self.assertEqual(self.count_sessions(), 1)
+
+    def test_defaults(self):
+        ''' Default timeout is set, no prompts in the output. '''
+        shell = MockShell([FAKE_MOCK])
+        self.assertEqual(shell.timeout, TIMEOUT)
+        with shell:
+            self.assertEqual(shell.run('echo foo\necho bar'),
+                             (0, 'foo\nbar\n'))
+
+    def test_timeout(self):
+        ''' A request timing out kills the session, next starts anew. '''
+        shell = MockShell([FAKE_MOCK])
+        self.assertRaises(MockShellError, shell.run, 'sleep 5', 0.5)
+        self.assertFalse(shell.is_running())
+        self.assertEqual(shell.run('echo foo'), (0, 'foo\n'))
+        shell.close()
+        self.assertEqual(self.count_sessions(), 2)
+
+    def test_errors(self):
+        ''' Exiting or missing mock. '''
+        shell = MockShell([FAKE_MOCK])
+        self.assertRaises(MockShellError, shell.run, 'kill -9 $$')
+        self.assertFalse(shell.is_running())
+        shell = MockShell([os.path.join(self.tmpdir, 'no-mock')])
+        self.assertRaises(MockShellError, shell.start)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim: set expandtab: ts=4:sw=4:
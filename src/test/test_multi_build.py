@@ -0,0 +1,93 @@
+#!/usr/bin/python -tt
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+'''
+Unit tests for concurrent builds using several mock configs, using a
+fake mock script.
+'''
+
+import os
+import sys
+sys.path.insert(0,os.path.abspath('../'))
+
+import shutil
+import tempfile
+import time
+import unittest
+
+from FedoraReview import Settings
+from FedoraReview.multi_build import MultiBuild
+
+FAKE_MOCK = os.path.abspath('fake-mock/mock')
+
+
+class TestMultiBuild(unittest.TestCase):
+
+    def setUp(self):
+        sys.argv = ['fedora-review','-n','python-test','--prebuilt']
+        Settings.init(True)
+        Settings.build_cache_size = 0
+        self.tmpdir = tempfile.mkdtemp()
+        os.environ['FAKE_MOCK_STATE'] = self.tmpdir
+        os.environ['FAKE_MOCK_LOG'] = os.path.join(self.tmpdir, 'log')
+        os.environ['FAKE_MOCK_BUILD_TIME'] = '0.5'
+        self.srpm = os.path.join(self.tmpdir, 'foo-1.0-1.src.rpm')
+        open(self.srpm, 'w').close()
+
+    def tearDown(self):
+        for key in ['FAKE_MOCK_STATE', 'FAKE_MOCK_LOG',
+                    'FAKE_MOCK_BUILD_TIME']:
+            del os.environ[key]
+        shutil.rmtree(self.tmpdir)
+
+    def test_builds(self):
+        ''' Builds run in parallel, with separate results. '''
+        configs = ['fedora-rawhide-x86_64', 'fedora-rawhide-i386',
+                   'fedora-18-x86_64']
+        start = time.time()
+        multi = MultiBuild(self.srpm, configs, self.tmpdir, 3, FAKE_MOCK)
+        multi.start()
+        builds = multi.wait()
+        self.assertTrue(time.time() - start < 1.4)
+        self.assertEqual([b.config for b in builds], configs)
+        for build in builds:
+            self.assertTrue(build.ok)
+            self.assertEqual(build.get_rpms(),
+                             [os.path.join(self.tmpdir,
+                                           'results-' + build.config,
+                                           'foo-1.0-1.noarch.rpm')])
+            self.assertTrue(os.path.exists(build.logfile))
+        self.assertEqual(len(multi.summary().split('\n')), 3)
+
+    def test_bounded(self):
+        ''' No more than jobs builds at a time, failures reported. '''
+        configs = ['fedora-18-x86_64', 'broken-i386']
+        start = time.time()
+        builds = MultiBuild(self.srpm, configs, self.tmpdir, 1,
+                            FAKE_MOCK).wait()
+        self.assertTrue(time.time() - start >= 1.0)
+        self.assertTrue(builds[0].ok)
+        self.assertFalse(builds[1].ok)
+        self.assertEqual(builds[1].get_rpms(), [])
+        self.assertTrue('FAILED' in builds[1].summary())
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim: set expandtab: ts=4:sw=4:
@@ -0,0 +1,398 @@
+#!/usr/bin/python -tt
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+'''
+Unit tests for running external JSON plugins.
+'''
+
+import os
+import sys
+sys.path.insert(0,os.path.abspath('../'))
+
+import json
+import shutil
+import stat
+import tempfile
+import time
+import unittest
+
+from FedoraReview import Settings
+from FedoraReview import jsonapi
+from FedoraReview.file_index import FileIndex
+from FedoraReview.jsonapi import JSONAPI, JSONFramer, JSONPlugin, \
+     PluginData, run_plugins
+
+# Plugin asking for the build section, then sleeping DELAY seconds
+# while writing NOISE bytes to stderr before replying with a result
+# deprecating CheckDeprecated<name>.
+PLUGIN = '''#!%s
+import json
+import sys
+import time
+
+def read_msg():
+    lines = []
+    for line in iter(sys.stdin.readline, ''):
+        if line.strip() == '':
+            break
+        lines.append(line)
+    return json.loads(''.join(lines))
+
+setup = read_msg()
+print json.dumps({"supported_api": 1, "command": "get_section",
+                  "section": "build"})
+sys.stdout.flush()
+section = read_msg()
+sys.stderr.write(' ' * %d)
+time.sleep(%f)
+print json.dumps({"supported_api": 1, "command": "results",
+                  "version": "1.0",
+                  "checks": [{"name": "Check%s", "url": "http://x",
+                              "group": "Generic",
+                              "deprecates": ["CheckDeprecated%s"],
+                              "text": "Test plugin", "type": "MUST",
+                              "result": "pass",
+                              "output_extra": section["text"]}]},
+                 indent=4)
+'''
+
+# Persistent plugin, reports its pid and number of setups received.
+PERSISTENT = '''#!%s
+import json
+import os
+import sys
+
+setups = 0
+for line in iter(sys.stdin.readline, ''):
+    if line.strip() == '':
+        continue
+    setups += 1
+    print json.dumps({"supported_api": 2, "command": "results",
+                      "persistent": True,
+                      "checks": [{"name": "CheckPersistent",
+                                  "url": "http://x", "group": "Generic",
+                                  "deprecates": [], "text": "Persistent",
+                                  "type": "MUST", "result": "pass",
+                                  "output_extra": "%%d %%d" %%
+                                      (os.getpid(), setups)}]})
+    sys.stdout.flush()
+'''
+
+# Plugin sending the requests in REQUESTS, reporting the replies.
+QUERY = '''#!%s
+import json
+import sys
+
+def read_msg():
+    lines = []
+    for line in iter(sys.stdin.readline, ''):
+        if line.strip() == '':
+            break
+        lines.append(line)
+    return json.loads(''.join(lines))
+
+setup = read_msg()
+replies = []
+for request in %s:
+    request["supported_api"] = 3
+    print json.dumps(request)
+    sys.stdout.flush()
+    replies.append(read_msg())
+print json.dumps({"supported_api": 3, "command": "results",
+                  "checks": [{"name": "CheckQuery", "url": "http://x",
+                              "group": "Generic", "deprecates": [],
+                              "text": "Query", "type": "MUST",
+                              "result": "pass",
+                              "output_extra": json.dumps(replies)}]})
+'''
+
+
+class _FakeSetup(JSONAPI):
+    ''' Setup not needing a real spec or srpm. '''
+
+    def __init__(self, spec, srpm, sources):
+        self.pkgname = 'test'
+
+
+class _FakeSpec(object):
+    expanded = 0
+
+    def get_section(self, name):
+        return {name: ['make', 'make check']}
+
+    def get_expanded(self):
+        self.expanded += 1
+        return 'Name: test'
+
+    def find_tag(self, tag, section=None, split_tag=True):
+        return {('Requires', '%package devel'): ['test = 1.0']}.get(
+            (tag, section), [])
+
+    def get_expanded_tag(self, tag, subpackage=None):
+        return {('License', None): ['GPLv2+']}.get((tag, subpackage), [])
+
+    def get_subpackages(self):
+        return ['devel']
+
+    def get_requires(self, subpackage=None):
+        if subpackage == 'devel':
+            return ['test = 1.0-1', 'pkgconfig']
+        return ['python']
+
+    def get_buildrequires(self):
+        return ['python-devel >= 2.7']
+
+
+class _FakeSrpm(object):
+    rpmlint_output = ['test.noarch: W: no-documentation']
+    builds = 0
+
+    def build(self):
+        self.builds += 1
+
+    def get_files_rpms(self):
+        return {'test-1.0.noarch.rpm': ['/usr/bin/test'],
+                'test-devel-1.0.noarch.rpm': []}
+
+    def get_file_index(self):
+        return FileIndex(self.get_files_rpms())
+
+    def get_rpm_headers(self):
+        hdr = _FakeHeader()
+        return {'test-1.0.noarch.rpm': hdr}
+
+
+class _SlowSrpm(_FakeSrpm):
+
+    def get_files_rpms(self):
+        time.sleep(1.5)
+        return _FakeSrpm.get_files_rpms(self)
+
+
+class _FakeHeader(object):
+    name = 'test'
+    version = '1.0'
+    release = '1'
+    arch = 'noarch'
+    requires = ['python']
+    provides = ['test = 1.0-1']
+    scriptlets = {'post': '/sbin/ldconfig'}
+    scriptlet_progs = {'post': '/bin/sh'}
+
+
+class _FakeMock(object):
+
+    def get_builddir(self, subdir=None):
+        return '/var/lib/mock/test/root/builddir/build'
+
+
+class _FakeBase(object):
+    spec = _FakeSpec()
+    srpm = None
+    sources = None
+
+
+class TestPlugins(unittest.TestCase):
+
+    def setUp(self):
+        sys.argv = ['fedora-review','-n','python-test','--prebuilt']
+        Settings.init(True)
+        self.tmpdir = tempfile.mkdtemp()
+        self.setup = jsonapi.SetupPlugin
+        jsonapi.SetupPlugin = _FakeSetup
+        self.mock = jsonapi.Mock
+        jsonapi.Mock = _FakeMock()
+
+    def tearDown(self):
+        jsonapi.SetupPlugin = self.setup
+        jsonapi.Mock = self.mock
+        shutil.rmtree(self.tmpdir)
+
+    def _plugin(self, name, delay=0.0, noise=0):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'w') as f:
+            f.write(PLUGIN % (sys.executable, noise, delay, name, name))
+        os.chmod(path, stat.S_IRWXU)
+        return JSONPlugin(_FakeBase(), path)
+
+    def test_single(self):
+        ''' A plugin gets its section and reports results. '''
+        plugin = self._plugin('One', noise=200000)
+        plugin.run()
+        results = plugin.get_results()
+        self.assertEqual([r.name for r in results], ['CheckOne'])
+        self.assertEqual(results[0].deprecates, ['CheckDeprecatedOne'])
+        self.assertEqual(results[0].output_extra, 'make make check')
+        self.assertEqual(plugin.version, '1.0')
+
+    def test_parallel(self):
+        ''' Plugins run concurrently up to the limit. '''
+        plugins = [self._plugin('P%d' % i, 0.5) for i in range(4)]
+        start = time.time()
+        run_plugins(plugins, 4)
+        self.assertTrue(time.time() - start < 1.5)
+        self.assertEqual([p.get_results()[0].name for p in plugins],
+                         ['CheckP0', 'CheckP1', 'CheckP2', 'CheckP3'])
+        plugins = [self._plugin('S%d' % i, 0.3) for i in range(3)]
+        start = time.time()
+        run_plugins(plugins, 1)
+        self.assertTrue(time.time() - start >= 0.9)
+        self.assertEqual(len([p for p in plugins if p.get_results()]), 3)
+
+    def test_framing(self):
+        ''' Objects are found however the output is split. '''
+        objs = [{"command": "results", "text": 'a "{" \\ }}'},
+                {"nested": {"list": [{"a": "\\\""}, {}]}}]
+        output = 'noise\n' + json.dumps(objs[0], indent=4) + '\n\n' + \
+            json.dumps(objs[1])
+        for size in range(1, len(output) + 1):
+            framer = JSONFramer()
+            frames = []
+            for i in range(0, len(output), size):
+                frames.extend(framer.feed(output[i:i + size]))
+            self.assertEqual([json.loads(f) for f in frames], objs)
+            self.assertEqual(framer.skipped, 'noise')
+            self.assertFalse(framer.pending)
+        framer = JSONFramer()
+        self.assertEqual(framer.feed('{"a": "}"'), [])
+        self.assertTrue(framer.pending)
+
+    def _query(self, name, requests, data):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'w') as f:
+            f.write(QUERY % (sys.executable, requests))
+        os.chmod(path, stat.S_IRWXU)
+        return JSONPlugin(_FakeBase(), path, data)
+
+    def test_lazy_data(self):
+        ''' Data is computed on request, once for all plugins. '''
+        spec = _FakeSpec()
+        srpm = _FakeSrpm()
+        data = PluginData(spec, srpm)
+        requests = [{"command": "get_expanded_spec"},
+                    {"command": "get_rpms"},
+                    {"command": "get_files",
+                     "rpm": "test-1.0.noarch.rpm"},
+                    {"command": "get_rpmlint"},
+                    {"command": "get_section"},
+                    {"command": "get_build_dir"}]
+        plugins = [self._query('Q%d' % i, requests, data)
+                   for i in range(3)]
+        run_plugins(plugins, 3)
+        self.assertEqual(spec.expanded, 1)
+        self.assertEqual(srpm.builds, 3)
+        for plugin in plugins:
+            replies = json.loads(plugin.get_results()[0].output_extra)
+            self.assertEqual(replies[0]['text'], 'Name: test')
+            self.assertEqual(replies[1]['rpms'],
+                             ['test-1.0.noarch.rpm',
+                              'test-devel-1.0.noarch.rpm'])
+            self.assertEqual(replies[2]['files'],
+                             {'test-1.0.noarch.rpm': ['/usr/bin/test']})
+            self.assertEqual(replies[3]['text'],
+                             'test.noarch: W: no-documentation')
+            self.assertEqual(replies[4]['code'], 2)
+            self.assertEqual(replies[5]['path'],
+                             '/var/lib/mock/test/root/builddir/build')
+
+    def test_queries(self):
+        ''' Spec, file and header queries are answered. '''
+        data = PluginData(_FakeSpec(), _FakeSrpm())
+        requests = [
+            {"command": "get_tag", "tag": "Requires",
+             "section": "package devel"},
+            {"command": "get_tag", "tag": "License", "expand_macros": True},
+            {"command": "get_subpackages"},
+            {"command": "has_requires", "subpackage": "devel",
+             "name": "test", "version": "=1.0-1"},
+            {"command": "has_requires", "name": "pkgconfig"},
+            {"command": "has_buildrequires", "name": "python-devel",
+             "version": ">= 2.7"},
+            {"command": "has_buildrequires", "name": "python-devel",
+             "version": ">= 3"},
+            {"command": "has_files", "pattern": "/usr/bin/*"},
+            {"command": "has_files_re", "pattern": r"\.so$"},
+            {"command": "get_files_by_pattern", "pattern": "*/test"},
+            {"command": "get_rpm_header", "rpm": "test-1.0.noarch.rpm"},
+            {"command": "get_rpm_header", "rpm": "nothing.rpm"}]
+        plugin = self._query('Queries', requests, data)
+        plugin.run()
+        replies = json.loads(plugin.get_results()[0].output_extra)
+        self.assertEqual(replies[0]['tags'], ['test = 1.0'])
+        self.assertEqual(replies[1]['tags'], ['GPLv2+'])
+        self.assertEqual(replies[2]['subpackages'], ['devel'])
+        self.assertEqual([r['answer'] for r in replies[3:9]],
+                         [True, False, True, False, True, False])
+        self.assertEqual(replies[9]['files'],
+                         {'test-1.0.noarch.rpm': ['/usr/bin/test'],
+                          'test-devel-1.0.noarch.rpm': []})
+        self.assertEqual(replies[10]['header']['scriptlets'],
+                         {'post': '/sbin/ldconfig'})
+        self.assertEqual(replies[10]['header']['provides'],
+                         ['test = 1.0-1'])
+        self.assertEqual(replies[11]['code'], 2)
+
+    def test_persistent(self):
+        ''' A persistent plugin is reused for later reviews. '''
+        path = os.path.join(self.tmpdir, 'persistent')
+        with open(path, 'w') as f:
+            f.write(PERSISTENT % sys.executable)
+        os.chmod(path, stat.S_IRWXU)
+        extras = []
+        for i in range(3):
+            plugin = JSONPlugin(_FakeBase(), path)
+            run_plugins([plugin], 1, 10)
+            extras.append(plugin.get_results()[0].output_extra.split())
+        self.assertEqual([e[1] for e in extras], ['1', '2', '3'])
+        self.assertEqual(len(set([e[0] for e in extras])), 1)
+        proc = jsonapi._persistent[path]
+        jsonapi._close_persistent()
+        self.assertNotEqual(proc.returncode, None)
+
+    def test_timeout(self):
+        ''' A plugin not answering in time is killed. '''
+        slow = self._plugin('Slow', 5.0)
+        fast = self._plugin('Fast')
+        start = time.time()
+        run_plugins([slow, fast], 2, 1)
+        self.assertTrue(time.time() - start < 3.0)
+        self.assertEqual(slow.get_results(), [])
+        self.assertEqual(len(fast.get_results()), 1)
+
+    def test_slow_request(self):
+        ''' Time handling a request doesn't count for other plugins. '''
+        data = PluginData(_FakeSpec(), _SlowSrpm())
+        slow = self._query('SlowQuery', [{"command": "get_rpms"}], data)
+        fast = self._plugin('Fast', 0.2)
+        run_plugins([slow, fast], 2, 1)
+        self.assertEqual(len(slow.get_results()), 1)
+        self.assertEqual(len(fast.get_results()), 1)
+
+    def test_bad_plugin(self):
+        ''' Plugins which cannot start do not stop the others. '''
+        bad = JSONPlugin(_FakeBase(), os.path.join(self.tmpdir, 'nothing'))
+        good = self._plugin('Good')
+        run_plugins([bad, good], 2)
+        self.assertEqual(bad.get_results(), [])
+        self.assertEqual(len(good.get_results()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim: set expandtab: ts=4:sw=4:
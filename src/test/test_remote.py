@@ -0,0 +1,147 @@
+#!/usr/bin/python -tt
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+'''
+Unit tests for reviews built and checked on worker hosts.
+'''
+
+import os
+import sys
+sys.path.insert(0,os.path.abspath('../'))
+
+import json
+import shutil
+import tempfile
+import unittest
+
+from StringIO import StringIO
+
+from FedoraReview import Attachment, ReviewDirs, Settings
+from FedoraReview.batch import BatchReview, parse_item
+from FedoraReview.check_base import TestResult
+from FedoraReview.remote import LocalTransport, RemoteError, \
+     SSHTransport, WorkerPool, dump_result, load_result, run_worker
+
+FAKE_WORKER = [sys.executable,
+               os.path.abspath('fake-worker/fedora-review')]
+SPEC = os.path.abspath('python-test.spec')
+SRPM = os.path.abspath('python-test-1.0-1.fc16.src.rpm')
+
+
+class TestRemote(unittest.TestCase):
+
+    def setUp(self):
+        sys.argv = ['fedora-review','-n','python-test','--prebuilt']
+        Settings.init(True)
+        self.startdir = ReviewDirs.startdir
+        self.tmpdir = tempfile.mkdtemp()
+        ReviewDirs.startdir = self.tmpdir
+
+    def tearDown(self):
+        ReviewDirs.startdir = self.startdir
+        os.chdir(self.startdir)
+        shutil.rmtree(self.tmpdir)
+
+    def test_pool(self):
+        ''' Hosts are parsed, least loaded host is used first. '''
+        pool = WorkerPool.from_spec('local:2, user@b1,b2:3')
+        self.assertTrue(isinstance(pool.transports[0], LocalTransport))
+        self.assertTrue(isinstance(pool.transports[1], SSHTransport))
+        self.assertEqual([t.name for t in pool.transports],
+                         ['local', 'user@b1', 'b2'])
+        self.assertEqual(pool.slots, 6)
+        used = [pool.acquire().name for i in range(6)]
+        self.assertEqual(used, ['local', 'user@b1', 'b2', 'b2', 'local',
+                                'b2'])
+        self.assertEqual(pool.get_loads(), [2, 1, 3])
+        pool.release(pool.transports[1])
+        self.assertEqual(pool.acquire().name, 'user@b1')
+        cmd = pool.transports[1].get_command(['--worker', '-o', 'a b'])
+        self.assertEqual(cmd[-4:], ['fedora-review', '--worker', '-o',
+                                    "'a b'"])
+
+    def test_results(self):
+        ''' TestResults survive a json round trip. '''
+        result = TestResult('CheckX', 'http://x', 'Generic', ['CheckY'],
+                            'Some text', 'MUST', 'fail', 'Extra',
+                            [Attachment('Header', 'Text', 3)])
+        copy = load_result(json.loads(json.dumps(dump_result(result))))
+        self.assertEqual(copy.get_text(), result.get_text())
+        self.assertEqual(copy.deprecates, ['CheckY'])
+        self.assertEqual(str(copy.attachments[0]),
+                         str(result.attachments[0]))
+        self.assertEqual(copy.attachments[0].order_hint, 3)
+
+    def test_transport(self):
+        ''' Files are sent to the worker and results returned. '''
+        transport = LocalTransport('local', 1, FAKE_WORKER)
+        log = os.path.join(self.tmpdir, 'worker.log')
+        results, plugins = transport.review('python-test', [SPEC, SRPM],
+                                            log)
+        self.assertEqual([r.name for r in results],
+                         ['CheckPassed', 'CheckFailed'])
+        self.assertEqual(results[1].output_extra,
+                         'python-test.spec:%d python-test-1.0-1.fc16'
+                         '.src.rpm:%d' % (os.path.getsize(SPEC),
+                                          os.path.getsize(SRPM)))
+        self.assertEqual(plugins, [['/plugins/fake', '0.1']])
+        with open(log) as f:
+            self.assertTrue("'--worker'" in f.read())
+        self.assertRaises(RemoteError, transport.review, 'broken',
+                          [SPEC], log)
+
+    def test_worker(self):
+        ''' A worker replies also when the review fails. '''
+        infile = StringIO(json.dumps({'name': 'no-such-package',
+                                      'files': [['x.spec', 3]]})
+                          + '\nabc')
+        outfile = StringIO()
+        rc = run_worker(infile, outfile)
+        reply = json.loads(outfile.getvalue())
+        self.assertNotEqual(rc, 0)
+        self.assertEqual(reply['rc'], rc)
+        self.assertEqual(reply['results'], [])
+        self.assertEqual(os.getcwd(), os.path.realpath(self.startdir))
+
+    def test_batch(self):
+        ''' Batch reports are written from the worker results. '''
+        shutil.copy(SPEC, self.tmpdir)
+        shutil.copy(SRPM, self.tmpdir)
+        pool = WorkerPool([LocalTransport('w1', 1, FAKE_WORKER),
+                           LocalTransport('w2', 1, FAKE_WORKER)])
+        batch = BatchReview([parse_item('python-test'),
+                             parse_item('no-such-package')], 4, pool)
+        self.assertEqual(batch.jobs, 2)
+        self.assertEqual(batch.run(), 1)
+        ok, failed = batch.results
+        self.assertEqual(ok['rc'], 0)
+        self.assertTrue(ok['host'] in ['w1', 'w2'])
+        self.assertNotEqual(failed['rc'], 0)
+        with open(ok['report']) as f:
+            report = f.read()
+        self.assertTrue('[!]: MUST Failing check' in report)
+        self.assertTrue('Issues:' in report)
+        self.assertTrue('Got python-test' in report)
+        self.assertTrue('/plugins/fake version: 0.1' in report)
+        self.assertEqual(pool.get_loads(), [0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim: set expandtab: ts=4:sw=4:
@@ -0,0 +1,163 @@
+#!/usr/bin/python -tt
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+'''
+Unit tests for the check result cache.
+'''
+
+import os
+import sys
+sys.path.insert(0,os.path.abspath('../'))
+
+import shutil
+import tempfile
+import unittest
+
+from FedoraReview import Attachment, CheckBase, Settings
+from FedoraReview.check_scheduler import CheckScheduler
+from FedoraReview.checks.generic import CheckSourceUrl
+from FedoraReview.result_cache import ResultCache
+
+
+class _FakeFile(object):
+
+    def __init__(self, filename):
+        self.filename = filename
+
+
+class _FakeSrpm(_FakeFile):
+
+    def __init__(self, filename, rpms):
+        _FakeFile.__init__(self, filename)
+        self.rpms = rpms
+
+    def get_used_rpms(self):
+        return self.rpms
+
+    def get_file_index(self):
+        pass
+
+    def start_build(self):
+        pass
+
+
+class _FakeSource(object):
+
+    def __init__(self, downloaded):
+        self.url = 'http://example.com/test-1.0.tar.gz'
+        self.downloaded = downloaded
+
+
+class _FakeSources(object):
+
+    def __init__(self, *sources):
+        self.sources = sources
+
+    def get_all(self):
+        return self.sources
+
+
+class _FakeBase(object):
+    sources = None
+
+
+class CheckCounted(CheckBase):
+    ''' Fails, counting the runs. '''
+    needs = [CheckBase.NEEDS_SPEC, CheckBase.NEEDS_RPMS]
+
+    def __init__(self, base):
+        CheckBase.__init__(self, base)
+        self.text = 'Counted'
+        self.runs = 0
+
+    def run(self):
+        self.runs += 1
+        self.attachments = [Attachment('Runs', str(self.runs), 4)]
+        self.set_passed(False, 'Run %d' % self.runs)
+
+
+class CheckChroot(CheckCounted):
+    ''' Uses the chroot, not cached. '''
+    needs = [CheckBase.NEEDS_RPMS, CheckBase.NEEDS_CHROOT]
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        sys.argv = ['fedora-review','-n','python-test','--prebuilt']
+        Settings.init(True)
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = ResultCache(os.path.join(self.tmpdir, 'results'))
+        self.base = _FakeBase()
+        self.base.spec = _FakeFile(self._write('test.spec', 'spec'))
+        rpms = [self._write('test-1.0.src.rpm', 'srpm'),
+                self._write('test-1.0.noarch.rpm', 'rpm')]
+        self.base.srpm = _FakeSrpm(rpms[0], rpms)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def _run(self, check):
+        scheduler = CheckScheduler(self.base, 1, self.cache)
+        scheduler.run([check])
+        return scheduler.cached
+
+    def test_reuse(self):
+        ''' Result is restored while inputs are unchanged. '''
+        check = CheckCounted(self.base)
+        self.assertEqual(self._run(check), 0)
+        again = CheckCounted(self.base)
+        self.assertEqual(self._run(again), 1)
+        self.assertEqual(again.runs, 0)
+        self.assertEqual(again.get_result().get_text(),
+                         check.get_result().get_text())
+        self.assertEqual(str(again.attachments[0]),
+                         str(check.attachments[0]))
+        self._write('test-1.0.noarch.rpm', 'changed rpm')
+        changed = CheckCounted(self.base)
+        self.assertEqual(self._run(changed), 0)
+        self.assertEqual(changed.runs, 1)
+
+    def test_chroot(self):
+        ''' Checks using the chroot always run. '''
+        for i in range(2):
+            check = CheckChroot(self.base)
+            self.assertEqual(self._run(check), 0)
+            self.assertEqual(check.runs, 1)
+        self.assertEqual(os.listdir(self.cache.cache_dir), [])
+
+    def test_network(self):
+        ''' Checks depending on downloads always run. '''
+        for downloaded in [False, True]:
+            self.base.sources = _FakeSources(_FakeSource(downloaded))
+            check = CheckSourceUrl(self.base)
+            self.assertEqual(self._run(check), 0)
+            self.assertEqual(check.state, 'pass' if downloaded else 'fail')
+        self.assertEqual(os.listdir(self.cache.cache_dir), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim: set expandtab: ts=4:sw=4:
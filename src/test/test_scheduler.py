@@ -0,0 +1,183 @@
+#!/usr/bin/python -tt
+#-*- coding: UTF-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+'''
+Unit tests for the parallel check scheduler
+'''
+
+import os
+import sys
+sys.path.insert(0,os.path.abspath('../'))
+
+import threading
+import time
+import unittest
+
+from FedoraReview import CheckBase, FedoraReviewError, Settings
+from FedoraReview.check_scheduler import CheckScheduler
+from FedoraReview.srpm_file import SRPMFile
+
+
+class _FakeBase(object):
+    srpm = None
+    sources = None
+
+
+class _FakeSrpm(object):
+
+    def get_file_index(self):
+        pass
+
+
+class _FailingSrpm(SRPMFile):
+    ''' Mock build failing after a while. '''
+
+    def unpack(self, src=None):
+        pass
+
+    def restore_build(self):
+        return False
+
+    def mockbuild(self, force=False):
+        time.sleep(0.2)
+        self.build_failed = True
+        raise FedoraReviewError('Mock build failed.')
+
+
+class _FakeCheck(object):
+    ''' Minimal check, records the thread it is run in, and calls
+    of is_applicable() in calls if given.
+    '''
+
+    def __init__(self, needs, log, name='CheckFake', deprecates=[],
+                 calls=None):
+        self.needs = needs
+        self.log = log
+        self.name = name
+        self.deprecates = deprecates
+        self.calls = calls if calls is not None else []
+
+    def is_applicable(self):
+        self.calls.append(('applicable', self))
+        return True
+
+    def run(self):
+        time.sleep(0.2)
+        self.log.append((self, threading.current_thread().name))
+
+
+class TestScheduler(unittest.TestCase):
+
+    def test_serialized(self):
+        ''' Undeclared and chroot checks run first, in main thread. '''
+        log = []
+        checks = [_FakeCheck([CheckBase.NEEDS_SPEC], log),
+                  _FakeCheck(None, log),
+                  _FakeCheck([CheckBase.NEEDS_RPMS,
+                              CheckBase.NEEDS_CHROOT], log)]
+        CheckScheduler(_FakeBase(), 4).run(checks)
+        self.assertEqual([c for c, t in log[:2]], checks[1:])
+        main = threading.current_thread().name
+        self.assertEqual([t for c, t in log[:2]], [main, main])
+        self.assertEqual(log[2][0], checks[0])
+
+    def test_parallel(self):
+        ''' Independent checks runs concurrently, time is saved. '''
+        log = []
+        checks = [_FakeCheck([CheckBase.NEEDS_SPEC], log)
+                     for i in range(4)]
+        scheduler = CheckScheduler(_FakeBase(), 4)
+        scheduler.run(checks)
+        self.assertEqual(len(log), 4)
+        self.assertTrue(scheduler.elapsed < 0.6)
+        self.assertTrue(scheduler.serial_time >= 0.8)
+        self.assertTrue(scheduler.saved > 0.2)
+
+    def test_one_job(self):
+        ''' With one job, everything is run serialized. '''
+        log = []
+        checks = [_FakeCheck([CheckBase.NEEDS_SPEC], log)
+                     for i in range(2)]
+        scheduler = CheckScheduler(_FakeBase(), 1)
+        scheduler.run(checks)
+        self.assertEqual([c for c, t in log], checks)
+        self.assertTrue(scheduler.elapsed >= 0.4)
+
+    def test_pipeline(self):
+        ''' Build starts first, spec and sources checks run before
+        serialized ones unless --no-pipeline is used.
+        '''
+        for args, pipeline in [([], True), (['--no-pipeline'], False)]:
+            sys.argv = ['fedora-review', '-n', 'python-test',
+                        '--prebuilt'] + args
+            Settings.init(True)
+            self.assertEqual(Settings.pipeline, pipeline)
+            log = []
+            base = _FakeBase()
+            base.srpm = _FakeSrpm()
+            checks = [_FakeCheck(None, log, calls=log),
+                      _FakeCheck([CheckBase.NEEDS_RPMS], log, calls=log),
+                      _FakeCheck([CheckBase.NEEDS_SPEC,
+                                  CheckBase.NEEDS_SOURCES], log,
+                                 calls=log)]
+            CheckScheduler(base, 4).run(checks)
+            ran = [c for c, t in log if c != 'applicable']
+            if pipeline:
+                # Only the early check is evaluated before it runs.
+                self.assertEqual(log[0], ('applicable', checks[2]))
+                self.assertEqual(log[1][0], checks[2])
+                self.assertEqual(ran, [checks[2], checks[0], checks[1]])
+            else:
+                self.assertEqual(ran[0], checks[0])
+                self.assertEqual(set(ran[1:]), set(checks[1:]))
+
+    def test_deprecated(self):
+        ''' Deprecated checks don't run, also not early ones. '''
+        sys.argv = ['fedora-review', '-n', 'python-test', '--prebuilt']
+        Settings.init(True)
+        log = []
+        base = _FakeBase()
+        base.srpm = _FakeSrpm()
+        spec = [CheckBase.NEEDS_SPEC]
+        checks = [_FakeCheck([CheckBase.NEEDS_RPMS], log, 'CheckRpms',
+                             ['CheckOld']),
+                  _FakeCheck(spec, log, 'CheckOld'),
+                  _FakeCheck(spec, log, 'CheckPlugin'),
+                  _FakeCheck(spec, log, 'CheckNew')]
+        ran = CheckScheduler(base, 4).run(checks, ['CheckPlugin'])
+        self.assertEqual(ran, [checks[0], checks[3]])
+        self.assertEqual(set([c for c, t in log]), set(ran))
+
+    def test_build_error(self):
+        ''' A failed background build is reported by build(). '''
+        sys.argv = ['fedora-review', '-n', 'python-test', '--prebuilt']
+        Settings.init(True)
+        Settings.prebuilt = False
+        try:
+            srpm = _FailingSrpm('python-test-1.0-1.fc16.src.rpm')
+            srpm.start_build()
+            time.sleep(0.1)
+            self.assertRaises(FedoraReviewError, srpm.build)
+            self.assertEqual(srpm.build(), SRPMFile.BUILD_FAIL)
+        finally:
+            Settings.prebuilt = True
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestScheduler)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,151 @@
+#!/usr/bin/python -tt
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+'''
+Unit tests for the review daemon.
+'''
+
+import os
+import sys
+sys.path.insert(0,os.path.abspath('../'))
+
+import shutil
+import signal
+import tempfile
+import threading
+import time
+import unittest
+import Queue
+
+from StringIO import StringIO
+
+from FedoraReview import ReviewDirs, Settings
+from FedoraReview import batch
+from FedoraReview.batch import parse_item
+from FedoraReview.serve import ReviewServer, ServeError, request, \
+     submit_job
+
+
+def _fake_review(item):
+    ''' Review stand-in, hangs for 'hang' items. '''
+    if item['value'] == 'hang':
+        time.sleep(60)
+    result = dict(item)
+    result.update({'rc': 0, 'report': None, 'elapsed': 0.0, 'worker': 0})
+    return result
+
+
+class TestServe(unittest.TestCase):
+
+    def setUp(self):
+        sys.argv = ['fedora-review','-n','python-test','--prebuilt']
+        Settings.init(True)
+        self.startdir = ReviewDirs.startdir
+        self.tmpdir = tempfile.mkdtemp()
+        ReviewDirs.startdir = self.tmpdir
+        self.socket = os.path.join(self.tmpdir, 'serve.sock')
+
+    def tearDown(self):
+        ReviewDirs.startdir = self.startdir
+        os.chdir(self.startdir)
+        shutil.rmtree(self.tmpdir)
+
+    def test_priority(self):
+        ''' Jobs queued before start run highest priority first. '''
+        server = ReviewServer(self.socket, 1)
+        events = Queue.Queue()
+        for name, prio in [('low', 0), ('high', 5), ('mid', 2)]:
+            server.submit(parse_item(name), prio, events)
+        server.start()
+        try:
+            started = []
+            done = 0
+            while done < 3:
+                event = events.get(timeout=60)
+                if event['event'] == 'started':
+                    started.append(event['id'])
+                elif event['event'] == 'done':
+                    done += 1
+        finally:
+            server.stop()
+        self.assertEqual(started, [2, 3, 1])
+        states = [j['state'] for j in server.status()]
+        self.assertEqual(states, ['done'] * 3)
+
+    def test_dead_worker(self):
+        ''' A job whose worker dies is done with rc 1, next job runs. '''
+        server = ReviewServer(self.socket, 1)
+        events = Queue.Queue()
+        review = batch._review
+        batch._review = _fake_review
+        try:
+            server.submit(parse_item('hang'), 1, events)
+            server.submit(parse_item('next'), 0, events)
+            server.start()
+            for i in range(600):
+                pid = server.status()[0]['pid']
+                if pid:
+                    break
+                time.sleep(0.1)
+            os.kill(pid, signal.SIGKILL)
+            results = {}
+            while len(results) < 2:
+                event = events.get(timeout=60)
+                if event['event'] == 'done':
+                    results[event['id']] = event['result']['rc']
+        finally:
+            batch._review = review
+            server.stop()
+        self.assertEqual(results, {1: 1, 2: 0})
+
+    def test_client(self):
+        ''' Progress and result are streamed to a socket client. '''
+        server = ReviewServer(self.socket, 2)
+        server.listen()
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            events = list(request(self.socket,
+                                  {'op': 'submit',
+                                   'item': 'name:no-such-package'}))
+            out = StringIO()
+            rc = submit_job(self.socket, 'other-package', 1, out)
+            status = list(request(self.socket, {'op': 'status'}))
+            bad = list(request(self.socket, {'op': 'nothing'}))
+        finally:
+            server._server.shutdown()
+            thread.join()
+        self.assertEqual([e['event'] for e in events[:2]],
+                         ['queued', 'started'])
+        self.assertEqual(events[-1]['event'], 'done')
+        self.assertTrue('log' in [e['event'] for e in events])
+        self.assertNotEqual(events[-1]['result']['rc'], 0)
+        self.assertEqual(events[-1]['result']['value'], 'no-such-package')
+        self.assertNotEqual(rc, 0)
+        self.assertTrue('Job 2 started' in out.getvalue())
+        self.assertEqual([j['state'] for j in status[0]['jobs']],
+                         ['done', 'done'])
+        self.assertEqual(bad[0]['event'], 'error')
+        self.assertFalse(os.path.exists(self.socket))
+        self.assertRaises(ServeError, submit_job, self.socket, 'x')
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim: set expandtab: ts=4:sw=4:
@@ -0,0 +1,92 @@
+#!/usr/bin/python -tt
+#-*- coding: utf-8 -*-
+
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+# (C) 2011 - Tim Lauridsen <timlau@fedoraproject.org>
+'''
+Unit tests for the checksum based tree comparison
+'''
+
+import os
+import sys
+sys.path.insert(0,os.path.abspath('../'))
+
+import shutil
+import tempfile
+import unittest
+
+from StringIO import StringIO
+
+from FedoraReview.tree_diff import TreeDiff
+
+
+class TestTreeDiff(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.a = os.path.join(self.tmpdir, 'a')
+        self.b = os.path.join(self.tmpdir, 'b')
+        for top in [self.a, self.b]:
+            os.makedirs(os.path.join(top, 'src'))
+            for i in range(20):
+                self.write(top, 'src/file%d.c' % i, 'int i = %d;\n' % i)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, top, path, data):
+        with open(os.path.join(top, path), 'w') as f:
+            f.write(data)
+
+    def test_equal(self):
+        ''' Identical trees. '''
+        diff = TreeDiff(self.a, self.b, 4)
+        self.assertTrue(diff.compare())
+        output = StringIO()
+        diff.write(output)
+        self.assertEqual(output.getvalue(), '')
+
+    def test_differ(self):
+        ''' Only differing files are reported and diffed. '''
+        self.write(self.a, 'src/file3.c', 'a\nb\nc\nd\n')
+        self.write(self.b, 'src/file3.c', 'a\nb\nX\nd\n')
+        self.write(self.b, 'src/file4.c', 'int i = 5;\n')
+        self.write(self.a, 'data.bin', '\0\1')
+        self.write(self.b, 'data.bin', '\0\2')
+        os.makedirs(os.path.join(self.a, 'docs', 'html'))
+        self.write(self.a, 'docs/html/index.html', '<html/>')
+        diff = TreeDiff(self.a, self.b, 4)
+        self.assertFalse(diff.compare())
+        self.assertEqual(diff.only_a, ['docs'])
+        self.assertEqual(diff.only_b, [])
+        self.assertEqual(diff.differ,
+                         ['data.bin', 'src/file3.c', 'src/file4.c'])
+        path = os.path.join(self.tmpdir, 'diff.txt')
+        with open(path, 'w') as f:
+            diff.write(f)
+        with open(path) as f:
+            output = f.read()
+        self.assertTrue('Only in %s: docs\n' % self.a in output)
+        self.assertTrue('Binary files %s/data.bin and %s/data.bin differ'
+                        % (self.a, self.b) in output)
+        self.assertTrue('-c\n+X\n' in output)
+        self.assertFalse('file5.c' in output)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim: set expandtab: ts=4:sw=4: